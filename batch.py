@@ -0,0 +1,196 @@
+from source.parser import Parser
+from source.checker import Checker
+from source.lexer import Lexer
+from source.ircode import IRCode, CONFIG
+from source.inliner import inline_module
+from source.bytecode import read_module
+from source.compcache import CompilationCache
+from benchmark import MODES, discover, make_machine
+from rich.console import Console
+from rich.table import Table
+from concurrent.futures import ProcessPoolExecutor
+import argparse
+import contextlib
+import glob
+import io
+import json
+import os
+import time
+
+console = Console()
+
+# Estados de un programa en el reporte
+STATUS_LABELS = {
+    'ok': '[green]ok[/green]',
+    'compile_error': '[red]error de compilación[/red]',
+    'runtime_error': '[red]error de ejecución[/red]',
+}
+
+def run_program(file_path, mode=None, engine=None, superinstructions=None, jit=None, memoize=None, memo_size=None,
+                cache_dir=None):
+    """
+    Compila y ejecuta un programa .gox (Lexer → Parser → Checker → IRCode →
+    máquina virtual), o carga y ejecuta un .goxc, capturando su salida. Devuelve un diccionario con el
+    estado, la salida, el error y los mensajes de las etapas si falló.
+    Con cache_dir, el módulo IR se busca y se guarda en esa caché de compilación
+    (compartida entre procesos) y 'cache' indica si hubo acierto ('hit') o fallo ('miss').
+    La máquina se crea como en main.py (make_machine): las opciones en None,
+    incluido el modo, se toman de config.json.
+    Nunca lanza excepciones: los errores quedan en el resultado.
+    """
+    result = {
+        'file': file_path,
+        'status': 'ok',
+        'output': '',
+        'error': None,
+        'log': '',
+        'instructions': 0,
+        'seconds': 0.0,
+        'cache': None,
+    }
+    fileName = os.path.basename(file_path).split('.')[0]
+    log = io.StringIO()
+    start = time.perf_counter()
+    vm = None
+    try:
+        with contextlib.redirect_stdout(log):
+            try:
+                if file_path.endswith('.goxc'):
+                    module = read_module(file_path)
+                else:
+                    with open(file_path, 'r', encoding='utf-8') as f:
+                        content = f.read()
+                    cache = CompilationCache(cache_dir, config=CONFIG) if cache_dir else None
+                    module = cache.get(content) if cache else None
+                    if cache:
+                        result['cache'] = 'miss' if module is None else 'hit'
+                    if module is None:
+                        tokens = Lexer(fileName).tokenize(content)
+                        top = Parser(tokens, fileName).parse()
+                        Checker.check(top, fileName)
+                        module = IRCode.gencode(top.stmts, fileName)
+                        if CONFIG.get("Inline", False):
+                            module, _ = inline_module(module, CONFIG.get("InlineBudget", 24))
+                        if cache:
+                            cache.put(content, module)
+            except BaseException as e:
+                if isinstance(e, KeyboardInterrupt):
+                    raise
+                result['status'] = 'compile_error'
+                result['error'] = str(e) or type(e).__name__
+                return result
+            try:
+                vm = make_machine(mode, engine=engine, superinstructions=superinstructions, jit=jit,
+                                  memoize=memoize, memo_size=memo_size, output='capture')
+                vm.load_module(module)
+                vm.run()
+            except Exception as e:
+                result['status'] = 'runtime_error'
+                result['error'] = str(e) or type(e).__name__
+    finally:
+        result['seconds'] = time.perf_counter() - start
+        if result['status'] != 'ok':
+            result['log'] = log.getvalue()
+        if vm is not None:
+            result['output'] = vm.output.getvalue()
+            result['instructions'] = vm.instruction_count
+    return result
+
+def _run_program(args):
+    file_path, options = args
+    return run_program(file_path, **options)
+
+def run_batch(files, workers=None, **options):
+    """
+    Ejecuta run_program sobre cada archivo en un pool de procesos con
+    workers procesos (por defecto, uno por CPU). Las opciones se pasan a
+    run_program. Devuelve los resultados en el orden de files.
+    """
+    files = list(files)
+    jobs = [(file_path, options) for file_path in files]
+    workers = min(workers or os.cpu_count() or 1, len(jobs))
+    if workers <= 1:
+        return [_run_program(job) for job in jobs]
+    # Lotes de varios programas por tarea para no pagar el IPC por archivo.
+    chunksize = max(1, len(jobs) // (workers * 4))
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        return list(pool.map(_run_program, jobs, chunksize=chunksize))
+
+def summarize(results, wall_seconds):
+    """Totales del lote: programas por estado, tiempos e instrucciones."""
+    summary = { status: 0 for status in STATUS_LABELS }
+    for result in results:
+        summary[result['status']] += 1
+    summary['programs'] = len(results)
+    summary['cache_hits'] = sum(result['cache'] == 'hit' for result in results)
+    summary['cache_misses'] = sum(result['cache'] == 'miss' for result in results)
+    summary['instructions'] = sum(result['instructions'] for result in results)
+    summary['cpu_seconds'] = sum(result['seconds'] for result in results)
+    summary['wall_seconds'] = wall_seconds
+    summary['programs_per_second'] = len(results) / wall_seconds if wall_seconds else 0.0
+    return summary
+
+def find_programs(patterns):
+    """Archivos que coinciden con los patrones glob, sin repetir, en orden numérico."""
+    if not patterns:
+        return discover()
+    files = []
+    for pattern in patterns:
+        matches = discover(pattern) if glob.has_magic(pattern) else [pattern]
+        files += [file_path for file_path in matches if file_path not in files]
+    return files
+
+def print_report(results, summary, show_all=False):
+    table = Table(title="Programas" if show_all else "Programas con errores")
+    table.add_column('programa', style='cyan')
+    table.add_column('estado')
+    table.add_column('instrucciones', justify='right')
+    table.add_column('ms', justify='right')
+    table.add_column('error')
+    for result in results:
+        if show_all or result['status'] != 'ok':
+            table.add_row(result['file'], STATUS_LABELS[result['status']], str(result['instructions']),
+                          f"{result['seconds'] * 1000:.1f}", (result['error'] or '')[:60])
+    if table.row_count:
+        console.print(table)
+    console.print(
+        f"[bold]{summary['programs']} programas:[/bold] {summary['ok']} correctos, "
+        f"{summary['compile_error']} con errores de compilación, {summary['runtime_error']} con errores de ejecución. "
+        f"{summary['wall_seconds']:.2f} s ({summary['cpu_seconds']:.2f} s de CPU, "
+        f"{summary['programs_per_second']:.1f} programas/s), {summary['instructions']:,} instrucciones."
+    )
+    if summary['cache_hits'] or summary['cache_misses']:
+        console.print(f"[bold]Caché de compilación:[/bold] {summary['cache_hits']} aciertos, {summary['cache_misses']} fallos.")
+
+def main():
+    parser = argparse.ArgumentParser(description="Compila y ejecuta lotes de programas GoxLang en paralelo.")
+    parser.add_argument('patterns', nargs='*', help="Archivos o patrones glob (por defecto tests/*.gox)")
+    parser.add_argument('--workers', type=int, default=None, help="Procesos del pool (por defecto, uno por CPU)")
+    parser.add_argument('--mode', default=None, choices=list(MODES),
+                        help="Representación de la pila (por defecto, la de config.json)")
+    parser.add_argument('--engine', default=None, choices=MODES['tagged'].ENGINES)
+    parser.add_argument('--fuse', action='store_true', default=None, help="Ejecuta con superinstrucciones")
+    parser.add_argument('--jit', action='store_true', default=None, help="Ejecuta con JIT de funciones calientes")
+    parser.add_argument('--memoize', metavar='N', type=int, nargs='?', const=0, default=None,
+                        help="Memoriza las funciones puras, con N entradas por caché (por defecto MemoizeSize)")
+    parser.add_argument('--cache', metavar='DIR', nargs='?', const='.goxcache', default=None,
+                        help="Usa una caché de compilación en DIR (por defecto .goxcache)")
+    parser.add_argument('--all', action='store_true', help="Lista todos los programas, no solo los que fallan")
+    parser.add_argument('--json', metavar='ARCHIVO', help="Guarda los resultados y el resumen en un archivo JSON")
+    args = parser.parse_args()
+
+    files = find_programs(args.patterns)
+    start = time.perf_counter()
+    results = run_batch(files, args.workers, mode=args.mode, engine=args.engine,
+                        superinstructions=args.fuse, jit=args.jit,
+                        memoize=None if args.memoize is None else True, memo_size=args.memoize or None,
+                        cache_dir=args.cache)
+    summary = summarize(results, time.perf_counter() - start)
+    print_report(results, summary, args.all)
+    if args.json:
+        with open(args.json, 'w', encoding='utf-8') as f:
+            json.dump({ 'summary': summary, 'results': results }, f, indent=2, ensure_ascii=False)
+    return 0 if summary['ok'] == summary['programs'] else 1
+
+if __name__ == '__main__':
+    raise SystemExit(main())
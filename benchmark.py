@@ -0,0 +1,146 @@
+from source.parser import Parser
+from source.checker import Checker
+from source.lexer import Lexer
+from source.ircode import IRCode
+from source.stack_machine import StackMachine, CONFIG
+from source.untagged_machine import UntaggedStackMachine
+from source.register_machine import RegisterMachine
+from source.output import OUTPUT_SINKS
+from rich.console import Console
+from rich.table import Table
+import argparse
+import contextlib
+import glob
+import io
+import os
+import time
+
+console = Console()
+
+# Representación de la pila: modo -> clase de máquina
+MODES = {
+    'tagged': StackMachine,
+    'untagged': UntaggedStackMachine,
+    'register': RegisterMachine,
+}
+
+def machine_mode():
+    """Modo de la máquina que eligen RegisterVM y UntaggedStack en config.json."""
+    if CONFIG.get("RegisterVM", False):
+        return 'register'
+    if CONFIG.get("UntaggedStack", False):
+        return 'untagged'
+    return 'tagged'
+
+def make_machine(mode=None, **options):
+    """
+    Crea la máquina del modo indicado (por defecto, el de machine_mode()).
+    Las opciones que no se pasan o valen None (motor, superinstrucciones, JIT,
+    Memoize y MemoizeSize, perfiles...) las toma la máquina de config.json,
+    así main.py, batch.py y las mediciones ejecutan con los mismos ajustes.
+    """
+    return MODES[mode or machine_mode()](**options)
+
+def build_module(file_path):
+    """
+    Ejecuta léxico, parser, checker y generación de IR sobre un archivo .gox
+    y devuelve el módulo IR. La salida de las etapas se descarta.
+    """
+    fileName = os.path.basename(file_path).split('.')[0]
+    with open(file_path, 'r', encoding='utf-8') as f:
+        content = f.read()
+    with contextlib.redirect_stdout(io.StringIO()):
+        tokens = Lexer(fileName).tokenize(content)
+        top = Parser(tokens, fileName).parse()
+        Checker.check(top, fileName)
+        return IRCode.gencode(top.stmts, fileName)
+
+def time_module(module, engine, mode='tagged', superinstructions=False, jit=False, output='rich'):
+    """
+    Ejecuta el módulo en una máquina nueva con el motor y el modo indicados,
+    escribiendo la salida del programa en el destino output. Devuelve (instrucciones ejecutadas, segundos).
+    """
+    vm = make_machine(mode, engine=engine, superinstructions=superinstructions, jit=jit, output=output)
+    vm.load_module(module)
+    with contextlib.redirect_stdout(io.StringIO()):
+        start = time.perf_counter()
+        vm.run()
+        elapsed = time.perf_counter() - start
+    return vm.instruction_count, elapsed
+
+def discover(pattern='tests/*.gox'):
+    """Devuelve los programas que coinciden con el patrón, en orden numérico."""
+    def key(path):
+        name = os.path.basename(path).split('.')[0]
+        return (0, int(name), name) if name.isdigit() else (1, 0, name)
+    return sorted(glob.glob(pattern), key=key)
+
+def main():
+    parser = argparse.ArgumentParser(description="Compara el rendimiento de los motores de la StackMachine.")
+    parser.add_argument('files', nargs='*', help="Programas .gox (por defecto tests/*.gox)")
+    parser.add_argument('--engines', nargs='+', default=list(StackMachine.ENGINES), choices=StackMachine.ENGINES)
+    parser.add_argument('--modes', nargs='+', default=['tagged'], choices=list(MODES))
+    parser.add_argument('--fuse', action='store_true', help="Compara cada variante con y sin superinstrucciones")
+    parser.add_argument('--jit', action='store_true', help="Compara cada variante con y sin JIT de funciones calientes")
+    parser.add_argument('--output', default='rich', choices=list(OUTPUT_SINKS), help="Destino de la salida de los programas")
+    args = parser.parse_args()
+    fusions = [False, True] if args.fuse else [False]
+    jits = [False, True] if args.jit else [False]
+    variants = [(engine, mode, fused, jit) for mode in args.modes for engine in args.engines
+                for fused in fusions for jit in jits]
+
+    table = Table(title="Instrucciones por segundo")
+    table.add_column('programa', style='cyan')
+    table.add_column('instrucciones', justify='right')
+    if args.fuse:
+        table.add_column('fusionadas', justify='right')
+    # Cada modo adicional ejecuta otro conjunto de instrucciones (p. ej. register)
+    for mode in args.modes[1:]:
+        table.add_column(f'instr. {mode}', justify='right')
+    for engine, mode, fused, jit in variants:
+        label = engine if mode == 'tagged' else f'{engine}+{mode}'
+        if fused:
+            label += '+fuse'
+        if jit:
+            label += '+jit'
+        table.add_column(f'{label} (ms)', justify='right')
+        table.add_column(f'{label} (instr/s)', justify='right')
+
+    for file_path in args.files or discover():
+        try:
+            module = build_module(file_path)
+        except BaseException as e:
+            console.print(f"[bold red]No se pudo compilar {file_path}:[/bold red] {e}")
+            continue
+        row = [os.path.basename(file_path)]
+        counts = {}
+        mode_counts = {}
+        for engine, mode, fused, jit in variants:
+            try:
+                count, elapsed = time_module(module, engine, mode, fused, jit, args.output)
+            except Exception as e:
+                row += ['error', str(e)[:30]]
+                continue
+            # Lo que ejecuta el código compilado no cuenta como instrucciones.
+            if not jit:
+                if mode == args.modes[0]:
+                    counts[fused] = count
+                elif not fused:
+                    mode_counts[mode] = count
+            row += [f'{elapsed * 1000:.1f}', f'{count / elapsed:,.0f}' if elapsed else '-']
+        if args.fuse:
+            fused_count = str(counts[True]) if True in counts else '-'
+            if counts.get(False) and True in counts:
+                fused_count += f' ({1 - counts[True] / counts[False]:.0%} menos)'
+            row.insert(1, fused_count)
+        for index, mode in enumerate(args.modes[1:]):
+            mode_count = str(mode_counts[mode]) if mode in mode_counts else '-'
+            if counts.get(False) and mode in mode_counts:
+                mode_count += f' ({1 - mode_counts[mode] / counts[False]:.0%} menos)'
+            row.insert(1 + index, mode_count)
+        row.insert(1, str(counts[False]) if False in counts else '-')
+        table.add_row(*row)
+    console.print(table)
+
+if __name__ == '__main__':
+    main()
@@ -2,10 +2,17 @@ from source.parser import Parser
 from source.checker import Checker
 from source.lexer import Lexer
 from source.ircode import IRCode
-from source.stack_machine import StackMachine
+from source.bytecode import read_module, write_module
+from source.compcache import CompilationCache
+from source.incremental import IncrementalCompiler
+from source.inliner import inline_module
+from benchmark import discover, make_machine
 from rich import print
+from rich.table import Table
 import json
 import os
+import sys
+import time
 
 def load_config():
     """
@@ -25,6 +32,17 @@ def load_config():
 
 CONFIG = load_config()
 
+def open_compile_cache():
+    """
+    Devuelve la caché de compilación si 'CompileCache' está activo.
+    """
+    if not CONFIG.get("CompileCache", False):
+        return None
+    directory = os.path.join(os.path.dirname(__file__), CONFIG.get("CompileCacheDir", ".goxcache"))
+    return CompilationCache(directory, CONFIG.get("CompileCacheMaxBytes", 64 * 1024 * 1024), CONFIG)
+
+COMPILE_CACHE = open_compile_cache()
+
 def read_file(file_path):
     """
     Lee y devuelve el contenido de un archivo como texto.
@@ -44,76 +62,272 @@ def create_output_directory(filePath):
             os.makedirs(output_dir)
     return fileName
 
-def compile(file):
+def print_heap_stats(stats):
+    """
+    Muestra las estadísticas del heap de la máquina virtual (HeapStats).
+    """
+    table = Table(title="Heap")
+    table.add_column('métrica', style='cyan')
+    table.add_column('valor', justify='right')
+    for key, value in stats.items():
+        table.add_row(key, f'{value:.1%}' if isinstance(value, float) else str(value))
+    print(table)
+
+def print_profile(report, top=15):
+    """
+    Muestra el perfil de ejecución (Profile): tiempo por opcode, líneas
+    del fuente más costosas e instrucciones más ejecutadas.
+    """
+    table = Table(title=f"Perfil por opcode ({report['instructions']:,} instrucciones, {report['seconds'] * 1000:.1f} ms)")
+    table.add_column('opcode', style='cyan')
+    table.add_column('ejecuciones', justify='right')
+    table.add_column('ms', justify='right')
+    table.add_column('%', justify='right')
+    for entry in report['opcodes'][:top]:
+        table.add_row(entry['opcode'], f"{entry['count']:,}", f"{entry['seconds'] * 1000:.2f}", f"{entry['share']:.1%}")
+    print(table)
+    if report['lines']:
+        table = Table(title="Líneas más costosas")
+        table.add_column('línea', justify='right', style='cyan')
+        table.add_column('ejecuciones', justify='right')
+        table.add_column('ms', justify='right')
+        for entry in report['lines'][:top]:
+            table.add_row(str(entry['line']), f"{entry['count']:,}", f"{entry['seconds'] * 1000:.2f}")
+        print(table)
+    table = Table(title="Instrucciones más ejecutadas")
+    table.add_column('función', style='cyan')
+    table.add_column('pc', justify='right')
+    table.add_column('instrucción')
+    table.add_column('línea', justify='right')
+    table.add_column('ejecuciones', justify='right')
+    for entry in report['hot_pcs'][:top]:
+        table.add_row(entry['function'], str(entry['pc']), entry['instruction'], str(entry['line'] or '-'), f"{entry['count']:,}")
+    print(table)
+
+def print_callgraph(report, top=15):
+    """
+    Muestra el perfil por función (CallGraph): llamadas, tiempo inclusivo
+    y exclusivo de cada función y las aristas llamador → llamado.
+    """
+    table = Table(title=f"Perfil por función ({report['seconds'] * 1000:.1f} ms)")
+    table.add_column('función', style='cyan')
+    table.add_column('llamadas', justify='right')
+    table.add_column('inclusivo (ms)', justify='right')
+    table.add_column('exclusivo (ms)', justify='right')
+    table.add_column('%', justify='right')
+    for entry in report['functions'][:top]:
+        table.add_row(entry['function'], f"{entry['calls']:,}", f"{entry['inclusive_seconds'] * 1000:.2f}",
+                      f"{entry['exclusive_seconds'] * 1000:.2f}", f"{entry['share']:.1%}")
+    print(table)
+    if report['edges']:
+        table = Table(title="Llamadas")
+        table.add_column('llamador', style='cyan')
+        table.add_column('llamado', style='cyan')
+        table.add_column('llamadas', justify='right')
+        table.add_column('inclusivo (ms)', justify='right')
+        for entry in report['edges'][:top]:
+            table.add_row(entry['caller'], entry['callee'], f"{entry['calls']:,}", f"{entry['inclusive_seconds'] * 1000:.2f}")
+        print(table)
+
+def print_memo(stats):
+    """
+    Muestra los aciertos y fallos de la caché de resultados de cada función
+    pura (Memoize), tal como los incluyen los perfiles.
+    """
+    table = Table(title="Funciones memorizadas")
+    table.add_column('función', style='cyan')
+    table.add_column('aciertos', justify='right')
+    table.add_column('fallos', justify='right')
+    table.add_column('% aciertos', justify='right')
+    table.add_column('entradas', justify='right')
+    table.add_column('desalojos', justify='right')
+    for entry in stats:
+        table.add_row(entry['function'], f"{entry['hits']:,}", f"{entry['misses']:,}", f"{entry['hit_rate']:.1%}",
+                      f"{entry['entries']:,}", f"{entry['evictions']:,}")
+    print(table)
+
+def generate_ir(content, fileName, debug=False, incremental=None):
+    """
+    Ejecuta las etapas de compilación (léxico, sintáctico, semántico y
+    generación de IR) sobre el contenido de un archivo .gox y devuelve el
+    módulo IR. Con un IncrementalCompiler, las funciones que no cambiaron
+    desde su compilación anterior no se vuelven a chequear ni a generar.
+    """
+    # Análisis léxico
+    lex = Lexer(fileName)
+    fileTokens = lex.tokenize(content)
+    if debug:
+        print(f"[bold yellow]Tokens generados:[/bold yellow] {fileTokens}")
+    print(f"[bold blue]Análisis léxico correcto:[/bold blue] Se detectaron {len(fileTokens)} tokens válidos en el archivo.")
+    
+    # Análisis sintáctico
+    parser = Parser(fileTokens, fileName)
+    top = parser.parse()
+    statements = top.stmts
+    if debug:
+        print(f"[bold yellow]Árbol sintáctico generado:[/bold yellow] {statements}")
+    print(f"[bold blue]Análisis sintáctico correcto:[/bold blue] El parser pudo construir un árbol sintáctico con {len(statements)} declaraciones sin errores.")
+    
+    # Funciones sin cambios desde la compilación anterior
+    reuse, fingerprints = incremental.plan(statements) if incremental is not None else ({}, None)
+
+    # Chequeo semántico
+    systab = Checker.check(top, fileName, reuse)
+    if debug:
+        systab.print()
+    print(f"[bold blue]Chequeo semántico correcto:[/bold blue] Todas las variables, tipos y expresiones cumplen con las reglas del lenguaje, sin errores detectados.")
+    
+    # Generación de código intermedio (IR)
+    module = IRCode.gencode(statements, fileName, reuse)
+    if debug:
+        module.dump()
+    print(f"[bold blue]Generación de código intermedio correcta:[/bold blue] El módulo IR fue generado exitosamente y está listo para su ejecución.")
+    if incremental is not None:
+        incremental.record(fingerprints, reuse, module)
+        stats = incremental.last
+        rebuilt = ', '.join(stats['rebuilt_names']) or 'ninguna'
+        print(f"[bold blue]Recompilación incremental:[/bold blue] {stats['reused']} de {stats['functions']} funciones reutilizadas "
+              f"({stats['reused_instructions']} instrucciones IR sin regenerar); regeneradas: {rebuilt}.")
+    if CONFIG.get("Inline", False):
+        # Sobre una copia: el IncrementalCompiler conserva las funciones sin expandir
+        module, report = inline_module(module, CONFIG.get("InlineBudget", 24))
+        print_inline_report(report)
+    return module
+
+def print_inline_report(report):
+    """
+    Muestra las llamadas expandidas en línea (Inline) y por qué quedaron
+    sin expandir las demás.
+    """
+    if not report['inlined']:
+        print(f"[bold blue]Expansión en línea:[/bold blue] ninguna llamada reemplazada por el cuerpo de la función.")
+    else:
+        table = Table(title=f"Llamadas expandidas en línea ({len(report['inlined'])})")
+        table.add_column('llamador', style='cyan')
+        table.add_column('función', style='cyan')
+        table.add_column('línea', justify='right')
+        table.add_column('instrucciones', justify='right')
+        for entry in report['inlined']:
+            table.add_row(entry['caller'], entry['callee'], str(entry['line'] or '-'), str(entry['instructions']))
+        print(table)
+    if report['skipped']:
+        skipped = ', '.join(f"{name} ({reason})" for name, reason in report['skipped'].items())
+        print(f"[bold blue]Sin expandir:[/bold blue] {skipped}.")
+
+def print_cache_stats(stats):
+    """
+    Muestra las estadísticas de la caché de compilación (CompileCache).
+    """
+    table = Table(title="Caché de compilación")
+    table.add_column('métrica', style='cyan')
+    table.add_column('valor', justify='right')
+    for key, value in stats.items():
+        table.add_row(key, f'{value:.1%}' if isinstance(value, float) else str(value))
+    print(table)
+
+def compile(file, incremental=None):
     """
     Función principal que ejecuta el proceso de compilación:
     análisis léxico, sintáctico, chequeo semántico, generación de código
     intermedio y ejecución en la máquina virtual.
     Muestra mensajes explicativos indicando por qué cada etapa es correcta.
+    incremental es el IncrementalCompiler del archivo (ver watch).
     """
     debug = CONFIG.get("Debug", False)
     print(f"[bold green]Compilando {file}...[/bold green]")
-    content = read_file(file)
+    is_bytecode = file.endswith('.goxc')
+    content = None if is_bytecode else read_file(file)
     fileName = create_output_directory(file)
     try:
-        # Análisis léxico
-        lex = Lexer(fileName)
-        fileTokens = lex.tokenize(content)
-        if debug:
-            print(f"[bold yellow]Tokens generados:[/bold yellow] {fileTokens}")
-        print(f"[bold blue]Análisis léxico correcto:[/bold blue] Se detectaron {len(fileTokens)} tokens válidos en el archivo.")
-        
-        # Análisis sintáctico
-        parser = Parser(fileTokens, fileName)
-        top = parser.parse()
-        statements = top.stmts
-        if debug:
-            print(f"[bold yellow]Árbol sintáctico generado:[/bold yellow] {statements}")
-        print(f"[bold blue]Análisis sintáctico correcto:[/bold blue] El parser pudo construir un árbol sintáctico con {len(statements)} declaraciones sin errores.")
-        
-        # Chequeo semántico
-        systab = Checker.check(top, fileName)
-        if debug:
-            systab.print()
-        print(f"[bold blue]Chequeo semántico correcto:[/bold blue] Todas las variables, tipos y expresiones cumplen con las reglas del lenguaje, sin errores detectados.")
-        
-        # Generación de código intermedio (IR)
-        module = IRCode.gencode(statements, fileName)
-        if debug:
-            module.dump()
-        print(f"[bold blue]Generación de código intermedio correcta:[/bold blue] El módulo IR fue generado exitosamente y está listo para su ejecución.")
-        
+        if is_bytecode:
+            # Módulo ya compilado: se carga sin repetir las etapas anteriores
+            module = read_module(file)
+            print(f"[bold blue]Bytecode cargado:[/bold blue] Se leyó el módulo IR con {len(module.functions)} funciones sin repetir el análisis ni la generación de código.")
+        elif COMPILE_CACHE is not None and (module := COMPILE_CACHE.get(content)) is not None:
+            # Mismo fuente, configuración y compilador: el módulo IR chequeado ya está en caché
+            print(f"[bold blue]Caché de compilación:[/bold blue] Se reutilizó el módulo IR chequeado de una compilación anterior del mismo código.")
+        else:
+            module = generate_ir(content, fileName, debug, incremental)
+            if COMPILE_CACHE is not None:
+                COMPILE_CACHE.put(content, module)
+            if CONFIG.get("GenerateOutputFile", False):
+                bytecode_file = os.path.join(os.path.dirname(__file__), 'output', fileName, f'{fileName}.goxc')
+                write_module(module, bytecode_file)
+                print(f"[bold blue][OUTPUT][/bold blue] Bytecode guardado en: {bytecode_file}")
+
         # Ejecución en la máquina virtual
-        vm = StackMachine()
+        vm = make_machine()
         vm.load_module(module)
         vm.run()
+        if CONFIG.get("HeapStats", False):
+            print_heap_stats(vm.heap.stats())
+        output_dir = os.path.join(os.path.dirname(__file__), 'output', fileName)
+        memo = None
+        if vm.profiler is not None:
+            os.makedirs(output_dir, exist_ok=True)
+            profile_file = os.path.join(output_dir, f'{fileName}_profile.json')
+            report = vm.profiler.save(profile_file, vm.functions)
+            print_profile(report)
+            memo = report['memo']
+            print(f"[bold blue][OUTPUT][/bold blue] Perfil de ejecución guardado en: {profile_file}")
+        if vm.callgraph is not None:
+            os.makedirs(output_dir, exist_ok=True)
+            callgraph_file = os.path.join(output_dir, f'{fileName}_callgraph.json')
+            folded_file = os.path.join(output_dir, f'{fileName}.folded')
+            report = vm.callgraph.save(callgraph_file, folded_file, vm.functions)
+            print_callgraph(report)
+            memo = report['memo']
+            print(f"[bold blue][OUTPUT][/bold blue] Grafo de llamadas guardado en: {callgraph_file} (pilas colapsadas: {folded_file})")
+        if memo:
+            print_memo(memo)
         print(f"[bold green]Ejecución correcta:[/bold green] El código IR se ejecutó sin errores, finalizando el proceso de compilación exitosamente.")
     except Exception as e:
         print(f"[bold red]Error durante la compilación:[/bold red] {e}")
 
-def run_tests():
-    """Ejecuta una serie de pruebas de compilación sobre archivos GOX predefinidos.
+def run_tests(pattern='tests/*.gox'):
+    """Compila y ejecuta, uno tras otro, los programas GOX que coinciden con el patrón.
     Cada archivo se compila y se muestra un mensaje indicando el resultado de la compilación.
+    Para lotes grandes, batch.py los ejecuta en paralelo.
     """
-    base_dir = './tests'
-    test_files = []
-
-    for i in range(12):
-        if i == 0:
-            test_files.append('Jhosuar.gox')
-        else:
-            test_files.append(f'Jhosuar{i}.gox')
+    test_files = discover(pattern)
+    if not test_files:
+        print(f"[bold red]No se encontraron archivos:[/bold red] {pattern}")
 
-    test_files += ['criba.gox', 'mandelplot.gox', 'Mauro.gox', 'Mauro1.gox', 'Mauro2.gox']
+    for file_path in test_files:
+        print(f"\n[bold magenta]=== Ejecutando test: {os.path.basename(file_path)} ===[/bold magenta]")
+        compile(file_path)
+    if COMPILE_CACHE is not None:
+        print_cache_stats(COMPILE_CACHE.stats())
 
-    for test_file in test_files:
-        file_path = os.path.join(base_dir, test_file)
-        if os.path.exists(file_path):
-            print(f"\n[bold magenta]=== Ejecutando test: {test_file} ===[/bold magenta]")
-            compile(file_path)
-        else:
-            print(f"[bold red]Archivo no encontrado:[/bold red] {file_path}")
+def watch(file_path, interval=0.5):
+    """
+    Vuelve a compilar y ejecutar file_path cada vez que cambia. Las funciones
+    que no cambiaron se reutilizan de la compilación anterior (source/incremental.py).
+    """
+    incremental = IncrementalCompiler()
+    last_mtime = None
+    print(f"[bold green]Observando {file_path} (Ctrl+C para terminar)...[/bold green]")
+    try:
+        while True:
+            mtime = os.path.getmtime(file_path)
+            if mtime != last_mtime:
+                last_mtime = mtime
+                compile(file_path, incremental)
+            time.sleep(interval)
+    except KeyboardInterrupt:
+        totals = incremental.totals
+        print(f"[bold blue]Recompilación incremental:[/bold blue] {totals['compilations']} compilaciones, "
+              f"{totals['reused']} funciones reutilizadas y {totals['rebuilt']} regeneradas.")
 
 if __name__ == '__main__':
-    run_tests()
+    # Sin argumentos se ejecutan los programas de tests/
+    if len(sys.argv) == 3 and sys.argv[1] == '--watch':
+        watch(sys.argv[2])
+    elif len(sys.argv) > 1:
+        for file_path in sys.argv[1:]:
+            compile(file_path)
+        if COMPILE_CACHE is not None:
+            print_cache_stats(COMPILE_CACHE.stats())
+    else:
+        run_tests()
 
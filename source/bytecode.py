@@ -0,0 +1,270 @@
+# bytecode.py
+#
+# Formato binario .goxc de un IRModule.
+#
+# Guarda exactamente lo que produce IRCode.gencode (globales, funciones con sus
+# parámetros, locales, slots, tabla de líneas y código IR sin enlazar), así que
+# el módulo leído se carga con StackMachine.load_module igual que uno recién
+# generado, sin volver a pasar por el lexer, el parser ni el checker.
+#
+# Estructura (little-endian):
+#
+#   cabecera     b'GOXC' u16 versión
+#   cadenas      u32 n, n x (u32 longitud, UTF-8)
+#   constantes   u32 n, n x (u8 etiqueta, valor)   ver _CONST_*
+#   globales     u32 n, n x (str nombre, str tipo, str tipo gox, u32 slot)
+#   funciones    u32 n, y por función:
+#                  str nombre, str tipo de retorno, str tipo gox de retorno,
+#                  u8 indicadores (_IMPORTED, _PURE),
+#                  u32 n parámetros x (str nombre, str tipo),
+#                  u32 n locales x (str nombre, str tipo, str tipo gox, u32 slot),
+#                  u32 n líneas x (u32 pc, u32 línea),
+#                  u32 n instrucciones x (u8 opcode, u32 constante)
+#
+# Los str son índices en la tabla de cadenas y NONE representa None (sin
+# tipo gox, sin slot o instrucción sin operando). Los operandos de las
+# instrucciones son índices en la tabla de constantes.
+#
+# La versión 1 no tenía el indicador _PURE (el byte era solo importada) y se
+# sigue leyendo.
+
+import struct
+
+from source.ircode import IRModule, IRFunction, IRGlobal
+
+MAGIC = b'GOXC'
+VERSION = 2
+NONE = 0xFFFFFFFF
+
+# Indicadores de cada función
+_IMPORTED = 1
+_PURE = 2
+
+# Enumeración de opcodes del IR. Solo se agregan al final: el número de cada
+# opcode forma parte del formato.
+OPCODES = (
+	'CONSTI', 'CONSTF',
+	'ADDI', 'SUBI', 'MULI', 'DIVI', 'ANDI', 'ORI',
+	'LTI', 'LEI', 'GTI', 'GEI', 'EQI', 'NEI',
+	'ADDF', 'SUBF', 'MULF', 'DIVF',
+	'LTF', 'LEF', 'GTF', 'GEF', 'EQF', 'NEF',
+	'ITOF', 'FTOI',
+	'LOCAL_GET', 'LOCAL_SET', 'GLOBAL_GET', 'GLOBAL_SET',
+	'CALL', 'RET',
+	'IF', 'ELSE', 'ENDIF',
+	'LOOP', 'CBREAK', 'CONTINUE', 'ENDLOOP',
+	'GROW',
+	'PEEKI', 'POKEI', 'PEEKF', 'POKEF', 'PEEKB', 'POKEB',
+	'PRINTI', 'PRINTF', 'PRINTB',
+	'TAILCALL',
+	'POP',
+)
+OPCODE_NUMBERS = { name: number for number, name in enumerate(OPCODES) }
+
+# Etiquetas de la tabla de constantes
+_CONST_INT = 0      # q
+_CONST_FLOAT = 1    # d
+_CONST_STR = 2      # I (índice de cadena)
+_CONST_BIGINT = 3   # I (índice de cadena con el entero en decimal)
+
+_U32 = struct.Struct('<I')
+_HEADER = struct.Struct('<4sH')
+_GLOBAL = struct.Struct('<IIII')
+_FUNCTION = struct.Struct('<IIIB')
+_PAIR = struct.Struct('<II')
+_LOCAL = struct.Struct('<IIII')
+_INSTR = struct.Struct('<BI')
+
+class _Tables:
+	'''
+	Tablas de cadenas y constantes que se van llenando al escribir.
+	'''
+	def __init__(self):
+		self.strings = { }
+		self.constants = { }     # clave -> índice en values
+		self.values = [ ]
+
+	def string(self, text):
+		if text is None:
+			return NONE
+		return self.strings.setdefault(text, len(self.strings))
+
+	def constant(self, value):
+		# El tipo forma parte de la clave (1 y 1.0 son constantes distintas) y los
+		# flotantes se comparan por sus bytes (0.0 y -0.0 también lo son)
+		key = (float, struct.pack('<d', value)) if isinstance(value, float) else (type(value), value)
+		index = self.constants.get(key)
+		if index is None:
+			if isinstance(value, bool) or not isinstance(value, (int, float, str)):
+				raise ValueError(f"No se puede guardar la constante {value!r} en bytecode.")
+			if isinstance(value, str):
+				self.string(value)
+			elif isinstance(value, int) and not -2**63 <= value < 2**63:
+				self.string(str(value))
+			index = self.constants[key] = len(self.values)
+			self.values.append(value)
+		return index
+
+def dumps(module):
+	'''
+	Devuelve los bytes .goxc del IRModule.
+	'''
+	tables = _Tables()
+	body = bytearray()
+
+	body += _U32.pack(len(module.globals))
+	for glob in module.globals.values():
+		body += _GLOBAL.pack(tables.string(glob.name), tables.string(glob.type), tables.string(glob.gox_type),
+			NONE if glob.slot is None else glob.slot)
+
+	body += _U32.pack(len(module.functions))
+	for func in module.functions.values():
+		body += _FUNCTION.pack(tables.string(func.name), tables.string(func.return_type),
+			tables.string(func.return_type_gox), (_IMPORTED if func.imported else 0) | (_PURE if func.pure else 0))
+		body += _U32.pack(len(func.parmnames))
+		for name, parmtype in zip(func.parmnames, func.parmtypes):
+			body += _PAIR.pack(tables.string(name), tables.string(parmtype))
+		names = list(dict.fromkeys([*func.slots, *func.locals]))
+		body += _U32.pack(len(names))
+		for name in names:
+			slot = func.slots.get(name)
+			body += _LOCAL.pack(tables.string(name), tables.string(func.locals.get(name)),
+				tables.string(func.locals_gox.get(name)), NONE if slot is None else slot)
+		body += _U32.pack(len(func.lines))
+		for pc, line in func.lines:
+			body += _PAIR.pack(pc, line)
+		body += _U32.pack(len(func.code))
+		for instr in func.code:
+			number = OPCODE_NUMBERS.get(instr[0])
+			if number is None or len(instr) > 2:
+				raise ValueError(f"Instrucción {instr} de '{func.name}' no representable en bytecode.")
+			body += _INSTR.pack(number, tables.constant(instr[1]) if len(instr) == 2 else NONE)
+
+	# Las constantes se escriben antes que el cuerpo pero agregan cadenas, así
+	# que se serializan primero y la tabla de cadenas queda completa.
+	constants = bytearray(_U32.pack(len(tables.values)))
+	for value in tables.values:
+		if isinstance(value, float):
+			constants += struct.pack('<Bd', _CONST_FLOAT, value)
+		elif isinstance(value, str):
+			constants += struct.pack('<BI', _CONST_STR, tables.strings[value])
+		elif -2**63 <= value < 2**63:
+			constants += struct.pack('<Bq', _CONST_INT, value)
+		else:
+			constants += struct.pack('<BI', _CONST_BIGINT, tables.strings[str(value)])
+
+	strings = bytearray(_U32.pack(len(tables.strings)))
+	for text in tables.strings:
+		encoded = text.encode('utf-8')
+		strings += _U32.pack(len(encoded)) + encoded
+
+	return _HEADER.pack(MAGIC, VERSION) + strings + constants + body
+
+def _records(data, offset, record):
+	# Lee un contador u32 y los registros que le siguen; devuelve (registros, nuevo offset)
+	count, = _U32.unpack_from(data, offset)
+	start = offset + 4
+	end = start + count * record.size
+	if end > len(data):
+		raise ValueError("Archivo .goxc truncado.")
+	return record.iter_unpack(data[start:end]), end
+
+def loads(data):
+	'''
+	Reconstruye el IRModule guardado en los bytes data.
+	'''
+	data = memoryview(data)
+	if len(data) < _HEADER.size:
+		raise ValueError("Archivo .goxc truncado.")
+	magic, version = _HEADER.unpack_from(data, 0)
+	if magic != MAGIC:
+		raise ValueError("No es un archivo .goxc.")
+	if version not in (1, VERSION):
+		raise ValueError(f"Versión de bytecode {version} no soportada (se esperaba {VERSION}).")
+	offset = _HEADER.size
+	try:
+		count, = _U32.unpack_from(data, offset)
+		offset += 4
+		strings = [ ]
+		for _ in range(count):
+			length, = _U32.unpack_from(data, offset)
+			offset += 4
+			strings.append(str(data[offset:offset + length], 'utf-8'))
+			offset += length
+		def text(index):
+			return None if index == NONE else strings[index]
+
+		count, = _U32.unpack_from(data, offset)
+		offset += 4
+		constants = [ ]
+		for _ in range(count):
+			tag = data[offset]
+			if tag == _CONST_INT:
+				constants.append(struct.unpack_from('<q', data, offset + 1)[0])
+			elif tag == _CONST_FLOAT:
+				constants.append(struct.unpack_from('<d', data, offset + 1)[0])
+			elif tag == _CONST_STR:
+				constants.append(strings[_U32.unpack_from(data, offset + 1)[0]])
+			elif tag == _CONST_BIGINT:
+				constants.append(int(strings[_U32.unpack_from(data, offset + 1)[0]]))
+			else:
+				raise ValueError(f"Etiqueta de constante desconocida: {tag}")
+			offset += 9 if tag in (_CONST_INT, _CONST_FLOAT) else 5
+
+		# Una sola tupla por opcode sin operando; las instrucciones son inmutables
+		bare = [ (name,) for name in OPCODES ]
+
+		module = IRModule()
+		records, offset = _records(data, offset, _GLOBAL)
+		for name, ir_type, gox_type, slot in records:
+			glob = IRGlobal(text(name), text(ir_type), text(gox_type), None if slot == NONE else slot)
+			module.globals[glob.name] = glob
+
+		count, = _U32.unpack_from(data, offset)
+		offset += 4
+		for _ in range(count):
+			name, return_type, return_type_gox, flags = _FUNCTION.unpack_from(data, offset)
+			offset += _FUNCTION.size
+			records, offset = _records(data, offset, _PAIR)
+			params = list(records)
+			func = IRFunction(module, text(name), [ strings[p] for p, _ in params ], [ strings[t] for _, t in params ],
+				text(return_type), text(return_type_gox), bool(flags & _IMPORTED))
+			func.pure = bool(flags & _PURE)
+
+			records, offset = _records(data, offset, _LOCAL)
+			for local, ir_type, gox_type, slot in records:
+				local = strings[local]
+				if ir_type != NONE:
+					func.locals[local] = strings[ir_type]
+				if gox_type != NONE:
+					func.locals_gox[local] = strings[gox_type]
+				if slot != NONE:
+					func.slots[local] = slot
+
+			records, offset = _records(data, offset, _PAIR)
+			func.lines = list(records)
+
+			records, offset = _records(data, offset, _INSTR)
+			func.code = [ bare[number] if operand == NONE else (OPCODES[number], constants[operand])
+				for number, operand in records ]
+		if offset != len(data):
+			raise ValueError("Archivo .goxc corrupto: sobran datos al final.")
+	except (struct.error, IndexError) as e:
+		raise ValueError(f"Archivo .goxc corrupto o truncado: {e}") from None
+	return module
+
+def write_module(module, path):
+	'''
+	Guarda el IRModule en el archivo .goxc path.
+	'''
+	data = dumps(module)
+	with open(path, 'wb') as f:
+		f.write(data)
+	return len(data)
+
+def read_module(path):
+	'''
+	Lee un archivo .goxc con una sola lectura y devuelve su IRModule.
+	'''
+	with open(path, 'rb') as f:
+		return loads(f.read())
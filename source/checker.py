@@ -29,13 +29,17 @@ class Checker():
 		self.createOutputFile = CONFIG.get("GenerateOutputFile", False)
 
 	@classmethod
-	def check(cls, n:Node, fileName:str):
+	def check(cls, n:Node, fileName:str, reuse=()):
 		'''
 		1. Crear una nueva tabla de simbolos
 		2. Visitar todas las declaraciones
+		reuse contiene los id() de las funciones que no cambiaron desde la
+		compilación anterior (source/incremental.py): se agregan a la TS
+		sin volver a chequear su cuerpo.
 		'''
 		check = cls()
 		check.fileName = fileName
+		check.reuse = reuse
 		if check.debug:
 			print(f"[bold green][DEBUG][/bold green] Iniciando análisis semántico del archivo '{fileName}'.")
 		env = Symtab("")
@@ -271,6 +275,8 @@ class Checker():
 			self.hasErrors = True
 			return
 		env.add(n.name, n)
+		if id(n) in self.reuse:
+			return
 		func_env = Symtab(n.name, env, n)
 		for param in n.params:
 			param.accept(self, func_env)
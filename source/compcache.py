@@ -0,0 +1,160 @@
+# compcache.py
+#
+# Caché en disco de módulos IR ya chequeados, direccionada por contenido.
+#
+# La clave es un SHA-256 del texto fuente, de los ajustes que cambian el IR
+# generado (CACHE_CONFIG_KEYS) y de una huella del propio compilador (el
+# contenido de los módulos del front end), así que editar el programa, la
+# configuración o el compilador produce otra clave y nunca se sirve un módulo
+# viejo. Cada entrada es un archivo .goxc (source/bytecode.py) escrito de forma
+# atómica, por lo que varios procesos (batch.py) pueden compartir la caché.
+#
+# El desalojo es LRU por tamaño total: un acierto actualiza la fecha de
+# modificación del archivo y, al guardar, se borran las entradas más antiguas
+# hasta que el total queda por debajo de max_bytes.
+
+import hashlib
+import json
+import os
+import tempfile
+
+from source.bytecode import dumps, loads, VERSION
+
+# Ajustes de settings/config.json que influyen en el IR generado
+CACHE_CONFIG_KEYS = ('IntSize', 'FloatSize', 'CharSize', 'EnableOptimizations', 'StrictTypeChecking', 'TailCalls',
+	'Inline', 'InlineBudget')
+
+# Módulos cuyo código determina el IR: si cambian, cambian todas las claves
+_COMPILER_MODULES = ('lexer.py', 'parser.py', 'checker.py', 'model.py', 'symtab.py', 'typesys.py', 'ircode.py', 'purity.py', 'inliner.py', 'bytecode.py')
+
+_fingerprint = None
+
+def compiler_fingerprint():
+	'''
+	Hash del código fuente del front end (se calcula una vez por proceso).
+	'''
+	global _fingerprint
+	if _fingerprint is None:
+		digest = hashlib.sha256(f'goxc{VERSION}'.encode())
+		source_dir = os.path.dirname(os.path.abspath(__file__))
+		for name in _COMPILER_MODULES:
+			with open(os.path.join(source_dir, name), 'rb') as f:
+				digest.update(name.encode() + b'\0' + f.read())
+		_fingerprint = digest.hexdigest()
+	return _fingerprint
+
+class CompilationCache:
+	'''
+	Caché de módulos IR en el directorio directory, limitada a max_bytes.
+	'''
+	SUFFIX = '.goxc'
+
+	def __init__(self, directory, max_bytes=64 * 1024 * 1024, config=None):
+		self.directory = directory
+		self.max_bytes = max_bytes
+		config = config or { }
+		self.config = { key: config.get(key) for key in CACHE_CONFIG_KEYS }
+		self.hits = 0
+		self.misses = 0
+		self.stores = 0
+		self.evictions = 0
+		os.makedirs(directory, exist_ok=True)
+
+	def key(self, source):
+		digest = hashlib.sha256(compiler_fingerprint().encode())
+		digest.update(json.dumps(self.config, sort_keys=True).encode())
+		digest.update(b'\0')
+		digest.update(source.encode('utf-8'))
+		return digest.hexdigest()
+
+	def _path(self, key):
+		return os.path.join(self.directory, key + self.SUFFIX)
+
+	def get(self, source):
+		'''
+		Devuelve el IRModule guardado para source, o None si no está.
+		'''
+		path = self._path(self.key(source))
+		try:
+			with open(path, 'rb') as f:
+				data = f.read()
+			module = loads(data)
+		except (OSError, ValueError):
+			# Ausente, desalojada por otro proceso o dañada: se recompila
+			self.misses += 1
+			return None
+		try:
+			os.utime(path)
+		except OSError:
+			pass
+		self.hits += 1
+		return module
+
+	def put(self, source, module):
+		'''
+		Guarda el IRModule compilado a partir de source y aplica el límite de tamaño.
+		'''
+		data = dumps(module)
+		fd, tmp_path = tempfile.mkstemp(dir=self.directory, suffix='.tmp')
+		try:
+			with os.fdopen(fd, 'wb') as f:
+				f.write(data)
+			os.replace(tmp_path, self._path(self.key(source)))
+		except BaseException:
+			if os.path.exists(tmp_path):
+				os.remove(tmp_path)
+			raise
+		self.stores += 1
+		self.evict()
+
+	def _entries(self):
+		entries = [ ]
+		with os.scandir(self.directory) as it:
+			for entry in it:
+				if entry.name.endswith(self.SUFFIX):
+					try:
+						stat = entry.stat()
+					except OSError:
+						continue
+					entries.append((stat.st_mtime, stat.st_size, entry.path))
+		return entries
+
+	def evict(self):
+		'''
+		Borra las entradas usadas hace más tiempo hasta quedar en max_bytes.
+		'''
+		entries = self._entries()
+		total = sum(size for _, size, _ in entries)
+		for _, size, path in sorted(entries):
+			if total <= self.max_bytes:
+				break
+			try:
+				os.remove(path)
+				self.evictions += 1
+			except OSError:
+				pass
+			total -= size
+
+	def clear(self):
+		for _, _, path in self._entries():
+			try:
+				os.remove(path)
+			except OSError:
+				pass
+
+	def stats(self):
+		'''
+		Aciertos, fallos, guardados y desalojos de este proceso y ocupación en disco.
+		'''
+		entries = self._entries()
+		lookups = self.hits + self.misses
+		return {
+			'hits': self.hits,
+			'misses': self.misses,
+			'hit_rate': self.hits / lookups if lookups else 0.0,
+			'stores': self.stores,
+			'evictions': self.evictions,
+			'entries': len(entries),
+			'bytes': sum(size for _, size, _ in entries),
+			'max_bytes': self.max_bytes,
+		}
@@ -0,0 +1,168 @@
+class Heap:
+    """Allocator for the VM memory above the static area.
+
+    Memory below the initial size (1024 bytes) is addressed directly by the
+    programs; GROW (the ^ operator) and the free/realloc host functions manage the
+    region above it:
+
+    - Requests are rounded up to a block size: powers of two from 8 to 4096
+      bytes (the size classes) and whole 4096-byte pages above that.
+    - Freed blocks go to a free list per size class (large blocks, to a list
+      per size, reused best-fit and split) and are reused, zero-filled,
+      before the heap grows. A freed large block merges with the free large
+      blocks right before and after it.
+    - Rounding changes the addresses ^ returns compared to packing requests
+      back to back (two ^12 are 64 bytes apart, not 48, and ^0 takes 8
+      bytes), and an access past the requested size but inside the block
+      does not raise.
+    - The heap grows by bumping Memory's logical size; Memory doubles its
+      capacity underneath, so growing rarely copies.
+    """
+
+    MIN_BLOCK = 8
+    PAGE = 4096
+
+    def __init__(self, memory):
+        self.memory = memory
+        self.base = memory.size
+        self.blocks = {}        # address -> [block size, requested bytes]
+        self.free_lists = { 1 << shift: [] for shift in range(3, 13) }
+        self.large_free = {}    # block size (pages) -> [addresses]
+        self.large_starts = {}  # address -> size of each free large block
+        self.large_ends = {}    # end address -> address of each free large block
+        self.in_use = 0         # requested bytes in live blocks
+        self.reserved = 0       # block bytes in live blocks
+        self.peak_in_use = 0
+        self.high_water = memory.size
+        self.allocations = 0
+        self.frees = 0
+        self.reallocs = 0
+        self.reuses = 0
+
+    @classmethod
+    def block_size(cls, num_bytes):
+        """Size of the block that serves a request of num_bytes."""
+        if num_bytes <= cls.MIN_BLOCK:
+            return cls.MIN_BLOCK
+        if num_bytes <= cls.PAGE:
+            return 1 << (num_bytes - 1).bit_length()
+        return -(-num_bytes // cls.PAGE) * cls.PAGE
+
+    def allocate(self, num_bytes):
+        """Return the address of a zero-filled block of at least num_bytes."""
+        if num_bytes < 0:
+            raise ValueError("Cannot grow memory by a negative amount.")
+        size = self.block_size(num_bytes)
+        address = self._take_free(size)
+        if address is None:
+            address = self.memory.grow(size)
+            self.high_water = max(self.high_water, self.memory.size)
+        else:
+            self.memory[address:address + size] = bytes(size)
+            self.reuses += 1
+        self.blocks[address] = [size, num_bytes]
+        self.allocations += 1
+        self.reserved += size
+        self.in_use += num_bytes
+        self.peak_in_use = max(self.peak_in_use, self.in_use)
+        return address
+
+    def free(self, address):
+        block = self.blocks.pop(address, None)
+        if block is None:
+            raise ValueError(f"free: address {address} is not an allocated heap block.")
+        size, requested = block
+        self._release(address, size)
+        self.frees += 1
+        self.reserved -= size
+        self.in_use -= requested
+
+    def realloc(self, address, num_bytes):
+        """Resize the block at address (0 allocates a new one) and return its address."""
+        if address == 0:
+            return self.allocate(num_bytes)
+        block = self.blocks.get(address)
+        if block is None:
+            raise ValueError(f"realloc: address {address} is not an allocated heap block.")
+        if num_bytes < 0:
+            raise ValueError("realloc: size cannot be negative.")
+        self.reallocs += 1
+        size, requested = block
+        if self.block_size(num_bytes) == size:
+            # Same block: clear what the block no longer holds, keep the rest.
+            if num_bytes < requested:
+                self.memory[address + num_bytes:address + requested] = bytes(requested - num_bytes)
+            block[1] = num_bytes
+            self.in_use += num_bytes - requested
+            self.peak_in_use = max(self.peak_in_use, self.in_use)
+            return address
+        new_address = self.allocate(num_bytes)
+        keep = min(requested, num_bytes)
+        self.memory[new_address:new_address + keep] = self.memory[address:address + keep]
+        self.free(address)
+        return new_address
+
+    def _take_free(self, size):
+        free_list = self.free_lists.get(size)
+        if free_list is not None:
+            return free_list.pop() if free_list else None
+        fits = [ block_size for block_size, addresses in self.large_free.items() if block_size >= size and addresses ]
+        if not fits:
+            return None
+        best = min(fits)
+        address = self.large_free[best].pop()
+        del self.large_starts[address], self.large_ends[address + best]
+        if best > size:
+            self._release(address + size, best - size)
+        return address
+
+    def _release(self, address, size):
+        free_list = self.free_lists.get(size)
+        if free_list is not None:
+            free_list.append(address)
+            return
+        # Coalesce with the free large blocks on either side.
+        following = self.large_starts.get(address + size)
+        if following is not None:
+            self._unlink_large(address + size, following)
+            size += following
+        preceding = self.large_ends.get(address)
+        if preceding is not None:
+            preceding_size = self.large_starts[preceding]
+            self._unlink_large(preceding, preceding_size)
+            address = preceding
+            size += preceding_size
+        self.large_free.setdefault(size, []).append(address)
+        self.large_starts[address] = size
+        self.large_ends[address + size] = address
+
+    def _unlink_large(self, address, size):
+        self.large_free[size].remove(address)
+        del self.large_starts[address], self.large_ends[address + size]
+
+    def stats(self):
+        """Occupancy, fragmentation and high-water figures for the heap."""
+        free_blocks = [ size for size, addresses in self.free_lists.items() for _ in addresses ]
+        free_blocks += [ size for size, addresses in self.large_free.items() for _ in addresses ]
+        free_bytes = sum(free_blocks)
+        heap_size = self.memory.size - self.base
+        return {
+            'heap_base': self.base,
+            'heap_size': heap_size,
+            'capacity': len(self.memory),
+            'high_water': self.high_water,
+            'live_blocks': len(self.blocks),
+            'in_use': self.in_use,
+            'peak_in_use': self.peak_in_use,
+            'reserved': self.reserved,
+            'free_bytes': free_bytes,
+            'largest_free_block': max(free_blocks, default=0),
+            # Bytes lost to rounding requests up to a block size
+            'internal_fragmentation': self.reserved - self.in_use,
+            # Share of the heap sitting in free blocks
+            'external_fragmentation': free_bytes / heap_size if heap_size else 0.0,
+            'allocations': self.allocations,
+            'frees': self.frees,
+            'reallocs': self.reallocs,
+            'reuses': self.reuses,
+        }
@@ -0,0 +1,304 @@
+from array import array
+from functools import partial
+from itertools import accumulate
+import math
+import struct
+
+from source.memory import FLOAT32_MAX
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+# The vec_* functions use NumPy when it is installed; set to False to force
+# the pure-Python implementations. Results and errors match, except that
+# vec_dotf may round differently (NumPy sums pairwise).
+USE_NUMPY = numpy is not None
+
+
+class HostFunction:
+    """A Python implementation that an "import func" declaration can bind to.
+
+    func is called as func(vm, *args) with plain int/float arguments and may
+    read and write vm.memory. params are the IR types ('I'/'F') the GoxLang
+    declaration must use.
+    """
+
+    __slots__ = ('name', 'params', 'func')
+
+    def __init__(self, name, params, func):
+        self.name = name
+        self.params = tuple(params)
+        self.func = func
+
+
+# name -> HostFunction
+HOST_FUNCTIONS = {}
+
+
+def register_host_function(name, params, func):
+    """Make func available to programs that declare "import func name(...)"."""
+    HOST_FUNCTIONS[name] = HostFunction(name, params, func)
+
+
+def host_function(name, params):
+    """Decorator form of register_host_function()."""
+    def decorator(func):
+        register_host_function(name, params, func)
+        return func
+    return decorator
+
+
+def bind_host_function(vm, func_def):
+    """Return a callable for an imported IRFunction, or None if nothing matches.
+
+    A host function is bound only when the declaration has its parameter
+    types: an import that happens to share a name (sum, sort, free...) with
+    a different signature stays a plain imported function that does nothing.
+    """
+    host = HOST_FUNCTIONS.get(func_def.name)
+    if host is None or tuple(func_def.parmtypes) != host.params:
+        return None
+    return partial(host.func, vm)
+
+
+# --- Memory helpers ---
+
+def _check_range(vm, name, address, size):
+    if size < 0:
+        raise ValueError(f"{name}: size cannot be negative, got {size}")
+    if address < 0 or address + size > vm.memory.size:
+        raise IndexError(f"{name}: Memory access out of bounds. Address: {address}, Size: {size}, Memory size: {vm.memory.size}")
+
+
+def _typed_array(vm, name, address, count, kind):
+    """Return a cast() view over count ints ('I') or floats ('F') at address, or None if unaligned."""
+    memory = vm.memory
+    if kind == 'I':
+        item_size, view = memory.int_size, memory.ints
+    else:
+        item_size, view = memory.float_size, memory.floats
+    _check_range(vm, name, address, count * item_size)
+    if view is not None and address % item_size == 0:
+        start = address // item_size
+        return view[start:start + count]
+    return None
+
+
+def _read_array(vm, name, address, count, kind):
+    view = _typed_array(vm, name, address, count, kind)
+    if view is not None:
+        return view
+    memory = vm.memory
+    if kind == 'I':
+        packer, item_size, read = memory.int_struct, memory.int_size, memory.read_int
+    else:
+        packer, item_size, read = memory.float_struct, memory.float_size, memory.read_float
+    if packer is not None:
+        return struct.unpack_from(f'<{count}{packer.format[-1]}', memory, address)
+    return [read(address + index * item_size) for index in range(count)]
+
+
+def _write_array(vm, name, address, values, kind):
+    """Store values at address; overflowing values raise before anything is written."""
+    memory = vm.memory
+    if kind == 'F' and memory.float_size == 4:
+        for value in values:
+            if math.isfinite(value) and abs(value) > FLOAT32_MAX:
+                raise OverflowError(f"{name}: float {value} does not fit in {memory.float_size} bytes")
+    view = _typed_array(vm, name, address, len(values), kind)
+    if view is not None:
+        # array() checks the range of every value before the slice is assigned.
+        view[:] = array(view.format, values)
+        return
+    if kind == 'I':
+        item_size, write = memory.int_size, memory.write_int
+        for value in values:
+            value.to_bytes(item_size, byteorder='little', signed=True)
+    else:
+        item_size, write = memory.float_size, memory.write_float
+    for index, value in enumerate(values):
+        write(address + index * item_size, value)
+
+
+# --- Heap (source/heap.py) ---
+
+@host_function('free', ('I',))
+def _free(vm, address):
+    vm.heap.free(address)
+    return 0
+
+
+@host_function('realloc', ('I', 'I'))
+def _realloc(vm, address, size):
+    return vm.heap.realloc(address, size)
+
+
+# --- Bulk memory ---
+
+@host_function('memcpy', ('I', 'I', 'I'))
+def _memcpy(vm, dest, src, size):
+    _check_range(vm, 'memcpy', src, size)
+    _check_range(vm, 'memcpy', dest, size)
+    # The right-hand slice is a copy, so overlapping ranges behave like memmove.
+    vm.memory[dest:dest + size] = vm.memory[src:src + size]
+    return dest
+
+
+@host_function('memory_copy', ('I', 'I', 'I'))
+def _memory_copy(vm, src, dest, size):
+    return _memcpy(vm, dest, src, size)
+
+
+@host_function('memset', ('I', 'I', 'I'))
+def _memset(vm, dest, value, size):
+    if value < 0 or value > 255:
+        raise ValueError(f"memset: Byte value must be 0-255, got {value}")
+    _check_range(vm, 'memset', dest, size)
+    vm.memory[dest:dest + size] = bytes((value,)) * size
+    return dest
+
+
+# --- Int arrays (count elements of IntSize bytes) ---
+
+@host_function('sort', ('I', 'I'))
+def _sort(vm, address, count):
+    _write_array(vm, 'sort', address, sorted(_read_array(vm, 'sort', address, count, 'I')), 'I')
+    return count
+
+
+@host_function('external_sort', ('I', 'I'))
+def _external_sort(vm, address, count):
+    return _sort(vm, address, count)
+
+
+@host_function('sum', ('I', 'I'))
+def _sum(vm, address, count):
+    return sum(_read_array(vm, 'sum', address, count, 'I'))
+
+
+@host_function('min', ('I', 'I'))
+def _min(vm, address, count):
+    if count <= 0:
+        raise ValueError("min: empty array")
+    return min(_read_array(vm, 'min', address, count, 'I'))
+
+
+@host_function('max', ('I', 'I'))
+def _max(vm, address, count):
+    if count <= 0:
+        raise ValueError("max: empty array")
+    return max(_read_array(vm, 'max', address, count, 'I'))
+
+
+# --- Vector operations (count elements; the *f variants work on float arrays) ---
+# dest may overlap the sources: every result is computed before it is stored.
+
+def _use_numpy(vm, kind):
+    # Int results are computed in int64, which is only exact for narrower ints.
+    return USE_NUMPY and (kind == 'F' or vm.memory.int_size < 8)
+
+
+def _numpy_array(vm, name, address, count, kind):
+    """Return a NumPy array sharing count ints ('I') or floats ('F') at address with VM memory.
+
+    The array exports the bytearray's buffer, so Memory cannot grow while it
+    exists; never keep one beyond the host function call.
+    """
+    memory = vm.memory
+    item_size = memory.int_size if kind == 'I' else memory.float_size
+    _check_range(vm, name, address, count * item_size)
+    dtype = f"<{'i' if kind == 'I' else 'f'}{item_size}"
+    if count == 0:
+        return numpy.empty(0, dtype=dtype)
+    return numpy.frombuffer(memory, dtype=dtype, count=count, offset=address)
+
+
+def _numpy_wide(vm, name, address, count, kind):
+    """Like _numpy_array(), as an int64/float64 copy to compute with."""
+    return _numpy_array(vm, name, address, count, kind).astype(numpy.int64 if kind == 'I' else numpy.float64)
+
+
+def _numpy_store(vm, name, address, result, kind):
+    target = _numpy_array(vm, name, address, len(result), kind)
+    if not len(result):
+        return
+    if kind == 'I':
+        limits = numpy.iinfo(target.dtype)
+        if result.min() < limits.min or result.max() > limits.max:
+            raise OverflowError(f"{name}: result does not fit in {target.dtype.itemsize}-byte ints")
+    elif target.dtype.itemsize == 4:
+        finite = result[numpy.isfinite(result)]
+        if finite.size and numpy.abs(finite).max() > FLOAT32_MAX:
+            raise OverflowError(f"{name}: result does not fit in {target.dtype.itemsize}-byte floats")
+    target[:] = result
+
+
+def _vec_add(vm, dest, a, b, count, kind='I'):
+    name = 'vec_add' if kind == 'I' else 'vec_addf'
+    if _use_numpy(vm, kind):
+        result = _numpy_wide(vm, name, a, count, kind) + _numpy_wide(vm, name, b, count, kind)
+        _numpy_store(vm, name, dest, result, kind)
+    else:
+        values = [x + y for x, y in zip(_read_array(vm, name, a, count, kind), _read_array(vm, name, b, count, kind))]
+        _write_array(vm, name, dest, values, kind)
+    return dest
+
+
+def _vec_scale(vm, dest, src, factor, count, kind='I'):
+    name = 'vec_scale' if kind == 'I' else 'vec_scalef'
+    # A factor this large overflows int64; the Python path reports it exactly.
+    if _use_numpy(vm, kind) and (kind == 'F' or abs(factor) < 1 << 31):
+        result = _numpy_wide(vm, name, src, count, kind) * factor
+        _numpy_store(vm, name, dest, result, kind)
+    else:
+        values = [x * factor for x in _read_array(vm, name, src, count, kind)]
+        _write_array(vm, name, dest, values, kind)
+    return dest
+
+
+def _vec_dot(vm, a, b, count, kind='I'):
+    name = 'vec_dot' if kind == 'I' else 'vec_dotf'
+    if _use_numpy(vm, kind):
+        left = _numpy_wide(vm, name, a, count, kind)
+        right = _numpy_wide(vm, name, b, count, kind)
+        if kind == 'F':
+            return float(numpy.dot(left, right))
+        if not count:
+            return 0
+        # The int64 dot product is exact while this bound holds.
+        if int(numpy.abs(left).max()) * int(numpy.abs(right).max()) * count < 1 << 63:
+            return int(numpy.dot(left, right))
+        return sum(x * y for x, y in zip(left.tolist(), right.tolist()))
+    return sum(x * y for x, y in zip(_read_array(vm, name, a, count, kind), _read_array(vm, name, b, count, kind)))
+
+
+def _vec_fill(vm, dest, value, count, kind='I'):
+    name = 'vec_fill' if kind == 'I' else 'vec_fillf'
+    if count < 0:
+        raise ValueError(f"{name}: count cannot be negative, got {count}")
+    if _use_numpy(vm, kind) and (kind == 'F' or abs(value) < 1 << 63):
+        result = numpy.full(count, value, dtype=numpy.int64 if kind == 'I' else numpy.float64)
+        _numpy_store(vm, name, dest, result, kind)
+    else:
+        _write_array(vm, name, dest, [value] * count, kind)
+    return dest
+
+
+def _vec_prefix_sum(vm, dest, src, count, kind='I'):
+    name = 'vec_prefix_sum' if kind == 'I' else 'vec_prefix_sumf'
+    if _use_numpy(vm, kind):
+        result = numpy.cumsum(_numpy_wide(vm, name, src, count, kind))
+        _numpy_store(vm, name, dest, result, kind)
+    else:
+        _write_array(vm, name, dest, list(accumulate(_read_array(vm, name, src, count, kind))), kind)
+    return dest
+
+
+for _suffix, _kind in (('', 'I'), ('f', 'F')):
+    register_host_function('vec_add' + _suffix, ('I', 'I', 'I', 'I'), partial(_vec_add, kind=_kind))
+    register_host_function('vec_scale' + _suffix, ('I', 'I', _kind, 'I'), partial(_vec_scale, kind=_kind))
+    register_host_function('vec_dot' + _suffix, ('I', 'I', 'I'), partial(_vec_dot, kind=_kind))
+    register_host_function('vec_fill' + _suffix, ('I', _kind, 'I'), partial(_vec_fill, kind=_kind))
+    register_host_function('vec_prefix_sum' + _suffix, ('I', 'I', 'I'), partial(_vec_prefix_sum, kind=_kind))
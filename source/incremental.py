@@ -0,0 +1,153 @@
+# incremental.py
+#
+# Recompilación incremental por función.
+#
+# Cada función de nivel superior recibe una huella: un SHA-256 de su árbol
+# sintáctico (con las líneas relativas al inicio de la función, para que
+# moverla dentro del archivo no la invalide) y de lo que sus nombres
+# significaban en el ámbito global al declararla: la firma de las funciones
+# que llama y el tipo de las globales que usa. Si la huella coincide con la
+# de la compilación anterior, el checker no vuelve a recorrer su cuerpo y
+# IRCode copia la IRFunction guardada en lugar de regenerarla. El código de
+# nivel superior (la función 'main' del módulo) se regenera siempre.
+#
+# Uso:
+#
+#     incremental = IncrementalCompiler()
+#     module = incremental.compile(content, fileName)   # cada vez que cambia el fuente
+#     incremental.last                                   # funciones reusadas y regeneradas
+
+import hashlib
+import time
+
+from source.lexer import Lexer
+from source.parser import Parser
+from source.checker import Checker
+from source.ircode import IRCode
+from source.model import Node, Variable, Function, Parameter, NamedLocation, FunctionCall
+
+# Atributos que agregan el checker e IRCode al recorrer el árbol
+_ANNOTATIONS = ('usage', 'store_value')
+
+def _canonical(value, base):
+	# Forma estable del subárbol: clase, atributos y líneas relativas a base
+	if isinstance(value, Node):
+		fields = [ type(value).__name__ ]
+		for key, item in sorted(vars(value).items()):
+			if key in _ANNOTATIONS:
+				continue
+			if key == 'lineNo':
+				item = item - base if item else 0
+			fields.append((key, _canonical(item, base)))
+		return tuple(fields)
+	if isinstance(value, (list, tuple)):
+		return tuple(_canonical(item, base) for item in value)
+	return value
+
+def _walk(value):
+	# Todos los nodos del subárbol
+	if isinstance(value, Node):
+		yield value
+		for key, item in vars(value).items():
+			if key not in _ANNOTATIONS:
+				yield from _walk(item)
+	elif isinstance(value, (list, tuple)):
+		for item in value:
+			yield from _walk(item)
+
+def _signature(node):
+	# Lo que el resto del programa ve de una declaración global
+	if isinstance(node, Function):
+		return ('func', tuple(p.type for p in node.params), node.func_type, node.imported)
+	# Sin tipo declarado, el tipo lo infiere el checker a partir del valor
+	return ('var', node.type, node.is_const, None if node.type else _canonical(node.value, 0))
+
+class IncrementalCompiler:
+	'''
+	Compila sucesivas versiones de un mismo programa reusando las funciones
+	que no cambiaron. last tiene las estadísticas de la última compilación
+	y totals las acumuladas.
+	'''
+	def __init__(self):
+		self.functions = { }     # nombre -> (huella, IRFunction, línea de la declaración)
+		self.last = None
+		self.totals = { 'compilations': 0, 'functions': 0, 'reused': 0, 'rebuilt': 0 }
+
+	def fingerprint(self, node, scope):
+		'''
+		Huella de la función node dado el ámbito global declarado antes que ella.
+		'''
+		names = { node.name }
+		for child in _walk(node):
+			if isinstance(child, (Variable, Parameter, NamedLocation, FunctionCall)):
+				names.add(child.name)
+		deps = tuple((name, scope.get(name)) for name in sorted(names))
+		return hashlib.sha256(repr((_canonical(node, node.lineNo), deps)).encode()).hexdigest()
+
+	def plan(self, statements):
+		'''
+		Calcula la huella de cada función y devuelve (reuse, huellas): reuse
+		asocia el id() de cada función sin cambios a (IRFunction guardada,
+		desplazamiento de líneas), como lo esperan Checker.check e IRCode.gencode.
+		'''
+		scope = { }
+		reuse = { }
+		fingerprints = [ ]
+		for stmt in statements:
+			if isinstance(stmt, Function):
+				fingerprint = self.fingerprint(stmt, scope)
+				fingerprints.append((stmt, fingerprint))
+				cached = self.functions.get(stmt.name)
+				if cached is not None and cached[0] == fingerprint:
+					reuse[id(stmt)] = (cached[1], stmt.lineNo - cached[2])
+				scope[stmt.name] = _signature(stmt)
+			else:
+				# Las variables de nivel superior son globales, aun dentro de if/while
+				for child in _walk(stmt):
+					if isinstance(child, Variable):
+						scope[child.name] = _signature(child)
+		return reuse, fingerprints
+
+	def compile(self, content, fileName):
+		'''
+		Compila content y devuelve el IRModule, regenerando solo las funciones que cambiaron.
+		'''
+		start = time.perf_counter()
+		tokens = Lexer(fileName).tokenize(content)
+		top = Parser(tokens, fileName).parse()
+		module = self.build(top, fileName)
+		self.last['seconds'] = time.perf_counter() - start
+		return module
+
+	def build(self, top, fileName):
+		'''
+		Chequea y genera el IR del Program top ya analizado.
+		'''
+		reuse, fingerprints = self.plan(top.stmts)
+		Checker.check(top, fileName, reuse)
+		module = IRCode.gencode(top.stmts, fileName, reuse)
+		self.record(fingerprints, reuse, module)
+		return module
+
+	def record(self, fingerprints, reuse, module):
+		'''
+		Guarda las funciones del módulo recién generado (solo se llama si la
+		compilación terminó sin errores) y actualiza las estadísticas.
+		'''
+		self.functions = {
+			stmt.name: (fingerprint, module.functions['_actual_main' if stmt.name == 'main' else stmt.name], stmt.lineNo)
+			for stmt, fingerprint in fingerprints
+		}
+		rebuilt = [ stmt.name for stmt, _ in fingerprints if id(stmt) not in reuse ]
+		self.last = {
+			'functions': len(fingerprints),
+			'reused': len(reuse),
+			'rebuilt': len(rebuilt),
+			'rebuilt_names': rebuilt,
+			'reused_instructions': sum(len(irfunc.code) for irfunc, _ in reuse.values()),
+			'seconds': 0.0,
+		}
+		self.totals['compilations'] += 1
+		self.totals['functions'] += len(fingerprints)
+		self.totals['reused'] += len(reuse)
+		self.totals['rebuilt'] += len(rebuilt)
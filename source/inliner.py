@@ -0,0 +1,179 @@
+# inliner.py
+#
+# Expansión en línea de funciones pequeñas sobre un IRModule.
+#
+# Cada CALL (o TAILCALL) a una función GoxLang pequeña y no recursiva se
+# reemplaza por una copia de su cuerpo. Los parámetros y las variables locales
+# del llamado pasan a ser temporales del llamador (new_temp de source/ircode.py)
+# y los argumentos, que ya están en la pila, se guardan en ellos:
+#
+#   CONSTI 5; CALL doble          ->  CONSTI 5
+#                                     LOCAL_SET $temp1         (parámetro x)
+#   func doble(x int) int {           LOCAL_GET $temp1
+#       return x * 2;                 CONSTI 2
+#   }                                 MULI
+#
+# El valor de retorno queda en la pila igual que después de CALL; en un sitio
+# TAILCALL el cuerpo termina con el RET del llamador.
+#
+# Solo se expanden funciones que terminan con su único return (el IR
+# estructurado no tiene saltos para salir antes) y cuyas variables locales se
+# asignan, en orden lineal y fuera de todo IF/LOOP, antes de leerse: una
+# temporal que se reutiliza en cada vuelta de un bucle no debe dejar ver el
+# valor de la vuelta anterior donde la función habría fallado.
+#
+# Heurística de tamaño/beneficio: una función se expande si tiene a lo sumo
+# budget instrucciones IR, o el doble si la llamada está dentro de un bucle
+# (donde se ahorra el CALL/RET en cada vuelta). Las funciones se procesan en
+# orden de declaración, así que un llamado ya tiene expandidas sus propias
+# llamadas cuando se mide su tamaño.
+#
+# El pase devuelve un módulo nuevo; el original no se modifica (la
+# recompilación incremental guarda sus IRFunction).
+
+from source.ircode import ENTRY_POINTS, IRModule, new_temp
+
+
+def _pc_lines(func):
+	# Línea del fuente de cada instrucción, 0 donde no se conoce
+	lines = [0] * len(func.code)
+	starts = func.lines + [(len(lines), 0)]
+	for (start, line), (end, _) in zip(starts, starts[1:]):
+		lines[start:end] = [line] * (end - start)
+	return lines
+
+def _line_table(lines):
+	# Inversa de _pc_lines: (pc inicial, línea) de cada tramo
+	table = [ ]
+	for pc, line in enumerate(lines):
+		if (table[-1][1] if table else 0) != line:
+			table.append((pc, line))
+	return table
+
+def _reads_unassigned(func, assigned=()):
+	# assigned: temporales de expansiones anteriores, que siempre se asignan antes de leerse
+	seen = set(func.parmnames)
+	seen.update(assigned)
+	depth = 0
+	for instr in func.code:
+		opname = instr[0]
+		if opname == 'IF' or opname == 'LOOP':
+			depth += 1
+		elif opname == 'ENDIF' or opname == 'ENDLOOP':
+			depth -= 1
+		elif opname == 'LOCAL_GET' or opname == 'LOCAL_SET':
+			if instr[1] in seen:
+				continue
+			seen.add(instr[1])
+			if opname == 'LOCAL_GET' or depth:
+				return True
+	return False
+
+def rejection(func, temps=()):
+	'''
+	Motivo por el que func no se puede expandir en línea, o None si se puede.
+	temps son las temporales que el pase ya agregó a func.
+	'''
+	if func.imported:
+		return 'importada'
+	if func.name in ENTRY_POINTS:
+		return 'punto de entrada'
+	code = func.code
+	if not code or code[-1][0] not in ('RET', 'TAILCALL'):
+		return 'no termina en return'
+	if any(instr[0] in ('RET', 'TAILCALL') for instr in code[:-1]):
+		return 'más de un return'
+	if any(instr[0] in ('CALL', 'TAILCALL') and instr[1] == func.name for instr in code):
+		return 'recursiva'
+	if _reads_unassigned(func, temps):
+		return 'puede leer variables sin asignar'
+	return None
+
+def _expand(caller, callee, site, site_line):
+	'''
+	Instrucciones y líneas que reemplazan a la llamada site (CALL o TAILCALL)
+	a callee dentro de caller.
+	'''
+	renames = { }
+	for name, ir_type in callee.locals.items():
+		renames[name] = new_temp()
+		caller.new_local(renames[name], ir_type, callee.locals_gox.get(name))
+	code = [ ('LOCAL_SET', renames[name]) for name in reversed(callee.parmnames) ]
+	lines = [site_line] * len(code)
+	callee_lines = _pc_lines(callee)
+	for instr, line in zip(callee.code[:-1], callee_lines):
+		if instr[0] == 'LOCAL_GET' or instr[0] == 'LOCAL_SET':
+			instr = (instr[0], renames[instr[1]])
+		code.append(instr)
+		lines.append(line)
+	last = callee.code[-1]
+	tail = None
+	if last[0] == 'TAILCALL':
+		# return g(...) del llamado: en un CALL sigue como llamada normal
+		tail = last if site[0] == 'TAILCALL' else ('CALL', last[1])
+	elif site[0] == 'TAILCALL':
+		tail = ('RET',)
+	if tail is not None:
+		code.append(tail)
+		lines.append(callee_lines[-1])
+	return code, lines
+
+def inline_module(module, budget=24):
+	'''
+	Devuelve (módulo con las llamadas pequeñas expandidas, informe). El
+	informe tiene 'inlined', una entrada por llamada expandida (llamador,
+	función, línea, instrucciones), y 'skipped', para cada función con alguna
+	llamada que quedó sin expandir, el motivo.
+	'''
+	result = IRModule()
+	result.globals = dict(module.globals)
+	for func in module.functions.values():
+		func.copy(result)
+	report = { 'inlined': [ ], 'skipped': { } }
+	# Los llamados se declaran antes que sus llamadores; 'main' llama a todos
+	order = [ name for name in result.functions if name != 'main' ]
+	if 'main' in result.functions:
+		order.append('main')
+	reasons = { }
+	temps = { }
+	for name in order:
+		caller = result.functions[name]
+		if caller.imported:
+			continue
+		before = set(caller.locals)
+		old_lines = _pc_lines(caller)
+		code = [ ]
+		lines = [ ]
+		depth = 0
+		for instr, line in zip(caller.code, old_lines):
+			opname = instr[0]
+			if opname == 'LOOP':
+				depth += 1
+			elif opname == 'ENDLOOP':
+				depth -= 1
+			elif (opname == 'CALL' or opname == 'TAILCALL') and instr[1] in result.functions:
+				callee = result.functions[instr[1]]
+				if callee.name not in reasons:
+					reasons[callee.name] = rejection(callee, temps.get(callee.name, ()))
+				reason = reasons[callee.name]
+				if reason is None and len(callee.code) > (budget * 2 if depth else budget):
+					reason = f'{len(callee.code)} instrucciones'
+				if reason is None:
+					expansion, expansion_lines = _expand(caller, callee, instr, line)
+					code.extend(expansion)
+					lines.extend(expansion_lines)
+					report['inlined'].append({
+						'caller': caller.name,
+						'callee': callee.name,
+						'line': line,
+						'instructions': len(expansion),
+					})
+					continue
+				if not callee.imported and callee.name not in ENTRY_POINTS:
+					report['skipped'][callee.name] = reason
+			code.append(instr)
+			lines.append(line)
+		caller.code = code
+		caller.lines = _line_table(lines)
+		temps[name] = set(caller.locals) - before
+	return result, report
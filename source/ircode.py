@@ -5,6 +5,7 @@ from functools import singledispatchmethod
 from source.model  import *
 from source.symtab import Symtab
 from source.typesys import typenames, check_binop, check_unaryop
+from source.purity import pure_functions
 import json,os
 # Load configuration
 def load_config():
@@ -28,6 +29,12 @@ class IRModule:
 		self.functions = { }       # Dict de funciones IR 
 		self.globals = { }         # Dict de variables global
 		
+	def new_global(self, name, ir_type, gox_type=None):
+		# Cada global recibe un slot numérico fijo en orden de declaración
+		slot = self.globals[name].slot if name in self.globals else len(self.globals)
+		self.globals[name] = IRGlobal(name, ir_type, gox_type, slot)
+		return self.globals[name]
+		
 	def dump(self):
 		print("MODULE:::")
 		for glob in self.globals.values():
@@ -38,10 +45,11 @@ class IRModule:
 			
 # Variables Globales
 class IRGlobal:
-	def __init__(self, name, ir_type, gox_type=None):
+	def __init__(self, name, ir_type, gox_type=None, slot=None):
 		self.name = name
 		self.type = ir_type      # Tipo IR
 		self.gox_type = gox_type # Tipo GoxLang original
+		self.slot = slot         # Posición en la tabla de globales de la VM
 		
 	def dump(self):
 		print(f"GLOBAL::: {self.name}: {self.type}")
@@ -63,20 +71,45 @@ class IRFunction:
 		self.return_type = return_type
 		self.return_type_gox = return_type_gox
 		self.imported = imported
+		self.pure = False        # Sin efectos ni dependencia de globales (source/purity.py)
 		self.locals = { }        # Variables Locales (tipo IR)
 		self.locals_gox = { }    # Tipos GoxLang originales
+		self.slots = { }         # Nombre -> slot del frame (parámetros primero)
 		self.code = [ ]          # Lista de Instrucciones IR 
+		self.lines = [ ]         # (pc inicial, línea del fuente) de cada declaración
 		
 	def new_local(self, name, ir_type, gox_type=None):
 		self.locals[name] = ir_type
+		if name not in self.slots:
+			self.slots[name] = len(self.slots)
 		if gox_type:
 			self.locals_gox[name] = gox_type
 		
 	def append(self, instr):
 		self.code.append(instr)
+
+	def mark_line(self, lineno):
+		# Las instrucciones que siguen pertenecen a la línea lineno
+		if lineno and (not self.lines or self.lines[-1][1] != lineno):
+			self.lines.append((len(self.code), lineno))
 		
 	def extend(self, instructions):
 		self.code.extend(instructions)
+
+	def copy(self, module, line_offset=0):
+		'''
+		Copia de la función en otro módulo, con la tabla de líneas desplazada
+		line_offset líneas (la función se movió dentro del archivo).
+		'''
+		func = IRFunction(module, self.name, list(self.parmnames), list(self.parmtypes),
+			self.return_type, self.return_type_gox, self.imported)
+		func.pure = self.pure
+		func.locals = dict(self.locals)
+		func.locals_gox = dict(self.locals_gox)
+		func.slots = dict(self.slots)
+		func.code = list(self.code)
+		func.lines = [ (pc, line + line_offset) for pc, line in self.lines ]
+		return func
 		
 	def dump(self):
 		print(f"FUNCTION::: {self.name}, {self.parmnames}, {self.parmtypes} {self.return_type}")
@@ -84,6 +117,9 @@ class IRFunction:
 		for instr in self.code:
 			print(instr)
 			
+# Funciones que se ejecutan una sola vez: la inicial y el main del programa
+ENTRY_POINTS = ('main', '_actual_main')
+
 # Mapeo de tipos de GoxLang a tipos de IR
 _typemap = {
 	'int'  : 'I',
@@ -148,16 +184,21 @@ class IRCode(Visitor):
 	}
 
 	@classmethod
-	def gencode(cls, node:List[Statement], fileName:str):
+	def gencode(cls, node:List[Statement], fileName:str, reuse=None):
 		'''
 		El nodo es el nodo superior del árbol de 
 		modelo/análisis.
 		La función inicial se llama "_init". No acepta 
 		argumentos. Devuelve un entero.
+		reuse asocia el id() de un nodo Function sin cambios a (IRFunction
+		de la compilación anterior, desplazamiento de líneas); esas funciones
+		se copian en lugar de regenerarse (source/incremental.py).
 		'''
 		ircode = cls()
+		ircode.reuse = reuse or { }
 		ircode.debug = CONFIG.get("Debug", False)
 		ircode.createOutputFile = CONFIG.get("GenerateOutputFile", False)
+		ircode.tail_calls = CONFIG.get("TailCalls", True)
 		ircode.module = IRModule()
 
 		func = IRFunction(ircode.module, 'main', [], [], 'I', 'int')
@@ -165,12 +206,17 @@ class IRCode(Visitor):
 		if ircode.debug:
 			print(f"[bold green][DEBUG][/bold green] Iniciando generacion de codigo intermedio del archivo: {fileName}")
 		for item in node:
-			item.accept(ircode, func)
+			func.mark_line(item.lineNo)
+			ircode.statement(item, func)
 		if '_actual_main' in ircode.module.functions:
 			func.append(('CALL', '_actual_main'))
 		else:
 			func.append(('CONSTI', 0))
 		func.append(('RET',))
+		# Se recalcula también para las funciones copiadas: sus llamados pueden haber cambiado
+		pure = pure_functions(node)
+		for irfunc in ircode.module.functions.values():
+			irfunc.pure = irfunc.name in pure
 		if ircode.debug:
 			print(f"[bold green][DEBUG][/bold green] Generacion de codigo intermedio finalizada con {len(func.code)} instrucciones")
 		if ircode.createOutputFile:
@@ -192,6 +238,28 @@ class IRCode(Visitor):
 		return ircode.module
 
 	# --- Statements
+	def statement(self, n, func):
+		'''
+		Genera una sentencia. Una llamada usada como sentencia deja su
+		resultado en la pila: se descarta con POP para que la pila tenga la
+		misma altura en cada vuelta de un bucle.
+		'''
+		n.accept(self, func)
+		if isinstance(n, FunctionCall) and self._returns_value(n.name):
+			func.append(('POP',))
+
+	def _returns_value(self, name):
+		'''
+		CALL name deja un valor en la pila según su declaración: las funciones
+		GoxLang siempre (las que no declaran tipo devuelven 0) y las importadas
+		si declaran tipo de retorno. Si una importada no tiene implementación,
+		la máquina quita el POP al cargar el módulo.
+		'''
+		target = self.module.functions.get(name)
+		if target is None:
+			return False
+		return not target.imported or target.return_type_gox is not None
+
 	@singledispatchmethod
 	def visit(self, n, func):
 		# Si no se encuentra un nodo, se lanza una excepción
@@ -223,11 +291,15 @@ class IRCode(Visitor):
 		func.append(('IF',))
 		# Procesar las instrucciones en la parte de la consecuencia (then)
 		for stmt in n.if_statements:
-			stmt.accept(self, func)
+			func.mark_line(stmt.lineNo)
+			self.statement(stmt, func)
+		func.mark_line(n.lineNo)
 		func.append(('ELSE',))
 		# Procesar las instrucciones en la parte alternativa (else)
 		for stmt in n.else_statements:
-			stmt.accept(self, func)
+			func.mark_line(stmt.lineNo)
+			self.statement(stmt, func)
+		func.mark_line(n.lineNo)
 		func.append(('ENDIF',))
 
 	@visit.register
@@ -240,7 +312,9 @@ class IRCode(Visitor):
 		func.append(('CBREAK',))
 		# Visitar n.body
 		for stmt in n.statements:
-			stmt.accept(self, func)
+			func.mark_line(stmt.lineNo)
+			self.statement(stmt, func)
+		func.mark_line(n.lineNo)
 		func.append(('ENDLOOP',))
 
 	@visit.register
@@ -254,6 +328,12 @@ class IRCode(Visitor):
 
 	@visit.register
 	def _(self, n: Return, func: IRFunction):
+		# return f(...) en posición de cola: la VM reutiliza el frame actual
+		if self.tail_calls and isinstance(n.expr, FunctionCall) and self._is_tail_call(n.expr, func):
+			for arg in n.expr.args:
+				arg.accept(self, func)
+			func.append(('TAILCALL', n.expr.name))
+			return
 		# First visit the return expression to push its value onto the stack
 		if n.expr:
 			n.expr.accept(self, func)
@@ -263,13 +343,22 @@ class IRCode(Visitor):
 		# Then append the return instruction
 		func.append(('RET',))
 
+	def _is_tail_call(self, call, func):
+		'''
+		La llamada puede reemplazar al frame de func: es a una función GoxLang
+		(no importada) ya generada y devuelve el mismo tipo que func.
+		'''
+		target = self.module.functions.get(call.name)
+		return (func.name != 'main' and call.name != 'main' and target is not None
+			and not target.imported and target.return_type == func.return_type)
+
 	# --- Declaration
 		
 	@visit.register
 	def _(self, n: Variable, func: IRFunction):
 		irtype = _typemap.get(n.type, 'I')
 		if func.name == 'main':  # Variables globales
-			self.module.globals[n.name] = IRGlobal(n.name, irtype, n.type)
+			self.module.new_global(n.name, irtype, n.type)
 			if n.value:
 				n.value.accept(self, func)
 				func.append(('GLOBAL_SET', n.name))
@@ -295,6 +384,12 @@ class IRCode(Visitor):
 			name = '_actual_main'
 		else:
 			name = n.name
+
+		cached = self.reuse.get(id(n))
+		if cached is not None:
+			irfunc, line_offset = cached
+			irfunc.copy(func.module, line_offset)
+			return
 		
 		newfunc = IRFunction(
 			func.module,
@@ -309,10 +404,11 @@ class IRCode(Visitor):
 		if not n.imported:
 			# Visitar n.stmts
 			for stmt in n.statements:
-				stmt.accept(self, newfunc)
+				newfunc.mark_line(stmt.lineNo)
+				self.statement(stmt, newfunc)
 			# Verificar si la última instrucción es RET
             # Si no lo es, agregar un return por defecto
-			if not newfunc.code or newfunc.code[-1][0] != 'RET':
+			if not newfunc.code or newfunc.code[-1][0] not in ('RET', 'TAILCALL'):
 				# Agregar valor de retorno por defecto según el tipo de retorno
 				if rettype == 'I':  # int, bool, char
 					newfunc.append(('CONSTI', 0))
@@ -0,0 +1,198 @@
+# irverify.py
+#
+# Verificación de tipos del IR en tiempo de carga.
+#
+# El checker ya garantiza que el programa GoxLang está bien tipado, así que el
+# IR que genera IRCode tiene un tipo fijo ('I' o 'F') en cada posición de la
+# pila. Este módulo recorre el código enlazado de cada función (con los
+# destinos de salto ya resueltos por StackMachine._resolve_branch_targets) y
+# calcula el tipo de cada elemento de la pila antes de cada instrucción. Si
+# una instrucción recibe operandos del tipo equivocado, o dos caminos llegan a
+# la misma instrucción con pilas distintas, se lanza TypeError.
+#
+# Las máquinas que no etiquetan los valores de la pila dependen de esta
+# verificación para omitir los chequeos en tiempo de ejecución.
+
+# opname : (tipos consumidos, tipos producidos)
+STACK_EFFECTS = {
+	'CONSTI' : ((), ('I',)),
+	'CONSTF' : ((), ('F',)),
+
+	'ADDI' : (('I', 'I'), ('I',)),
+	'SUBI' : (('I', 'I'), ('I',)),
+	'MULI' : (('I', 'I'), ('I',)),
+	'DIVI' : (('I', 'I'), ('I',)),
+	'ANDI' : (('I', 'I'), ('I',)),
+	'ORI'  : (('I', 'I'), ('I',)),
+	'LTI'  : (('I', 'I'), ('I',)),
+	'LEI'  : (('I', 'I'), ('I',)),
+	'GTI'  : (('I', 'I'), ('I',)),
+	'GEI'  : (('I', 'I'), ('I',)),
+	'EQI'  : (('I', 'I'), ('I',)),
+	'NEI'  : (('I', 'I'), ('I',)),
+
+	'ADDF' : (('F', 'F'), ('F',)),
+	'SUBF' : (('F', 'F'), ('F',)),
+	'MULF' : (('F', 'F'), ('F',)),
+	'DIVF' : (('F', 'F'), ('F',)),
+	'LTF'  : (('F', 'F'), ('I',)),
+	'LEF'  : (('F', 'F'), ('I',)),
+	'GTF'  : (('F', 'F'), ('I',)),
+	'GEF'  : (('F', 'F'), ('I',)),
+	'EQF'  : (('F', 'F'), ('I',)),
+	'NEF'  : (('F', 'F'), ('I',)),
+
+	'ITOF' : (('I',), ('F',)),
+	'FTOI' : (('F',), ('I',)),
+
+	'PRINTI' : (('I',), ()),
+	'PRINTF' : (('F',), ()),
+	'PRINTB' : (('I',), ()),
+
+	'PEEKI' : (('I',), ('I',)),
+	'PEEKF' : (('I',), ('F',)),
+	'PEEKB' : (('I',), ('I',)),
+	'POKEI' : (('I', 'I'), ()),
+	'POKEF' : (('I', 'F'), ()),
+	'POKEB' : (('I', 'I'), ()),
+	'GROW'  : (('I',), ('I',)),
+
+	'IF'       : (('I',), ()),
+	'ELSE'     : ((), ()),
+	'ENDIF'    : ((), ()),
+	'LOOP'     : ((), ()),
+	'CBREAK'   : (('I',), ()),
+	'CONTINUE' : ((), ()),
+	'ENDLOOP'  : ((), ()),
+
+	# Superinstrucciones (source/peephole.py)
+	'NEGI'  : (('I',), ('I',)),
+	'NEGF'  : (('F',), ('F',)),
+	'BREAK' : ((), ()),
+	'WHILE' : (('I',), ()),
+}
+
+# Instrucciones cuyo operando es un destino de salto y si, además del salto,
+# pueden continuar con la instrucción siguiente.
+_BRANCHES = {
+	'IF'       : True,
+	'CBREAK'   : True,
+	'ELSE'     : False,
+	'CONTINUE' : False,
+	'ENDLOOP'  : False,
+	'BREAK'    : False,
+	'WHILE'    : True,
+}
+
+def _branch_kind(opname):
+	'''
+	Devuelve si la instrucción de salto puede continuar con la siguiente,
+	o None si opname no es un salto.
+	'''
+	if opname in _BRANCHES:
+		return _BRANCHES[opname]
+	if opname.startswith('IF_') or opname.startswith('WHILE_'):
+		return True
+	return None
+
+def _require_int_slot(opname, slot_type):
+	if slot_type != 'I':
+		raise TypeError(f"{opname} expects an integer variable, got '{slot_type}'.")
+
+def stack_effect(instr, func, functions, global_types):
+	'''
+	Devuelve (consumidos, producidos) para una instrucción, resolviendo
+	las que dependen de su operando (variables, llamadas, retorno).
+	'''
+	opname = instr[0]
+	if opname in STACK_EFFECTS:
+		return STACK_EFFECTS[opname]
+	if opname == 'LOCAL_LOAD':
+		return (), (func['slot_types'][instr[1]],)
+	if opname == 'LOCAL_STORE':
+		return (func['slot_types'][instr[1]],), ()
+	if opname == 'GLOBAL_LOAD':
+		return (), (global_types[instr[1]],)
+	if opname == 'GLOBAL_STORE':
+		return (global_types[instr[1]],), ()
+	if opname.startswith('IF_') or opname.startswith('WHILE_'):
+		operand = opname[-1]
+		return (operand, operand), ()
+	if opname == 'LOCAL_INCI':
+		_require_int_slot(opname, func['slot_types'][instr[1]])
+		return (), ()
+	if opname == 'GLOBAL_INCI':
+		_require_int_slot(opname, global_types[instr[1]])
+		return (), ()
+	if opname.startswith('LOCAL_') and opname.endswith('_K'):
+		_require_int_slot(opname, func['slot_types'][instr[1]])
+		return (), ('I',)
+	if opname == 'CALL':
+		callee = functions.get(instr[1])
+		if callee is None:
+			raise NameError(f"Function '{instr[1]}' not defined.")
+		if callee['is_imported']:
+			# Las funciones importadas sin implementación no tocan la pila.
+			if callee.get('host') is None:
+				return (), ()
+			returns = (callee['return_type'],) if callee['return_type_gox'] is not None else ()
+			return tuple(callee['param_types']), returns
+		return tuple(callee['param_types']), (callee['return_type'],)
+	if opname == 'RET':
+		return (func['return_type'],), (func['return_type'],)
+	if opname == 'TAILCALL':
+		# Termina la función como CALL + RET: el resultado del llamado es el suyo
+		pops, pushes = stack_effect(('CALL', instr[1]), func, functions, global_types)
+		if pushes != (func['return_type'],):
+			raise TypeError(f"TAILCALL to '{instr[1]}' in '{func['name']}' does not return {func['return_type']}.")
+		return pops, ()
+	raise TypeError(f"Cannot verify unknown instruction '{opname}'.")
+
+def verify_function(func, functions, global_types):
+	'''
+	Verifica el código enlazado de func (una entrada de StackMachine.functions).
+	Devuelve una lista con la pila de tipos (tupla) a la entrada de cada PC,
+	o None para las instrucciones inalcanzables.
+	'''
+	name = func['name']
+	code = func['code']
+	states = [None] * len(code)
+	if not code:
+		return states
+
+	def merge(pc, state, from_pc):
+		if pc >= len(code):
+			raise TypeError(f"Control falls off the end of '{name}' after PC {from_pc}.")
+		if states[pc] is None:
+			states[pc] = state
+			worklist.append(pc)
+		elif states[pc] != state:
+			raise TypeError(f"Inconsistent stack types at PC {pc} in '{name}': {list(states[pc])} vs {list(state)} (from PC {from_pc}).")
+
+	states[0] = ()
+	worklist = [0]
+	while worklist:
+		pc = worklist.pop()
+		state = states[pc]
+		instr = code[pc]
+		if instr[0] == 'POP':
+			# Descarta el resultado de una llamada usada como sentencia, de cualquier tipo
+			if not state:
+				raise TypeError(f"POP at PC {pc} in '{name}' expects a value on the stack, got [].")
+			pops, pushes = state[-1:], ()
+		else:
+			pops, pushes = stack_effect(instr, func, functions, global_types)
+		depth = len(state) - len(pops)
+		if depth < 0 or state[depth:] != pops:
+			raise TypeError(f"{instr[0]} at PC {pc} in '{name}' expects {list(pops)} on the stack, got {list(state)}.")
+		after = state[:depth] + pushes
+		opname = instr[0]
+		if opname == 'RET' or opname == 'TAILCALL':
+			continue
+		falls_through = _branch_kind(opname)
+		if falls_through is not None:
+			merge(instr[-1], after, pc)
+			if not falls_through:
+				continue
+		merge(pc + 1, after, pc)
+	return states
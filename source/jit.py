@@ -0,0 +1,602 @@
+# jit.py
+#
+# Compilación por niveles (tiered JIT) de las funciones IR calientes.
+#
+# Con el JIT activado la StackMachine cuenta, por función, las llamadas y los
+# saltos hacia atrás de sus bucles (ENDLOOP/CONTINUE). Cuando una función
+# alcanza JITThreshold su código enlazado se traduce a código fuente Python:
+#
+#   - los slots locales pasan a ser variables de Python (v0, v1, ...)
+#   - la pila de operandos se resuelve al compilar: cada instrucción combina
+#     expresiones en lugar de apilar valores, y solo se vuelca a variables
+#     (s0, s1, ...) en los puntos donde se unen caminos de control
+#   - IF/ELSE/ENDIF y LOOP/CBREAK/CONTINUE/ENDLOOP pasan a if/else y a
+#     while True/break/continue
+#   - TAILCALL a la propia función fuera de todo bucle reasigna los parámetros
+#     y vuelve al inicio de un while True que envuelve el cuerpo; el resto de
+#     las llamadas en cola son un return de la llamada
+#   - las funciones recursivas (que se llaman a sí mismas, directamente o a
+#     través de otras, salvo con el TAILCALL anterior) no se compilan: en
+#     código compilado cada llamada usa la pila de Python, que tiene un límite
+#     que el intérprete no tiene
+#   - las funciones con caché de resultados (Memoize) se envuelven con
+#     MemoCache.wrap, así que las llamadas entre funciones compiladas también
+#     la usan
+#
+# El resultado se compila con compile() y op_CALL lo llama directamente. Las
+# instrucciones de memoria, de salida y las llamadas a funciones importadas se
+# delegan en los manejadores op_* de la máquina, así que se comportan igual
+# que en el intérprete.
+#
+# Si una función no se puede traducir (o llama a una que no se puede
+# traducir) queda registrada en failures y se sigue interpretando.
+#
+# Diferencia observable respecto al intérprete: lo que ejecuta el código
+# compilado no cuenta en instruction_count ni en MaxInstructions.
+
+import math
+
+from source.irverify import verify_function, stack_effect
+from source.registers import slots_needing_checks
+
+class JITError(Exception):
+	'''
+	La función no se puede traducir; se sigue interpretando.
+	'''
+
+# Operadores de Python para las instrucciones binarias (sin el sufijo I/F)
+_OPERATORS = {
+	'ADD': '+', 'SUB': '-', 'MUL': '*', 'AND': '&', 'OR': '|',
+	'LT': '<', 'LE': '<=', 'GT': '>', 'GE': '>=', 'EQ': '==', 'NE': '!=',
+}
+_COMPARISONS = { 'LT', 'LE', 'GT', 'GE', 'EQ', 'NE' }
+_UNARY = {
+	'NEGI': '(-{})',
+	'NEGF': '(-{})',
+	'ITOF': 'float({})',
+	'FTOI': 'int({})',
+}
+
+# Instrucciones que se ejecutan llamando al manejador de la máquina
+_DELEGATED = {
+	'PRINTI', 'PRINTF', 'PRINTB',
+	'PEEKI', 'PEEKF', 'PEEKB', 'POKEI', 'POKEF', 'POKEB',
+	'GROW',
+}
+
+def _unassigned_local(name):
+	raise ValueError(f"Local variable '{name}' accessed before assignment.")
+
+def _is_if(opname):
+	return opname == 'IF' or opname.startswith('IF_')
+
+def _is_loop_exit(opname):
+	return opname in ('CBREAK', 'WHILE') or opname.startswith('WHILE_')
+
+class _Value:
+	'''
+	Elemento de la pila simbólica: una expresión Python, o una condición
+	(cond) cuando el valor es el 0/1 de una comparación. deps son los slots
+	locales que lee la expresión.
+	'''
+	__slots__ = ('expr', 'cond', 'deps')
+
+	def __init__(self, expr=None, cond=None, deps=frozenset()):
+		self.expr = expr
+		self.cond = cond
+		self.deps = deps
+
+	def value(self):
+		if self.expr is None:
+			return f'(1 if {self.cond} else 0)'
+		return self.expr
+
+	def test(self):
+		'''Expresión que es verdadera cuando el valor es distinto de 0.'''
+		return self.cond if self.cond is not None else self.expr
+
+class JITCompiler:
+	'''
+	Contadores de uso y funciones compiladas de una StackMachine.
+	'''
+	def __init__(self, vm, threshold):
+		self.vm = vm
+		self.threshold = threshold
+		self.reset()
+
+	def reset(self):
+		self.counters = {}     # función -> llamadas + saltos hacia atrás
+		self.compiled = {}     # función -> punto de entrada compilado
+		self.failures = {}     # función -> motivo por el que sigue interpretada
+		self.namespace = None
+
+	def on_call(self, name):
+		'''
+		Cuenta una llamada a name y devuelve su versión compilada, o None
+		si todavía (o definitivamente) se interpreta.
+		'''
+		entry = self.compiled.get(name)
+		if entry is None and name not in self.failures:
+			count = self.counters[name] = self.counters.get(name, 0) + 1
+			if count >= self.threshold:
+				entry = self.compile(name)
+		return entry
+
+	def on_back_edge(self, name):
+		'''
+		Cuenta una iteración de un bucle de name. La versión compilada se usa
+		a partir de la siguiente llamada.
+		'''
+		if name in self.compiled or name in self.failures:
+			return
+		count = self.counters[name] = self.counters.get(name, 0) + 1
+		if count >= self.threshold:
+			self.compile(name)
+
+	def compile(self, name):
+		'''
+		Traduce name y todas las funciones a las que llama (que aún no
+		estén compiladas) y las compila juntas. Devuelve el punto de
+		entrada de name, o None si alguna no se pudo traducir.
+		'''
+		vm = self.vm
+		sources = {}
+		calls = {}
+		pending = [name]
+		current = name
+		try:
+			while pending:
+				current = pending.pop()
+				if current in sources or current in self.compiled:
+					continue
+				if current in self.failures:
+					raise JITError(self.failures[current])
+				translator = _FunctionTranslator(self, vm.functions[current])
+				sources[current] = translator.translate()
+				calls[current] = translator.callees
+				pending.extend(translator.callees)
+			# Las ya compiladas solo llaman a compiladas: un ciclo queda entre las nuevas
+			recursive = _recursive(calls)
+			if recursive is not None:
+				current = recursive
+				raise JITError(f"'{recursive}' is recursive and would run on Python's stack")
+		except (JITError, TypeError, NameError) as e:
+			self.failures[current] = str(e)
+			if current != name:
+				self.failures[name] = f"calls '{current}', which cannot be compiled"
+			vm._log_debug(f"JIT: '{name}' stays interpreted: {self.failures[name]}")
+			return None
+
+		namespace = self._namespace()
+		code = compile('\n\n'.join(sources.values()), f'<jit:{name}>', 'exec')
+		exec(code, namespace)
+		for fname in sources:
+			self.compiled[fname] = namespace[f'E_{fname}']
+		vm._log_debug(f"JIT: compiled {list(sources)} (hot: '{name}', count {self.counters.get(name, 0)})")
+		return self.compiled[name]
+
+	def report(self):
+		'''Resumen del estado del JIT.'''
+		return {
+			'threshold': self.threshold,
+			'compiled': sorted(self.compiled),
+			'interpreted': dict(self.failures),
+			'counters': dict(self.counters),
+		}
+
+	def _namespace(self):
+		if self.namespace is None:
+			self.namespace = {
+				'G': self.vm.globals,
+				'_unassigned_local': _unassigned_local,
+				'_unassigned_global': self.vm._unassigned_global,
+			}
+		return self.namespace
+
+	def delegate(self, instr, pops, pushes):
+		'''
+		Devuelve el nombre de una función del espacio de nombres que ejecuta
+		instr con el manejador op_* de la máquina.
+		'''
+		key = 'D_' + '_'.join(str(part) for part in instr)
+		namespace = self._namespace()
+		if key not in namespace:
+			namespace[key] = _make_delegate(self.vm, instr, pops, pushes)
+		return key
+
+def _make_delegate(vm, instr, pops, pushes):
+	handler = getattr(vm, f'op_{instr[0]}')
+	operands = instr[1:]
+	stack = vm.stack
+	if vm.TAGGED:
+		def delegate(*args):
+			stack.extend(zip(pops, args))
+			handler(*operands)
+			if pushes:
+				return stack.pop()[1]
+	else:
+		def delegate(*args):
+			stack.extend(args)
+			handler(*operands)
+			if pushes:
+				return stack.pop()
+	return delegate
+
+def _recursive(calls):
+	'''
+	Devuelve una función de calls (función -> funciones que llama) que
+	puede volver a llamarse a sí misma, o None si no hay ciclos.
+	'''
+	for start in calls:
+		seen = set()
+		pending = list(calls[start])
+		while pending:
+			callee = pending.pop()
+			if callee == start:
+				return start
+			if callee in seen or callee not in calls:
+				continue
+			seen.add(callee)
+			pending.extend(calls[callee])
+	return None
+
+class _FunctionTranslator:
+	'''
+	Traduce el código enlazado de una función (entrada de
+	StackMachine.functions) a código fuente Python.
+	'''
+	def __init__(self, jit, func):
+		self.jit = jit
+		self.vm = jit.vm
+		self.func = func
+		self.code = func['code']
+		self.tagged = self.vm.TAGGED
+		self.lines = []
+		self.indent = 1
+		self.stack = []
+		self.ntemps = 0
+		self.loops = []          # pila de salida (tras un break) de cada bucle abierto
+		self.callees = set()
+
+	def translate(self):
+		func = self.func
+		name = func['name']
+		# El código tiene que estar bien tipado: el compilado no comprueba tipos.
+		verify_function(func, self.vm.functions, self.vm.global_types)
+		self.blocks = self._match_blocks()
+		checked = slots_needing_checks(self.code, func['nparams'])
+
+		params = [ f'v{slot}' for slot in range(func['nparams']) ]
+		self.lines.append(f"def F_{name}({', '.join(params)}):")
+		if any(instr[0] == 'TAILCALL' and instr[1] == name for instr in self.code):
+			# Cada vuelta es una nueva llamada: las variables se reinician dentro
+			self._emit('while True:')
+			self.indent += 1
+		for slot in sorted(checked):
+			self._emit(f'v{slot} = None')
+		self.checked = checked
+		if self._block(0, len(self.code)):
+			raise JITError(f"control reaches the end of '{name}' without RET")
+
+		# Con caché de resultados (source/memo.py) las llamadas desde código
+		# compilado pasan por ella; op_CALL ya la consultó y llama a R_
+		target = f'F_{name}'
+		if func.get('memo') is not None:
+			target = f'R_{name}'
+			self.jit._namespace()[f'M_{name}'] = func['memo'].wrap
+			self.lines.append(f"R_{name} = F_{name}")
+			self.lines.append(f"F_{name} = M_{name}(R_{name})")
+
+		# Punto de entrada que usa op_CALL: recibe y devuelve elementos de la pila
+		args = [ f'a{index}' for index in range(func['nparams']) ]
+		if self.tagged:
+			call = f"{target}({', '.join(arg + '[1]' for arg in args)})"
+			self.lines.append(f"def E_{name}({', '.join(args)}):")
+			self.lines.append(f"\treturn ({func['return_type']!r}, {call})")
+		else:
+			self.lines.append(f"E_{name} = {target}")
+		return '\n'.join(self.lines)
+
+	# --- Estructura ---
+
+	def _match_blocks(self):
+		'''
+		Devuelve { pc de IF: (pc de ELSE o None, pc de ENDIF),
+		           pc de LOOP: pc de ENDLOOP }
+		'''
+		blocks = {}
+		open_ifs = []
+		open_loops = []
+		for pc, instr in enumerate(self.code):
+			opname = instr[0]
+			if _is_if(opname):
+				open_ifs.append([pc, None])
+			elif opname == 'ELSE':
+				open_ifs[-1][1] = pc
+			elif opname == 'ENDIF':
+				if_pc, else_pc = open_ifs.pop()
+				blocks[if_pc] = (else_pc, pc)
+			elif opname == 'LOOP':
+				open_loops.append(pc)
+			elif opname == 'ENDLOOP':
+				blocks[open_loops.pop()] = pc
+		return blocks
+
+	def _block(self, pc, end):
+		'''
+		Traduce code[pc:end]. Devuelve False si el control no puede llegar
+		al final (termina en RET, BREAK o CONTINUE).
+		'''
+		code = self.code
+		while pc < end:
+			instr = code[pc]
+			opname = instr[0]
+			if _is_if(opname):
+				pc = self._if(pc)
+				if pc is None:
+					return False
+				continue
+			if opname == 'LOOP':
+				pc = self._loop(pc)
+				if pc is None:
+					return False
+				continue
+			if opname == 'RET':
+				self._emit(f'return {self._pop().value()}')
+				return False
+			if opname == 'TAILCALL':
+				self._tail_call(instr[1])
+				return False
+			if opname == 'BREAK':
+				self._break()
+				return False
+			if opname == 'CONTINUE':
+				self._spill()
+				self._emit('continue')
+				return False
+			if _is_loop_exit(opname):
+				cond = self._exit_condition(instr)
+				self._spill()
+				self._emit(f'if {cond}:')
+				self.indent += 1
+				self._break()
+				self.indent -= 1
+			else:
+				self._instruction(instr)
+			pc += 1
+		return True
+
+	def _if(self, pc):
+		opname = self.code[pc][0]
+		if opname == 'IF':
+			cond = self._pop().test()
+		else:
+			cond = self._compare(opname[3:])
+		else_pc, endif_pc = self.blocks[pc]
+		self._spill()
+		entry = list(self.stack)
+
+		self._emit(f'if {cond}:')
+		after = self._branch(pc + 1, else_pc if else_pc is not None else endif_pc)
+		if else_pc is not None:
+			self.stack = list(entry)
+			self._emit('else:')
+			after_else = self._branch(else_pc + 1, endif_pc)
+			if after is None:
+				after = after_else
+		elif after is None:
+			after = entry
+		if after is None:
+			return None
+		self.stack = after
+		return endif_pc + 1
+
+	def _branch(self, pc, end):
+		'''Traduce una rama de un IF; devuelve la pila al salir o None.'''
+		self.indent += 1
+		start = len(self.lines)
+		falls = self._block(pc, end)
+		if falls:
+			self._spill()
+		if len(self.lines) == start:
+			self._emit('pass')
+		self.indent -= 1
+		return list(self.stack) if falls else None
+
+	def _loop(self, pc):
+		endloop_pc = self.blocks[pc]
+		self._spill()
+		depth = len(self.stack)
+		self.loops.append(None)
+		self._emit('while True:')
+		self.indent += 1
+		start = len(self.lines)
+		if self._block(pc + 1, endloop_pc):
+			self._spill()
+			if len(self.stack) != depth:
+				raise JITError(f"stack depth changes across the loop at PC {pc}")
+		if len(self.lines) == start:
+			self._emit('pass')
+		self.indent -= 1
+		exit_stack = self.loops.pop()
+		if exit_stack is None:
+			return None
+		self.stack = exit_stack
+		return endloop_pc + 1
+
+	def _tail_call(self, name):
+		if name == self.func['name'] and not self.loops:
+			# Dentro de un bucle el continue sería de ese bucle
+			args = self._pop_args(self.func['nparams'])
+			if args:
+				params = ', '.join(f'v{slot}' for slot in range(len(args)))
+				self._emit(f"{params} = {', '.join(args)}")
+			self._emit('continue')
+			return
+		self._instruction(('CALL', name))
+		self._emit(f'return {self._pop().value()}')
+
+	def _break(self):
+		self._spill()
+		if self.loops[-1] is None:
+			self.loops[-1] = list(self.stack)
+		self._emit('break')
+
+	def _exit_condition(self, instr):
+		'''Condición de salida del bucle para CBREAK, WHILE y WHILE_<cmp>.'''
+		opname = instr[0]
+		if opname == 'CBREAK':
+			return self._pop().test()
+		if opname == 'WHILE':
+			value = self._pop()
+			if value.cond is not None:
+				return f'(not {value.cond})'
+			return f'({value.expr} != 1)'
+		return f'(not {self._compare(opname[6:])})'
+
+	# --- Pila simbólica ---
+
+	def _emit(self, line):
+		self.lines.append('\t' * self.indent + line)
+
+	def _temp(self, expr):
+		name = f't{self.ntemps}'
+		self.ntemps += 1
+		self._emit(f'{name} = {expr}')
+		return _Value(name)
+
+	def _push(self, value):
+		self.stack.append(value)
+
+	def _pop(self):
+		if not self.stack:
+			raise JITError("operand stack underflow")
+		return self.stack.pop()
+
+	def _spill(self):
+		'''
+		Vuelca la pila a las variables s0, s1, ... para que todos los
+		caminos que llegan a un mismo punto la tengan en el mismo sitio.
+		'''
+		for index, value in enumerate(self.stack):
+			name = f's{index}'
+			if value.expr == name:
+				continue
+			self._emit(f'{name} = {value.value()}')
+			self.stack[index] = _Value(name)
+
+	def _compare(self, opname):
+		b = self._pop()
+		a = self._pop()
+		return f'({a.value()} {_OPERATORS[opname[:-1]]} {b.value()})'
+
+	def _load_local(self, slot):
+		if slot in self.checked:
+			name = self.func['slot_names'][slot]
+			self._emit(f'if v{slot} is None: _unassigned_local({name!r})')
+		return _Value(f'v{slot}', deps=frozenset((slot,)))
+
+	def _store_local(self, slot, expr):
+		# Lo que sigue en la pila y lee el slot tiene que leer el valor anterior.
+		for index, value in enumerate(self.stack):
+			if slot in value.deps:
+				self.stack[index] = self._temp(value.value())
+		self._emit(f'v{slot} = {expr}')
+
+	def _load_global(self, slot):
+		temp = self._temp(f'G[{slot}]')
+		self._emit(f'if {temp.expr} is None: _unassigned_global({slot})')
+		return _Value(f'{temp.expr}[1]') if self.tagged else temp
+
+	def _store_global(self, slot, expr):
+		if self.tagged:
+			expr = f'({self.vm.global_types[slot]!r}, {expr})'
+		self._emit(f'G[{slot}] = {expr}')
+
+	def _binary(self, opname, a, b):
+		base = opname[:-1]
+		if base == 'DIV':
+			message = "Integer division by zero" if opname == 'DIVI' else "Floating point division by zero"
+			if not self._nonzero_constant(b):
+				b = self._temp(b.value())
+				self._emit(f'if {b.expr} == 0: raise ZeroDivisionError({message!r})')
+			operator = '//' if opname == 'DIVI' else '/'
+			return _Value(f'({a.value()} {operator} {b.value()})', deps=a.deps | b.deps)
+		if base in _COMPARISONS:
+			return _Value(cond=f'({a.value()} {_OPERATORS[base]} {b.value()})', deps=a.deps | b.deps)
+		if opname == 'SUBI' and a.expr == '1' and b.cond is not None:
+			# 1 - (a <cmp> b): la condición de los while sin fusionar
+			return _Value(cond=f'(not {b.cond})', deps=b.deps)
+		return _Value(f'({a.value()} {_OPERATORS[base]} {b.value()})', deps=a.deps | b.deps)
+
+	@staticmethod
+	def _nonzero_constant(value):
+		try:
+			return float(value.expr) != 0
+		except (TypeError, ValueError):
+			return False
+
+	@staticmethod
+	def _constant(value):
+		if isinstance(value, float) and not math.isfinite(value):
+			raise JITError(f"cannot embed constant {value!r}")
+		text = repr(value)
+		return f'({text})' if value < 0 else text
+
+	def _instruction(self, instr):
+		opname = instr[0]
+		if opname == 'CONSTI':
+			self._push(_Value(self._constant(int(instr[1]))))
+		elif opname == 'CONSTF':
+			self._push(_Value(self._constant(float(instr[1]))))
+		elif opname in ('LOOP', 'ENDIF'):
+			pass
+		elif opname == 'POP':
+			# El resultado de un CALL ya está en una temporal: solo se descarta
+			self._pop()
+		elif opname == 'LOCAL_LOAD':
+			self._push(self._load_local(instr[1]))
+		elif opname == 'LOCAL_STORE':
+			self._store_local(instr[1], self._pop().value())
+		elif opname == 'LOCAL_INCI':
+			slot, step = instr[1], instr[2]
+			current = self._load_local(slot)
+			self._store_local(slot, f'{current.expr} + {self._constant(step)}')
+		elif opname.startswith('LOCAL_') and opname.endswith('_K'):
+			slot, k = instr[1], instr[2]
+			self._push(self._binary(opname[6:-2], self._load_local(slot), _Value(self._constant(k))))
+		elif opname == 'GLOBAL_LOAD':
+			self._push(self._load_global(instr[1]))
+		elif opname == 'GLOBAL_STORE':
+			self._store_global(instr[1], self._pop().value())
+		elif opname == 'GLOBAL_INCI':
+			slot, step = instr[1], instr[2]
+			current = self._load_global(slot)
+			self._store_global(slot, f'{current.expr} + {self._constant(step)}')
+		elif opname[:-1] in _OPERATORS or opname in ('DIVI', 'DIVF'):
+			b = self._pop()
+			a = self._pop()
+			self._push(self._binary(opname, a, b))
+		elif opname in _UNARY:
+			value = self._pop()
+			self._push(_Value(_UNARY[opname].format(value.value()), deps=value.deps))
+		elif opname == 'CALL' and not self.vm.functions[instr[1]]['is_imported']:
+			callee = self.vm.functions[instr[1]]
+			args = self._pop_args(callee['nparams'])
+			self.callees.add(callee['name'])
+			self._push(self._temp(f"F_{callee['name']}({', '.join(args)})"))
+		elif opname in _DELEGATED or opname == 'CALL':
+			pops, pushes = stack_effect(instr, self.func, self.vm.functions, self.vm.global_types)
+			helper = self.jit.delegate(instr, pops, pushes)
+			call = f"{helper}({', '.join(self._pop_args(len(pops)))})"
+			if pushes:
+				self._push(self._temp(call))
+			else:
+				self._emit(call)
+		else:
+			raise JITError(f"unsupported instruction {opname}")
+
+	def _pop_args(self, count):
+		args = [ self._pop().value() for _ in range(count) ]
+		args.reverse()
+		return args
@@ -0,0 +1,78 @@
+from collections import OrderedDict
+
+from source.ircode import ENTRY_POINTS
+
+
+class MemoCache:
+    """Argument-keyed result cache of one pure function, with LRU eviction.
+
+    Keys are tuples of the untagged argument values and entries the untagged
+    result, so the interpreters and the JIT-compiled code (which both go
+    through the same cache) see the same entries. Once capacity entries are
+    stored, each new one evicts the least recently used. Results are never
+    None, which lookup() uses to report a miss.
+    """
+
+    __slots__ = ('name', 'capacity', 'entries', 'hits', 'misses', 'evictions')
+
+    def __init__(self, name, capacity):
+        self.name = name
+        self.capacity = capacity
+        self.entries = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def lookup(self, key):
+        """Return the cached result for key (counting a hit) or None (counting a miss)."""
+        value = self.entries.get(key)
+        if value is None:
+            self.misses += 1
+            return None
+        self.hits += 1
+        self.entries.move_to_end(key)
+        return value
+
+    def store(self, key, value):
+        entries = self.entries
+        entries[key] = value
+        if len(entries) > self.capacity:
+            entries.popitem(last=False)
+            self.evictions += 1
+
+    def wrap(self, fn):
+        """Memoizing version of fn, a JIT-compiled function taking untagged values."""
+        lookup = self.lookup
+        store = self.store
+
+        def memoized(*args):
+            value = lookup(args)
+            if value is None:
+                value = fn(*args)
+                store(args, value)
+            return value
+        return memoized
+
+    def stats(self):
+        calls = self.hits + self.misses
+        return {
+            'function': self.name,
+            'hits': self.hits,
+            'misses': self.misses,
+            'hit_rate': self.hits / calls if calls else 0.0,
+            'entries': len(self.entries),
+            'evictions': self.evictions,
+        }
+
+
+def memoizable(func):
+    """Whether a pure function (an entry of StackMachine.functions) is worth a MemoCache.
+
+    Straight-line functions without calls or loops cost about as much to run
+    as to look up, so only functions that call or loop are cached. Float
+    parameters are excluded: 0.0 and -0.0 are equal keys but can give
+    different results.
+    """
+    if func['is_imported'] or func['name'] in ENTRY_POINTS or 'F' in func['param_types']:
+        return False
+    return any(instr[0] in ('CALL', 'TAILCALL', 'LOOP') for instr in func['code'])
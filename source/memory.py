@@ -0,0 +1,124 @@
+import struct
+import sys
+
+# Largest finite float32: writes up to this magnitude can never overflow.
+FLOAT32_MAX = 3.4028234663852886e+38
+
+# Struct format for each supported integer / float size (little-endian).
+_INT_FORMATS = { 1: 'b', 2: 'h', 4: 'i', 8: 'q' }
+_FLOAT_FORMATS = { 4: 'f', 8: 'd' }
+
+
+class Memory(bytearray):
+    """Byte-addressable VM memory with typed fast paths.
+
+    It is still a bytearray (PEEKB/POKEB, slicing and len() work as before),
+    plus precompiled struct.Struct packers for INT_SIZE/FLOAT_SIZE values and
+    memoryview.cast() views used for aligned accesses. A bytearray with
+    exported views cannot be resized, so growing always goes through grow(),
+    which releases the views first and rebuilds them afterwards.
+
+    size is the logical size the VM may address; len() is the capacity,
+    which grow() doubles so that most growth does not touch the bytearray.
+    """
+
+    def __init__(self, size, int_size=4, float_size=4):
+        super().__init__(size)
+        self.size = size
+        self.int_size = int_size
+        self.float_size = float_size
+        int_format = _INT_FORMATS.get(int_size)
+        float_format = _FLOAT_FORMATS.get(float_size)
+        self.int_struct = struct.Struct('<' + int_format) if int_format else None
+        self.float_struct = struct.Struct('<' + float_format) if float_format else None
+        # Native cast() views are only usable when they match the VM layout.
+        native = sys.byteorder == 'little'
+        self._int_view_format = int_format if native and int_format and struct.calcsize(int_format) == int_size else None
+        self._float_view_format = float_format if native and float_format else None
+        self._views = []
+        self.ints = None
+        self.floats = None
+        self._make_views()
+
+    def _make_views(self):
+        whole = memoryview(self)
+        self._views = [whole]
+        self.ints = self._cast(whole, self._int_view_format, self.int_size)
+        self.floats = self._cast(whole, self._float_view_format, self.float_size)
+
+    def _cast(self, whole, fmt, size):
+        if fmt is None:
+            return None
+        # cast() needs a length that is a multiple of the item size.
+        trimmed = whole[:len(self) - len(self) % size]
+        view = trimmed.cast(fmt)
+        self._views += [trimmed, view]
+        return view
+
+    def release_views(self):
+        for view in reversed(self._views):
+            view.release()
+        self._views = []
+        self.ints = None
+        self.floats = None
+
+    def grow(self, num_bytes):
+        """Extend the logical size by num_bytes zero bytes and return the old size."""
+        base = self.size
+        needed = base + num_bytes
+        if needed > len(self):
+            capacity = max(needed, 2 * len(self))
+            self.release_views()
+            try:
+                self.extend(bytearray(capacity - len(self)))
+            finally:
+                self._make_views()
+        self.size = needed
+        return base
+
+    # --- Typed access ---
+    # Callers check bounds. Aligned accesses index the cast() views directly;
+    # the rest use the Struct packers, and anything those cannot represent
+    # goes through int.to_bytes / struct.pack('<f') so errors are unchanged.
+
+    def read_int(self, address):
+        ints = self.ints
+        if ints is not None and address % self.int_size == 0:
+            return ints[address // self.int_size]
+        if self.int_struct is not None:
+            return self.int_struct.unpack_from(self, address)[0]
+        return int.from_bytes(self[address:address + self.int_size], byteorder='little', signed=True)
+
+    def write_int(self, address, value):
+        ints = self.ints
+        if ints is not None and address % self.int_size == 0:
+            try:
+                ints[address // self.int_size] = value
+                return
+            except (ValueError, TypeError):
+                pass
+        elif self.int_struct is not None:
+            try:
+                self.int_struct.pack_into(self, address, value)
+                return
+            except struct.error:
+                pass
+        self[address:address + self.int_size] = value.to_bytes(self.int_size, byteorder='little', signed=True)
+
+    def read_float(self, address):
+        floats = self.floats
+        if floats is not None and address % self.float_size == 0:
+            return floats[address // self.float_size]
+        if self.float_struct is not None:
+            return self.float_struct.unpack_from(self, address)[0]
+        return struct.unpack('<f', self[address:address + self.float_size])[0]
+
+    def write_float(self, address, value):
+        floats = self.floats
+        # cast('f') silently stores inf on overflow; struct.pack raises.
+        if floats is not None and address % self.float_size == 0 and -FLOAT32_MAX <= value <= FLOAT32_MAX:
+            floats[address // self.float_size] = value
+        elif self.float_struct is not None:
+            self.float_struct.pack_into(self, address, value)
+        else:
+            self[address:address + self.float_size] = struct.pack('<f', value)
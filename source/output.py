@@ -0,0 +1,79 @@
+import sys
+
+from rich import print as rich_print
+
+
+class OutputSink:
+    """Destination of the values printed by PRINTI/PRINTF/PRINTB.
+
+    write() receives the int or float being printed. Sinks may buffer;
+    StackMachine.run() flushes when execution ends, including on errors, so
+    nothing is lost and the output precedes any error message.
+    """
+
+    def __init__(self, batch_size=256):
+        self.batch_size = max(1, batch_size)
+        self.pending = []
+
+    def write(self, value):
+        pending = self.pending
+        pending.append(value)
+        if len(pending) >= self.batch_size:
+            self.flush()
+
+    def flush(self):
+        if self.pending:
+            self._emit(self.pending)
+            self.pending = []
+
+    def _emit(self, values):
+        raise NotImplementedError
+
+
+class RichSink(OutputSink):
+    """The original output: one "[OUTPUT] value" line per print, styled by rich."""
+
+    def _emit(self, values):
+        rich_print('\n'.join(f"[bold dark_green][OUTPUT][/bold dark_green] {value}" for value in values))
+
+
+class StdoutSink(OutputSink):
+    """Bare values, one per line, written to sys.stdout without markup."""
+
+    def _emit(self, values):
+        sys.stdout.write('\n'.join(map(str, values)) + '\n')
+
+
+class CaptureSink(OutputSink):
+    """Keeps the printed values in memory (values) instead of writing them."""
+
+    def __init__(self, batch_size=256):
+        super().__init__(batch_size)
+        self.values = []
+
+    def write(self, value):
+        self.values.append(value)
+
+    def _emit(self, values):
+        pass
+
+    def getvalue(self):
+        """The captured output as StdoutSink would have written it."""
+        return ''.join(f"{value}\n" for value in self.values)
+
+
+OUTPUT_SINKS = {
+    'rich': RichSink,
+    'stdout': StdoutSink,
+    'capture': CaptureSink,
+}
+
+
+def make_output_sink(output, batch_size=256):
+    """Return the sink for output: an OutputSink instance or a name in OUTPUT_SINKS."""
+    if isinstance(output, OutputSink):
+        return output
+    sink_class = OUTPUT_SINKS.get(output)
+    if sink_class is None:
+        raise ValueError(f"Unknown output sink '{output}'. Expected one of {tuple(OUTPUT_SINKS)}.")
+    return sink_class(batch_size)
@@ -61,6 +61,13 @@ class Parser:
 	# -------------------------------
 	def statement(self):
 		token = self.peek()
+		stmt = self._statement(token)
+		# Línea del fuente de la declaración (tabla de líneas del IR)
+		if token:
+			stmt.lineNo = token.lineno
+		return stmt
+
+	def _statement(self, token):
 		if token and (token.type == "ID" or token.type == "DEREF"):
 			return self.assignment_or_funcCall()
 		elif token and (token.type == "VAR" or token.type == "CONST"):
@@ -0,0 +1,144 @@
+# peephole.py
+#
+# Fusión de superinstrucciones sobre el código de una función.
+#
+# IRCode genera secuencias muy predecibles: cada `while` empieza con
+# CONSTI 1 ... SUBI CBREAK, cada `x = x + 1` es LOCAL_GET/CONSTI/ADDI/LOCAL_SET
+# y el menos unario es CONSTI -1 MULI. Este paso las reescribe en una sola
+# instrucción que la StackMachine ejecuta con un único despacho:
+#
+#   LOCAL_LOAD s; CONSTI k; ADDI|SUBI; LOCAL_STORE s  -> LOCAL_INCI s, ±k
+#   GLOBAL_LOAD g; CONSTI k; ADDI|SUBI; GLOBAL_STORE g -> GLOBAL_INCI g, ±k
+#   LOCAL_LOAD s; CONSTI k; <op>                      -> LOCAL_<op>_K s, k
+#   CONSTI -1; MULI  /  CONSTF -1.0; MULF             -> NEGI / NEGF
+#   <cmp>; IF                                         -> IF_<cmp>
+#   LOOP; CONSTI 1; <cond> <cmp>; SUBI; CBREAK        -> LOOP; <cond> WHILE_<cmp>
+#   LOOP; CONSTI 1; <cond>; SUBI; CBREAK              -> LOOP; <cond> WHILE
+#   CONSTI 1; CBREAK                                  -> BREAK
+#   CONSTI k; POP  /  CONSTF k; POP                   -> (nada)
+#
+# El último caso aparece al expandir en línea (source/inliner.py) una función
+# sin valor de retorno llamada como sentencia: su CONSTI 0 final se descarta.
+#
+# Trabaja sobre código con variables ya resueltas a slots y ANTES de enlazar
+# los saltos: ningún destino de salto puede caer dentro de una secuencia
+# fusionada porque todos apuntan a, o justo después de, un marcador
+# (LOOP, ELSE, ENDIF, ENDLOOP).
+
+import operator
+
+# Comparaciones que producen 0/1 y pueden fusionarse con un salto
+COMPARISONS = {
+	'LTI': operator.lt, 'LEI': operator.le, 'GTI': operator.gt,
+	'GEI': operator.ge, 'EQI': operator.eq, 'NEI': operator.ne,
+	'LTF': operator.lt, 'LEF': operator.le, 'GTF': operator.gt,
+	'GEF': operator.ge, 'EQF': operator.eq, 'NEF': operator.ne,
+}
+
+# Operaciones enteras que admiten la forma LOCAL_<op>_K (variable <op> constante)
+CONST_ARITHMETIC = {
+	'ADDI': operator.add,
+	'SUBI': operator.sub,
+	'MULI': operator.mul,
+	'DIVI': operator.floordiv,
+}
+CONST_COMPARISONS = { name: fn for name, fn in COMPARISONS.items() if name.endswith('I') }
+
+def fuse(code, origins=None):
+	'''
+	Devuelve una copia de code con las superinstrucciones aplicadas.
+	Si se pasa la lista origins, se le agrega, para cada instrucción
+	resultante, el pc de code donde empieza la secuencia que reemplaza.
+	'''
+	n = len(code)
+
+	# Localizar las condiciones de los while: LOOP; CONSTI 1; <cond>; SUBI; CBREAK.
+	# Una expresión nunca contiene CBREAK, así que el primero tras el LOOP es el
+	# de la condición.
+	while_ones = set()   # PCs de los CONSTI 1 que se eliminan
+	while_subs = set()   # PCs de los SUBI que cierran la condición
+	for pc, instr in enumerate(code):
+		if instr[0] != 'LOOP' or pc + 1 >= n or code[pc + 1] != ('CONSTI', 1):
+			continue
+		q = pc + 2
+		while q < n and code[q][0] not in ('CBREAK', 'LOOP'):
+			q += 1
+		if q < n and code[q][0] == 'CBREAK' and code[q - 1] == ('SUBI',) and q - 1 > pc + 2:
+			while_ones.add(pc + 1)
+			while_subs.add(q - 1)
+
+	fused = []
+	pc = 0
+	start = 0
+	while pc < n:
+		# Cada iteración agrega a lo sumo una instrucción, que viene de start
+		if origins is not None:
+			origins.extend([start] * (len(fused) - len(origins)))
+		start = pc
+		instr = code[pc]
+		opname = instr[0]
+		window = code[pc:pc + 4]
+		# Las ventanas no pueden tragarse el inicio o el fin de una condición de while
+		for offset in range(1, len(window)):
+			if pc + offset in while_ones or pc + offset in while_subs:
+				window = window[:offset]
+				break
+
+		if pc in while_ones:
+			pc += 1
+			continue
+
+		if pc in while_subs:
+			last = fused[-1] if fused else None
+			if last is not None and len(last) == 1 and last[0] in COMPARISONS:
+				fused[-1] = (f'WHILE_{last[0]}',)
+			else:
+				fused.append(('WHILE',))
+			pc += 2
+			continue
+
+		if (len(window) == 4 and opname in ('LOCAL_LOAD', 'GLOBAL_LOAD')
+				and window[1][0] == 'CONSTI' and window[2][0] in ('ADDI', 'SUBI')
+				and window[3] == (opname.replace('LOAD', 'STORE'), instr[1])):
+			step = window[1][1] if window[2][0] == 'ADDI' else -window[1][1]
+			fused.append((opname.replace('LOAD', 'INCI'), instr[1], step))
+			pc += 4
+			continue
+
+		if (len(window) >= 3 and opname == 'LOCAL_LOAD' and window[1][0] == 'CONSTI'
+				and len(window[2]) == 1
+				and (window[2][0] in CONST_COMPARISONS
+					 or (window[2][0] in CONST_ARITHMETIC and not (window[2][0] == 'DIVI' and window[1][1] == 0)))):
+			fused.append((f'LOCAL_{window[2][0]}_K', instr[1], window[1][1]))
+			pc += 3
+			continue
+
+		if len(window) >= 2 and instr == ('CONSTI', -1) and window[1] == ('MULI',):
+			fused.append(('NEGI',))
+			pc += 2
+			continue
+
+		if len(window) >= 2 and instr == ('CONSTF', -1.0) and window[1] == ('MULF',):
+			fused.append(('NEGF',))
+			pc += 2
+			continue
+
+		if len(window) >= 2 and opname in ('CONSTI', 'CONSTF') and window[1] == ('POP',):
+			pc += 2
+			continue
+
+		if len(window) >= 2 and instr == ('CONSTI', 1) and window[1] == ('CBREAK',):
+			fused.append(('BREAK',))
+			pc += 2
+			continue
+
+		if opname == 'IF' and fused and len(fused[-1]) == 1 and fused[-1][0] in COMPARISONS:
+			fused[-1] = (f'IF_{fused[-1][0]}',)
+			pc += 1
+			continue
+
+		fused.append(instr)
+		pc += 1
+	if origins is not None:
+		origins.extend([start] * (len(fused) - len(origins)))
+	return fused
@@ -0,0 +1,202 @@
+import json
+import time
+
+
+def memo_stats(functions):
+    """Hits and misses of every MemoCache (Memoize setting) in functions, most hits first."""
+    stats = [ func['memo'].stats() for func in functions.values() if func.get('memo') is not None ]
+    stats.sort(key=lambda entry: (-entry['hits'], entry['function']))
+    return stats
+
+
+class Profiler:
+    """Execution counts and times collected by StackMachine._run_profiled.
+
+    Every executed instruction adds to samples[(function, pc)] = [count, ns].
+    Opcode and source-line totals are derived from it when reporting, since
+    the opcode at a given (function, pc) never changes. Times are self times:
+    CALL only covers the frame switch, except for host and JIT-compiled calls,
+    which run entirely inside the instruction.
+    """
+
+    def __init__(self):
+        self.samples = {}
+
+    def reset(self):
+        self.samples = {}
+
+    def report(self, functions, top=None):
+        """Return the profile as a dict of sorted lists (see save()).
+
+        functions is StackMachine.functions, used for the instruction text and
+        the source line of each pc. top limits the hot_pcs list.
+        """
+        total_count = 0
+        total_ns = 0
+        opcodes = {}
+        lines = {}
+        hot_pcs = []
+        for (func_name, pc), (count, ns) in self.samples.items():
+            func = functions[func_name]
+            instr = func['code'][pc]
+            line = func['lines'][pc] if pc < len(func['lines']) else 0
+            total_count += count
+            total_ns += ns
+            opcode = opcodes.setdefault(instr[0], [0, 0])
+            opcode[0] += count
+            opcode[1] += ns
+            if line:
+                line_totals = lines.setdefault(line, [0, 0])
+                line_totals[0] += count
+                line_totals[1] += ns
+            hot_pcs.append({
+                'function': func_name,
+                'pc': pc,
+                'instruction': ' '.join(map(str, instr)),
+                'line': line or None,
+                'count': count,
+                'seconds': ns / 1e9,
+            })
+        hot_pcs.sort(key=lambda entry: (-entry['count'], -entry['seconds']))
+        if top is not None:
+            hot_pcs = hot_pcs[:top]
+        return {
+            'instructions': total_count,
+            'seconds': total_ns / 1e9,
+            'opcodes': [
+                {
+                    'opcode': name,
+                    'count': count,
+                    'seconds': ns / 1e9,
+                    'share': ns / total_ns if total_ns else 0.0,
+                }
+                for name, (count, ns) in sorted(opcodes.items(), key=lambda item: -item[1][1])
+            ],
+            'lines': [
+                { 'line': line, 'count': count, 'seconds': ns / 1e9 }
+                for line, (count, ns) in sorted(lines.items(), key=lambda item: -item[1][1])
+            ],
+            'hot_pcs': hot_pcs,
+            'memo': memo_stats(functions),
+        }
+
+    def save(self, path, functions):
+        """Write the full report as JSON to path and return it."""
+        report = self.report(functions)
+        with open(path, 'w', encoding='utf-8') as f:
+            json.dump(report, f, indent=2)
+        return report
+
+
+class CallGraphProfiler:
+    """Call counts and inclusive/exclusive times per function and per caller -> callee edge.
+
+    StackMachine calls enter() when a function is called and exit() when it
+    returns (see _op_CALL_profiled). Recursion is handled the usual way:
+    exclusive time always accumulates, while inclusive time is only added
+    when the outermost active frame of a function (or edge) returns, so a
+    recursive function is never counted twice. Exclusive time also goes to
+    the frame's full call path, which is what collapsed() exports.
+    """
+
+    def __init__(self):
+        self.reset()
+
+    def reset(self):
+        self.functions = {}     # name -> [calls, inclusive ns, exclusive ns]
+        self.edges = {}         # (caller, callee) -> [calls, inclusive ns]
+        self.stacks = {}        # 'main;f;g' -> exclusive ns
+        self.frames = []        # [name, path, start ns, child ns, edge]
+        self.active = {}        # name or edge -> open frames
+
+    def enter(self, callee, now):
+        frames = self.frames
+        if frames:
+            caller = frames[-1]
+            edge = (caller[0], callee)
+            path = f"{caller[1]};{callee}"
+            self.edges.setdefault(edge, [0, 0])[0] += 1
+            self.active[edge] = self.active.get(edge, 0) + 1
+        else:
+            edge = None
+            path = callee
+        self.functions.setdefault(callee, [0, 0, 0])[0] += 1
+        self.active[callee] = self.active.get(callee, 0) + 1
+        frames.append([callee, path, now, 0, edge])
+
+    def exit(self, now):
+        name, path, start, child, edge = self.frames.pop()
+        inclusive = now - start
+        exclusive = inclusive - child
+        function = self.functions[name]
+        function[2] += exclusive
+        self.active[name] -= 1
+        if not self.active[name]:
+            function[1] += inclusive
+        if edge is not None:
+            self.active[edge] -= 1
+            if not self.active[edge]:
+                self.edges[edge][1] += inclusive
+        if self.frames:
+            self.frames[-1][3] += inclusive
+        self.stacks[path] = self.stacks.get(path, 0) + exclusive
+
+    def _closed(self, now):
+        # Frames still open (the program stopped early or is being stepped)
+        # are closed at now on a copy, leaving this profiler untouched.
+        if not self.frames:
+            return self
+        closed = CallGraphProfiler()
+        closed.functions = { name: list(totals) for name, totals in self.functions.items() }
+        closed.edges = { edge: list(totals) for edge, totals in self.edges.items() }
+        closed.stacks = dict(self.stacks)
+        closed.frames = [ list(frame) for frame in self.frames ]
+        closed.active = dict(self.active)
+        while closed.frames:
+            closed.exit(now)
+        return closed
+
+    def report(self, now=None, functions=None):
+        """Return the call graph as a dict: functions and edges sorted by inclusive time.
+
+        Given StackMachine.functions, the memoized functions' cache hits and
+        misses are included too (a hit still counts as a call).
+        """
+        graph = self._closed(time.perf_counter_ns() if now is None else now)
+        total_ns = sum(exclusive for _, _, exclusive in graph.functions.values())
+        report = {
+            'seconds': total_ns / 1e9,
+            'functions': [
+                {
+                    'function': name,
+                    'calls': calls,
+                    'inclusive_seconds': inclusive / 1e9,
+                    'exclusive_seconds': exclusive / 1e9,
+                    'share': exclusive / total_ns if total_ns else 0.0,
+                }
+                for name, (calls, inclusive, exclusive) in sorted(graph.functions.items(), key=lambda item: -item[1][1])
+            ],
+            'edges': [
+                { 'caller': caller, 'callee': callee, 'calls': calls, 'inclusive_seconds': inclusive / 1e9 }
+                for (caller, callee), (calls, inclusive) in sorted(graph.edges.items(), key=lambda item: -item[1][1])
+            ],
+        }
+        if functions is not None:
+            report['memo'] = memo_stats(functions)
+        return report
+
+    def collapsed(self, now=None):
+        """Collapsed stacks ("main;f;g <microseconds>" per line) for flamegraph tools."""
+        graph = self._closed(time.perf_counter_ns() if now is None else now)
+        return ''.join(f"{path} {ns // 1000}\n" for path, ns in sorted(graph.stacks.items()) if ns >= 1000)
+
+    def save(self, json_path, collapsed_path=None, functions=None):
+        """Write report() as JSON and, if given, collapsed() to collapsed_path. Returns the report."""
+        now = time.perf_counter_ns()
+        report = self.report(now, functions)
+        with open(json_path, 'w', encoding='utf-8') as f:
+            json.dump(report, f, indent=2)
+        if collapsed_path is not None:
+            with open(collapsed_path, 'w', encoding='utf-8') as f:
+                f.write(self.collapsed(now))
+        return report
@@ -0,0 +1,86 @@
+# purity.py
+#
+# Análisis de pureza de las funciones de un programa.
+#
+# Una función es pura si su resultado depende solo de sus argumentos y
+# llamarla no tiene otro efecto visible que devolverlo. La máquina virtual
+# puede entonces guardar el resultado de cada combinación de argumentos y
+# reusarlo en lugar de volver a ejecutarla (Memoize, ver source/memo.py).
+#
+# Sobre los nodos Function del árbol chequeado, una función es pura si:
+#
+#   - no asigna variables globales ni lee las que no son constantes
+#   - no lee ni escribe la memoria (`dirección) ni la expande (^n)
+#   - no imprime
+#   - solo llama a funciones puras (ella misma incluida); las importadas
+#     nunca lo son
+#
+# Los nombres se resuelven igual que en IRCode: un nombre es global si una
+# declaración de nivel superior anterior a la función lo definió, aunque
+# esté dentro de un if/while. Como GoxLang exige declarar antes de usar, las
+# funciones se analizan en orden y cada llamada es a sí misma o a una función
+# ya analizada.
+#
+# 'main' no se considera: se ejecuta una sola vez.
+
+from source.model import (
+	Node, Variable, Function, Assignment, Print, UnaryOp, FunctionCall, NamedLocation, MemoryLocation,
+)
+
+# Atributos que agregan el checker e IRCode al recorrer el árbol
+_ANNOTATIONS = ('usage', 'store_value')
+
+def _walk(value):
+	# Todos los nodos del subárbol
+	if isinstance(value, Node):
+		yield value
+		for key, item in vars(value).items():
+			if key not in _ANNOTATIONS:
+				yield from _walk(item)
+	elif isinstance(value, (list, tuple)):
+		for item in value:
+			yield from _walk(item)
+
+def impurity(func, scope, pure):
+	'''
+	Motivo por el que la Function func no es pura, o None si lo es.
+	scope asocia cada global declarada antes de func a si es constante y
+	pure es el conjunto de funciones ya probadas puras.
+	'''
+	if func.imported:
+		return 'importada'
+	targets = set()
+	for node in _walk(func.statements):
+		if isinstance(node, Assignment):
+			targets.add(id(node.location))
+		elif isinstance(node, Print):
+			return 'imprime'
+		elif isinstance(node, MemoryLocation):
+			return 'accede a la memoria'
+		elif isinstance(node, UnaryOp) and node.operator == '^':
+			return 'expande la memoria'
+		elif isinstance(node, FunctionCall):
+			if node.name != func.name and node.name not in pure:
+				return f"llama a '{node.name}'"
+		elif isinstance(node, NamedLocation) and node.name in scope:
+			if id(node) in targets:
+				return f"asigna la global '{node.name}'"
+			if not scope[node.name]:
+				return f"lee la global '{node.name}'"
+	return None
+
+def pure_functions(statements):
+	'''
+	Nombres de las funciones puras entre las declaraciones de nivel superior statements.
+	'''
+	scope = { }
+	pure = set()
+	for stmt in statements:
+		if isinstance(stmt, Function):
+			if stmt.name != 'main' and impurity(stmt, scope, pure) is None:
+				pure.add(stmt.name)
+		else:
+			for node in _walk(stmt):
+				if isinstance(node, Variable):
+					scope[node.name] = node.is_const
+	return pure
@@ -0,0 +1,337 @@
+from source.stack_machine import StackMachine, Frame
+from source.untagged_machine import UntaggedStackMachine
+from source.irverify import verify_function
+from source.peephole import COMPARISONS
+from source.registers import BINARY, lower_function
+
+
+class RegisterMachine(UntaggedStackMachine):
+    """Register-based backend: runs three-address code instead of stack code.
+
+    load_module() links and verifies every function like UntaggedStackMachine
+    and then lowers its stack code to register code (source/registers.py).
+    Each call gets one flat frame list whose first slots are the locals and
+    whose remaining registers stand for operand stack positions, so
+    "c = a + b" is a single ADDI_RR instead of four pushes and pops. Values
+    are untagged; the operand stack is not used at all.
+
+    The observable behavior (output, errors, heap) is the StackMachine's;
+    instruction_count counts register instructions, which is the point.
+    Superinstructions do not apply (the lowering already merges those
+    sequences) and neither does the JIT, which compiles stack code: both
+    settings are ignored. The linked stack code stays in func['stack_code'].
+    """
+
+    def __init__(self, engine=None, superinstructions=None, jit=None, output=None, profile=None, callgraph=None,
+                 memoize=None, memo_size=None):
+        super().__init__(engine=engine, superinstructions=False, jit=False, output=output,
+                         profile=profile, callgraph=callgraph, memoize=memoize, memo_size=memo_size)
+
+    def load_module(self, ir_module):
+        StackMachine.load_module(self, ir_module)
+        for name, func in self.functions.items():
+            if func['is_imported']:
+                continue
+            states = verify_function(func, self.functions, self.global_types)
+            code, origins, frame_size = lower_function(func, states, self.functions, self.global_types)
+            func['stack_code'] = func['code']
+            func['code'] = code
+            func['ops'] = self._decode(name, code)
+            func['lines'] = [ func['lines'][pc] for pc in origins ]
+            func['frame_size'] = frame_size
+        # The ops were decoded again: bind the register-code call sites.
+        self._link_calls()
+
+    # --- Llamadas ---
+    # CALL name, base: the arguments are in registers base.. of the caller's
+    # frame and the result is written back to register base. TAILCALL name,
+    # base takes its arguments the same way and replaces the caller's frame.
+
+    def op_CALL(self, func_name, base=0, is_initial_call=False):
+        func_def = self.functions.get(func_name)
+        if func_def is None:
+            raise NameError(f"Function '{func_name}' not defined.")
+        if func_def['is_imported']:
+            if func_def['host'] is not None:
+                self._call_host(func_def, base)
+            return
+        if func_def['memo'] is not None and not is_initial_call:
+            self._call_memoized(func_def, base)
+            return
+        self._call_function(func_def, base, is_initial_call)
+
+    def _call_memoized(self, func_def, base=0):
+        # Same as StackMachine._call_memoized, with the arguments in registers base..
+        memo = func_def['memo']
+        key = tuple(self.locals[base:base + func_def['nparams']])
+        result = memo.lookup(key)
+        if result is not None:
+            self.locals[base] = result
+            return
+        self._call_function(func_def, base)
+        self.call_stack[-1].memo = (memo, key)
+
+    def _call_host(self, func_def, base):
+        registers = self.locals
+        result = func_def['host'](*registers[base:base + func_def['nparams']])
+        if func_def['return_type_gox'] is not None:
+            result = 0 if result is None else result
+            registers[base] = int(result) if func_def['return_type'] == 'I' else float(result)
+
+    def _call_function(self, func_def, base=0, is_initial_call=False):
+        nparams = func_def['nparams']
+        caller = self.locals
+        registers = [None] * func_def['frame_size']
+        if nparams:
+            registers[:nparams] = caller[base:base + nparams]
+
+        if not is_initial_call:
+            free_frames = self.free_frames
+            frame = free_frames.pop() if free_frames else Frame()
+            frame.function_name = self.current_function_name
+            frame.code = self.programInst
+            frame.ops = self.programOps
+            frame.pc = self.pc
+            frame.locals = caller
+            frame.base = base
+            self.call_stack.append(frame)
+
+        self.locals = registers
+        self.current_function_name = func_def['name']
+        self.programInst = func_def['code']
+        self.programOps = func_def['ops']
+        self.pc = 0
+
+    def op_RET(self, operand, is_constant=False):
+        value = operand if is_constant else self.locals[operand]
+        if not self.call_stack:
+            self.locals = None
+            self.running = False
+            self.pc = -1
+            return
+        frame = self.call_stack.pop()
+        self.pc = frame.pc
+        self.current_function_name = frame.function_name
+        self.programInst = frame.code
+        self.programOps = frame.ops
+        registers = self.locals = frame.locals
+        registers[frame.base] = value
+        if frame.memo is not None:
+            memo, key = frame.memo
+            frame.memo = None
+            memo.store(key, value)
+        frame.locals = None
+        self.free_frames.append(frame)
+
+    def op_TAILCALL(self, func_name, base=0):
+        # Same as StackMachine.op_TAILCALL, with the arguments in registers base..
+        func_def = self.functions.get(func_name)
+        if func_def is None:
+            raise NameError(f"Function '{func_name}' not defined.")
+        if func_def['is_imported']:
+            self.op_CALL(func_name, base)
+            self.op_RET(base)
+            return False
+        return self._tail_call(func_def, base)
+
+    def _tail_call(self, func_def, base=0):
+        registers = [None] * func_def['frame_size']
+        nparams = func_def['nparams']
+        if nparams:
+            registers[:nparams] = self.locals[base:base + nparams]
+        self.locals = registers
+
+        self.current_function_name = func_def['name']
+        self.programInst = func_def['code']
+        self.programOps = func_def['ops']
+        self.pc = 0
+        return True
+
+    # --- Movimientos entre registros y variables ---
+
+    def op_MOV(self, dst, src):
+        registers = self.locals
+        registers[dst] = registers[src]
+
+    def op_MOVK(self, dst, value):
+        self.locals[dst] = value
+
+    def op_LOAD(self, dst, slot):
+        # Local that may be read before assignment.
+        registers = self.locals
+        value = registers[slot]
+        if value is None:
+            self._unassigned_local(slot)
+        registers[dst] = value
+
+    def op_GLOAD(self, dst, slot):
+        value = self.globals[slot]
+        if value is None:
+            self._unassigned_global(slot)
+        self.locals[dst] = value
+
+    def op_GSTORE(self, slot, src):
+        self.globals[slot] = self.locals[src]
+
+    def op_GSTOREK(self, slot, value):
+        self.globals[slot] = value
+
+    def op_ITOF_R(self, dst, src):
+        registers = self.locals
+        registers[dst] = float(registers[src])
+
+    def op_FTOI_R(self, dst, src):
+        registers = self.locals
+        registers[dst] = int(registers[src])
+
+    # --- Control de flujo ---
+    # Targets are absolute register pcs resolved by the lowering.
+
+    def op_JUMP(self, target):
+        self.pc = target
+
+    def op_IF_R(self, src, target):
+        if self.locals[src] == 0:
+            self.pc = target
+
+    def op_CBREAK_R(self, src, target):
+        if self.locals[src] != 0:
+            self.pc = target
+
+    # --- Expansión de memoria ---
+
+    def op_GROW_R(self, dst, src):
+        num_bytes = self.locals[src]
+        if num_bytes < 0:
+            raise ValueError("Cannot grow memory by a negative amount.")
+        try:
+            base_address_of_new_block = self.heap.allocate(num_bytes)
+        except MemoryError:
+            raise MemoryError(f"Failed to grow memory by {num_bytes} bytes. Current total size: {self.memory.size}")
+        self.locals[dst] = base_address_of_new_block
+
+    # --- Entrada/salida ---
+
+    def op_PRINTI_R(self, src):
+        self.output.write(self.locals[src])
+
+    op_PRINTB_R = op_PRINTI_R
+
+    def op_PRINTI_K(self, value):
+        self.output.write(value)
+
+    op_PRINTB_K = op_PRINTI_K
+
+    def op_PRINTF_R(self, src):
+        self.output.write(float(self.locals[src]))
+
+    def op_PRINTF_K(self, value):
+        self.output.write(float(value))
+
+    # --- Acceso a memoria ---
+
+    def op_PEEKI_R(self, dst, src):
+        registers = self.locals
+        address = registers[src]
+        if address < 0 or address + self.INT_SIZE > self.memory.size:
+            raise IndexError(f"PEEKI: Memory access out of bounds. Address: {address}, Memory size: {self.memory.size}")
+        registers[dst] = self.memory.read_int(address)
+
+    def op_POKEI_R(self, address_src, value_src):
+        registers = self.locals
+        address = registers[address_src]
+        if address < 0 or address + self.INT_SIZE > self.memory.size:
+            raise IndexError(f"POKEI: Memory access out of bounds. Address: {address}, Memory size: {self.memory.size}")
+        self.memory.write_int(address, registers[value_src])
+
+    def op_PEEKF_R(self, dst, src):
+        registers = self.locals
+        address = registers[src]
+        if address < 0 or address + self.FLOAT_SIZE > self.memory.size:
+            raise IndexError(f"PEEKF: Memory access out of bounds. Address: {address}, Memory size: {self.memory.size}")
+        registers[dst] = self.memory.read_float(address)
+
+    def op_POKEF_R(self, address_src, value_src):
+        registers = self.locals
+        address = registers[address_src]
+        if address < 0 or address + self.FLOAT_SIZE > self.memory.size:
+            raise IndexError(f"POKEF: Memory access out of bounds. Address: {address}, Memory size: {self.memory.size}")
+        self.memory.write_float(address, registers[value_src])
+
+    def op_PEEKB_R(self, dst, src):
+        registers = self.locals
+        address = registers[src]
+        if address < 0 or address >= self.memory.size:
+            raise IndexError(f"PEEKB: Memory access out of bounds. Address: {address}, Memory size: {self.memory.size}")
+        registers[dst] = self.memory[address]
+
+    def op_POKEB_R(self, address_src, value_src):
+        registers = self.locals
+        address = registers[address_src]
+        value = registers[value_src]
+        if address < 0 or address >= self.memory.size:
+            raise IndexError(f"POKEB: Memory access out of bounds. Address: {address}, Memory size: {self.memory.size}")
+        if value < 0 or value > 255:
+            raise ValueError(f"POKEB: Byte value must be 0-255, got {value}")
+        self.memory[address] = value
+
+
+# --- Instrucciones de tres direcciones generadas ---
+# <op>_RR dst, a, b / <op>_RK dst, a, k / <op>_KR dst, k, b for every binary
+# IR operation, and IF_<cmp>_RR/RK/KR a, b, target, which jumps unless the
+# comparison holds (the register form of the stack machine's IF_<cmp>).
+
+def _binary(fn, kinds):
+    if kinds == 'RR':
+        def handler(self, dst, a, b):
+            registers = self.locals
+            registers[dst] = fn(registers[a], registers[b])
+    elif kinds == 'RK':
+        def handler(self, dst, a, b):
+            registers = self.locals
+            registers[dst] = fn(registers[a], b)
+    else:
+        def handler(self, dst, a, b):
+            registers = self.locals
+            registers[dst] = fn(a, registers[b])
+    return handler
+
+def _compare(cmp, kinds):
+    # Comparisons get their own handlers to store 1/0 without a second step.
+    if kinds == 'RR':
+        def handler(self, dst, a, b):
+            registers = self.locals
+            registers[dst] = 1 if cmp(registers[a], registers[b]) else 0
+    elif kinds == 'RK':
+        def handler(self, dst, a, b):
+            registers = self.locals
+            registers[dst] = 1 if cmp(registers[a], b) else 0
+    else:
+        def handler(self, dst, a, b):
+            registers = self.locals
+            registers[dst] = 1 if cmp(a, registers[b]) else 0
+    return handler
+
+def _compare_jump(cmp, kinds):
+    if kinds == 'RR':
+        def handler(self, a, b, target):
+            registers = self.locals
+            if not cmp(registers[a], registers[b]):
+                self.pc = target
+    elif kinds == 'RK':
+        def handler(self, a, b, target):
+            if not cmp(self.locals[a], b):
+                self.pc = target
+    else:
+        def handler(self, a, b, target):
+            if not cmp(a, self.locals[b]):
+                self.pc = target
+    return handler
+
+for _name, _fn in BINARY.items():
+    for _kinds in ('RR', 'RK', 'KR'):
+        if _name in COMPARISONS:
+            setattr(RegisterMachine, f'op_{_name}_{_kinds}', _compare(_fn, _kinds))
+            setattr(RegisterMachine, f'op_IF_{_name}_{_kinds}', _compare_jump(_fn, _kinds))
+        else:
+            setattr(RegisterMachine, f'op_{_name}_{_kinds}', _binary(_fn, _kinds))
@@ -0,0 +1,327 @@
+# registers.py
+#
+# Traducción del código de pila a código de tres direcciones para la
+# RegisterMachine (source/register_machine.py).
+#
+# Cada función trabaja sobre un único arreglo de registros, su frame: los
+# primeros nslots son sus variables locales (los mismos slots que usa la
+# StackMachine) y a continuación hay un registro por cada posición de la pila
+# de operandos. El verificador (source/irverify.py) da la profundidad de la
+# pila antes de cada instrucción, así que el valor que la pila tendría en la
+# posición i vive en el registro nslots + i.
+#
+# La traducción lleva una pila simbólica: apilar una constante o una variable
+# local no genera código, solo recuerda el operando ('k', valor) o ('r',
+# registro). Cada operación emite una instrucción que lee sus operandos
+# directamente de los registros (o como constante) y escribe su resultado:
+#
+#   LOCAL_LOAD a; LOCAL_LOAD b; ADDI; LOCAL_STORE c   ->  ADDI_RR c, a, b
+#   LOCAL_LOAD i; CONSTI 10; LTI; IF                  ->  IF_LTI_RK i, 10, destino
+#   CONSTI 2; CONSTI 3; MULI                          ->  (constante 6)
+#
+# Antes de un salto y en cada destino de salto la pila simbólica se vuelca a
+# sus registros (MOV/MOVK), de modo que todos los caminos que llegan a una
+# misma instrucción dejan los valores en el mismo lugar.
+#
+# Las variables que pueden leerse antes de asignarse (la misma regla que usa
+# el JIT) se leen con LOAD, que comprueba que tengan valor; el resto se usa
+# directamente como operando.
+
+import math
+import operator
+
+from source.irverify import stack_effect, _branch_kind
+from source.peephole import COMPARISONS
+
+def _divi(a, b):
+	if b == 0:
+		raise ZeroDivisionError("Integer division by zero")
+	return a // b
+
+def _divf(a, b):
+	if b == 0.0:
+		raise ZeroDivisionError("Floating point division by zero")
+	return a / b
+
+# Operaciones binarias del IR: nombre -> función sobre los valores
+BINARY = {
+	'ADDI': operator.add, 'SUBI': operator.sub, 'MULI': operator.mul, 'DIVI': _divi,
+	'ANDI': operator.and_, 'ORI': operator.or_,
+	'ADDF': operator.add, 'SUBF': operator.sub, 'MULF': operator.mul, 'DIVF': _divf,
+}
+BINARY.update(COMPARISONS)
+
+# Instrucciones de registros cuyo primer operando es el registro destino
+_DEFINES = { 'MOV', 'MOVK', 'LOAD', 'GLOAD', 'ITOF_R', 'FTOI_R', 'PEEKI_R', 'PEEKF_R', 'PEEKB_R', 'GROW_R' }
+_DEFINES.update(f'{name}_{kinds}' for name in BINARY for kinds in ('RR', 'RK', 'KR'))
+
+_CONVERSIONS = { 'ITOF': float, 'FTOI': int }
+
+def _fold_conversion(opname, value):
+	'''
+	Resultado de ITOF/FTOI sobre una constante, o None si la conversión
+	fallaría (infinito, NaN o un entero fuera del rango de float).
+	'''
+	if opname == 'FTOI' and not math.isfinite(value):
+		return None
+	try:
+		result = _CONVERSIONS[opname](value)
+	except (OverflowError, ValueError):
+		return None
+	if opname == 'ITOF' and not math.isfinite(result):
+		return None
+	return result
+
+def _kind(operand):
+	return 'K' if operand[0] == 'k' else 'R'
+
+def slots_needing_checks(code, nparams):
+	'''
+	Slots locales que se pueden leer antes de asignarse (también para el
+	JIT, sobre código con superinstrucciones). Un slot no necesita
+	comprobación si su primer uso, en orden lineal, es una asignación fuera
+	de todo IF/LOOP: cualquier camino hasta una lectura posterior pasa por ella.
+	'''
+	depth = 0
+	seen = set()
+	checked = set()
+	for instr in code:
+		opname = instr[0]
+		if opname == 'IF' or opname.startswith('IF_') or opname == 'LOOP':
+			depth += 1
+		elif opname in ('ENDIF', 'ENDLOOP'):
+			depth -= 1
+		elif opname.startswith('LOCAL_'):
+			slot = instr[1]
+			if slot < nparams or slot in seen:
+				continue
+			seen.add(slot)
+			if not (opname == 'LOCAL_STORE' and depth == 0):
+				checked.add(slot)
+	return checked
+
+class _Lowering:
+	'''
+	Estado de la traducción de una función.
+	'''
+	def __init__(self, func, states, functions, global_types):
+		self.func = func
+		self.states = states
+		self.functions = functions
+		self.global_types = global_types
+		self.nslots = func['nslots']
+		self.code = [ ]          # instrucciones de registros
+		self.origins = [ ]       # pc de pila de cada instrucción
+		self.branches = [ ]      # índices de code cuyo último operando es un pc de pila
+		self.stack = [ ]         # pila simbólica; None tras un salto incondicional
+		self.fence = 0           # primera instrucción posterior al último destino de salto
+		self.pc = 0
+
+	def emit(self, instr, branch=False):
+		if branch:
+			self.branches.append(len(self.code))
+		self.code.append(instr)
+		self.origins.append(self.pc)
+
+	def last_def(self, register, opnames=_DEFINES):
+		# La última instrucción emitida, si define register y ningún salto llega entre medio
+		if len(self.code) > self.fence:
+			instr = self.code[-1]
+			if instr[0] in opnames and instr[1] == register:
+				return instr
+		return None
+
+	def temp(self, position):
+		return self.nslots + position
+
+	def materialize(self, position):
+		# Lleva el operando de la posición a su registro de pila
+		operand = self.stack[position]
+		register = self.temp(position)
+		if operand == ('r', register):
+			return
+		if operand[0] == 'k':
+			self.emit(('MOVK', register, operand[1]))
+		else:
+			self.emit(('MOV', register, operand[1]))
+		self.stack[position] = ('r', register)
+
+	def flush(self):
+		for position in range(len(self.stack)):
+			self.materialize(position)
+
+	def register(self, operand, position):
+		# Operando en registro (las constantes se cargan en el de su posición)
+		if operand[0] == 'k':
+			register = self.temp(position)
+			self.emit(('MOVK', register, operand[1]))
+			return register
+		return operand[1]
+
+	def push_result(self, opname, *operands):
+		register = self.temp(len(self.stack))
+		self.emit((opname, register) + operands)
+		self.stack.append(('r', register))
+
+	def store_local(self, slot, operand):
+		if operand == ('r', slot):
+			return
+		# Las lecturas pendientes de la variable se hacen antes de modificarla
+		for position, entry in enumerate(self.stack):
+			if entry == ('r', slot):
+				self.materialize(position)
+		if operand[0] == 'k':
+			self.emit(('MOVK', slot, operand[1]))
+			return
+		instr = self.last_def(operand[1])
+		if operand[1] >= self.nslots and instr is not None:
+			# El resultado se escribe directamente en la variable
+			self.code[-1] = (instr[0], slot) + instr[2:]
+		else:
+			self.emit(('MOV', slot, operand[1]))
+
+	def branch_unless(self, condition, target, jump_if_zero):
+		'''
+		Salto condicional de IF (jump_if_zero) o CBREAK. Si la condición es
+		una comparación recién calculada, se fusiona con el salto.
+		'''
+		if condition[0] == 'k':
+			if (condition[1] == 0) == jump_if_zero:
+				self.flush()
+				self.emit(('JUMP', target), branch=True)
+				self.stack = None
+			return
+		register = condition[1]
+		if not jump_if_zero:
+			# Condición de while: CONSTI 1; <cond>; SUBI; CBREAK sale si cond != 1
+			instr = self.last_def(register, ('SUBI_KR',))
+			if instr is not None and instr[2] == 1:
+				del self.code[-1], self.origins[-1]
+				if self._fuse_compare(instr[3], target):
+					return
+				self.emit(instr)
+		elif self._fuse_compare(register, target):
+			return
+		self.flush()
+		self.emit(('IF_R' if jump_if_zero else 'CBREAK_R', register, target), branch=True)
+
+	def _fuse_compare(self, register, target):
+		instr = self.last_def(register, _COMPARE_DEFINES)
+		if instr is None:
+			return False
+		del self.code[-1], self.origins[-1]
+		self.flush()
+		name, kinds = instr[0].rsplit('_', 1)
+		self.emit((f'IF_{name}_{kinds}', instr[2], instr[3], target), branch=True)
+		return True
+
+	def lower(self):
+		code = self.func['code']
+		targets = { instr[-1] for instr in code if _branch_kind(instr[0]) is not None }
+		checked = slots_needing_checks(code, self.func['nparams'])
+		where = [0] * len(code)
+		for pc, instr in enumerate(code):
+			self.pc = pc
+			state = self.states[pc]
+			if state is None:
+				where[pc] = len(self.code)
+				continue
+			if pc in targets or self.stack is None:
+				if self.stack is not None:
+					self.flush()
+				self.stack = [ ('r', self.temp(position)) for position in range(len(state)) ]
+				self.fence = len(self.code)
+			where[pc] = len(self.code)
+			self.instruction(instr, checked)
+		for index in self.branches:
+			instr = self.code[index]
+			self.code[index] = instr[:-1] + (where[instr[-1]],)
+		depth = max((len(state) for state in self.states if state is not None), default=0)
+		return self.code, self.origins, self.nslots + depth + 1
+
+	def instruction(self, instr, checked):
+		opname = instr[0]
+		stack = self.stack
+		if opname in ('CONSTI', 'CONSTF'):
+			stack.append(('k', instr[1]))
+		elif opname == 'LOCAL_LOAD':
+			if instr[1] in checked:
+				self.push_result('LOAD', instr[1])
+			else:
+				stack.append(('r', instr[1]))
+		elif opname == 'LOCAL_STORE':
+			self.store_local(instr[1], stack.pop())
+		elif opname == 'GLOBAL_LOAD':
+			self.push_result('GLOAD', instr[1])
+		elif opname == 'GLOBAL_STORE':
+			value = stack.pop()
+			self.emit(('GSTOREK' if value[0] == 'k' else 'GSTORE', instr[1], value[1]))
+		elif opname in BINARY:
+			b = stack.pop()
+			a = stack.pop()
+			if a[0] == 'k' and b[0] == 'k' and not (opname in ('DIVI', 'DIVF') and b[1] == 0):
+				result = BINARY[opname](a[1], b[1])
+				stack.append(('k', int(result) if opname in COMPARISONS else result))
+				return
+			if a[0] == 'k' and b[0] == 'k':
+				a = ('r', self.register(a, len(stack)))
+			self.push_result(f'{opname}_{_kind(a)}{_kind(b)}', a[1], b[1])
+		elif opname in _CONVERSIONS:
+			value = stack.pop()
+			folded = _fold_conversion(opname, value[1]) if value[0] == 'k' else None
+			if folded is not None:
+				stack.append(('k', folded))
+			else:
+				# Sin plegar, int(inf) o float(10**400) fallan al ejecutarse, como en la StackMachine
+				self.push_result(f'{opname}_R', self.register(value, len(stack)))
+		elif opname in ('PRINTI', 'PRINTF', 'PRINTB'):
+			value = stack.pop()
+			self.emit((f'{opname}_{_kind(value)}', value[1]))
+		elif opname in ('PEEKI', 'PEEKF', 'PEEKB', 'GROW'):
+			position = len(stack) - 1
+			self.push_result(f'{opname}_R', self.register(stack.pop(), position))
+		elif opname in ('POKEI', 'POKEF', 'POKEB'):
+			value = self.register(stack.pop(), len(stack))
+			address = self.register(stack.pop(), len(stack))
+			self.emit((f'{opname}_R', address, value))
+		elif opname in ('CALL', 'TAILCALL'):
+			pops, pushes = stack_effect(instr, self.func, self.functions, self.global_types)
+			base = len(stack) - len(pops)
+			for position in range(base, len(stack)):
+				self.materialize(position)
+			del stack[base:]
+			self.emit((opname, instr[1], self.temp(base)))
+			if opname == 'TAILCALL':
+				self.stack = None
+			elif pushes:
+				stack.append(('r', self.temp(base)))
+		elif opname == 'RET':
+			value = stack.pop()
+			self.emit(('RET', value[1], value[0] == 'k'))
+			self.stack = None
+		elif opname == 'IF':
+			self.branch_unless(stack.pop(), instr[1], True)
+		elif opname == 'CBREAK':
+			self.branch_unless(stack.pop(), instr[1], False)
+		elif opname in ('ELSE', 'CONTINUE', 'ENDLOOP'):
+			self.flush()
+			self.emit(('JUMP', instr[1]), branch=True)
+			self.stack = None
+		elif opname == 'POP':
+			# El resultado de la llamada ya está en su registro: no se usa
+			stack.pop()
+		elif opname in ('ENDIF', 'LOOP'):
+			pass
+		else:
+			raise TypeError(f"Cannot lower instruction '{opname}' to registers.")
+
+_COMPARE_DEFINES = { f'{name}_{kinds}' for name in COMPARISONS for kinds in ('RR', 'RK', 'KR') }
+
+def lower_function(func, states, functions, global_types):
+	'''
+	Traduce el código de pila enlazado de func (una entrada de
+	StackMachine.functions, sin superinstrucciones) con las pilas de tipos
+	states de verify_function. Devuelve (código de registros, pc de pila de
+	cada instrucción, tamaño del frame).
+	'''
+	return _Lowering(func, states, functions, global_types).lower()
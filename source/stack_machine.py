@@ -1,7 +1,19 @@
 
 
 from rich import print
+import asyncio
 import json,os
+import time
+from functools import partial
+from source.peephole import fuse, COMPARISONS, CONST_ARITHMETIC, CONST_COMPARISONS
+from source.jit import JITCompiler
+from source.memory import Memory
+from source.heap import Heap
+from source.hostfuncs import bind_host_function
+from source.output import make_output_sink
+from source.profiler import Profiler, CallGraphProfiler
+from source.memo import MemoCache, memoizable
+from source.bytecode import read_module
 
 def load_config():
     try:
@@ -23,26 +35,102 @@ def load_config():
 
 CONFIG = load_config()
 
-class StackMachine:
+class Frame:
+    """Caller state that CALL saves on call_stack and RET restores.
+
+    base is the operand stack depth right after the arguments were popped
+    (RegisterMachine keeps the caller's result register there). memo is the
+    (MemoCache, key) the callee's result goes to when the call missed the
+    cache, otherwise None. Frames are recycled through
+    StackMachine.free_frames, so once the deepest call chain has been
+    reached a call allocates nothing but the callee's locals.
+    """
+    __slots__ = ('function_name', 'code', 'ops', 'pc', 'locals', 'base', 'memo')
+
     def __init__(self):
+        # RET resets memo before pooling the frame.
+        self.memo = None
+
+    def __repr__(self):
+        return f"Frame({self.function_name!r}, pc={self.pc}, base={self.base})"
+
+class StackMachine:
+    # Bucles de ejecución disponibles (ver run()).
+    ENGINES = ('classic', 'threaded')
+    # Los elementos de la pila son tuplas (tipo, valor).
+    TAGGED = True
+    # Entradas de la caché de cada función pura; None sin Memoize. Solo se
+    # asigna en la instancia si está activada: un atributo más en cada
+    # máquina vuelve más lentos los accesos a self en el bucle de ejecución.
+    memo_size = None
+
+    def __init__(self, engine=None, superinstructions=None, jit=None, output=None, profile=None, callgraph=None,
+                 memoize=None, memo_size=None):
         self.stack = []                       
-        self.memory = bytearray([0] * 1024)   
-        self.globals = {}                     
-        self.locals_stack = []                
-        self.call_stack = []                  
+        self.globals = []                     
+        self.locals = None                    
+        self.call_stack = []                  # Frame of every active caller
+        self.free_frames = []                 # Frames returned by RET, reused by CALL
         self.functions = {}                  
         self.pc = 0                          
         self.programInst = []              
+        self.programOps = []
         self.running = False
+        self.started = False
         self.current_function_name = None
 
         self.debug = CONFIG.get("Debug", True)
         self.INT_SIZE = CONFIG.get("IntSize", 4)
         self.FLOAT_SIZE = CONFIG.get("FloatSize", 4)
-
-        self.control_flow_stack = []
-        self.pc_modified_by_operation = False 
-
+        self.memory = Memory(1024, self.INT_SIZE, self.FLOAT_SIZE)
+        self.heap = Heap(self.memory)
+
+        self.engine = engine or CONFIG.get("Engine", "threaded")
+        if self.engine not in self.ENGINES:
+            raise ValueError(f"Unknown execution engine '{self.engine}'. Expected one of {self.ENGINES}.")
+        self.instruction_count = 0
+        # Opt-in profiler (Profile setting): counts and times every instruction.
+        if profile is None:
+            profile = CONFIG.get("Profile", False)
+        self.profiler = Profiler() if profile else None
+        # Opt-in call-graph profiler (CallGraph setting): only this instance's
+        # CALL/RET handlers are replaced, so the class handlers stay untouched.
+        if callgraph is None:
+            callgraph = CONFIG.get("CallGraph", False)
+        self.callgraph = CallGraphProfiler() if callgraph else None
+        if self.callgraph is not None:
+            self.op_CALL = self._op_CALL_profiled
+            self.op_RET = self._op_RET_profiled
+            self.op_TAILCALL = self._op_TAILCALL_profiled
+        # The execution loop is chosen once: with Debug off no tracing code
+        # runs at all; with Debug on every instruction goes through _run_traced.
+        # Likewise only _run_profiled carries profiling code.
+        if self.debug:
+            self._execute = self._run_traced
+        elif self.profiler is not None:
+            self._execute = self._run_profiled
+        elif self.engine == 'threaded':
+            self._execute = self._run_threaded
+        else:
+            self._execute = self._run_classic
+        # Fusión de superinstrucciones al cargar el módulo (source/peephole.py)
+        if superinstructions is None:
+            superinstructions = CONFIG.get("Superinstructions", False)
+        self.superinstructions = superinstructions
+        # Compilación de funciones calientes a Python (source/jit.py)
+        if jit is None:
+            jit = CONFIG.get("JIT", False)
+        self.jit = JITCompiler(self, CONFIG.get("JITThreshold", 100)) if jit else None
+        # Caché de resultados de las funciones puras (source/purity.py, source/memo.py)
+        if memoize is None:
+            memoize = CONFIG.get("Memoize", False)
+        if memoize:
+            self.memo_size = memo_size or CONFIG.get("MemoizeSize", 1024)
+        # Destino de PRINTI/PRINTF/PRINTB (source/output.py): un nombre o un OutputSink.
+        # Con Debug se vacía en cada valor para que la salida no se desfase de la traza.
+        if output is None:
+            output = CONFIG.get("Output", "rich")
+        self.output = make_output_sink(output, 1 if self.debug else CONFIG.get("OutputBatchSize", 256))
 
     def _log_debug(self, message, flush=False):
         if self.debug:
@@ -53,23 +141,220 @@ class StackMachine:
         self.running = False 
 
     def load_module(self, ir_module):
+        # A path is read as a .goxc bytecode file (source/bytecode.py).
+        if isinstance(ir_module, (str, os.PathLike)):
+            ir_module = read_module(ir_module)
+        # Globals live in a fixed-size list indexed by the slot IRCode gave them.
+        ordered_globals = sorted(ir_module.globals.values(), key=lambda g: g.slot)
+        self.global_slots = { glob.name: glob.slot for glob in ordered_globals }
+        self.global_names = [ glob.name for glob in ordered_globals ]
+        self.global_types = [ glob.type for glob in ordered_globals ]
+        self.globals = [None] * len(ordered_globals)
+        self.started = False
         self.functions = {}
+        # Bound before linking: an import without an implementation pushes no result.
+        hosts = { name: bind_host_function(self, func_def)
+                  for name, func_def in ir_module.functions.items() if func_def.imported }
+        self.unbound_imports = { name for name, host in hosts.items() if host is None }
         for name, func_def in ir_module.functions.items():
+            origins = []
+            code = self._link_code(func_def, origins)
+            slot_names = sorted(func_def.slots, key=func_def.slots.get)
             self.functions[name] = {
                 'name': func_def.name,
                 'params': func_def.parmnames,
                 'param_types': func_def.parmtypes, 
-                'code': func_def.code,
+                'code': code,
+                'ops': self._decode(func_def.name, code),
+                'lines': self._source_lines(func_def, origins),
                 'locals_spec': func_def.locals, 
                 'locals_gox': func_def.locals_gox, 
+                'slot_names': slot_names,
+                'slot_types': [ func_def.locals[local_name] for local_name in slot_names ],
+                'nslots': len(slot_names),
+                'nparams': len(func_def.parmnames),
                 'return_type': func_def.return_type, 
                 'return_type_gox': func_def.return_type_gox,
-                'is_imported': func_def.imported
+                'is_imported': func_def.imported,
+                'host': hosts.get(name),
+                'memo': None,
             }
-        self.globals = { name: (None, ir_module.globals[name].type) for name in ir_module.globals } # Store as (value, IR_type)
+            if self.memo_size is not None and func_def.pure and memoizable(self.functions[name]):
+                self.functions[name]['memo'] = MemoCache(name, self.memo_size)
         if 'main' not in self.functions:
             raise RuntimeError("No 'main' function found in IR module to start execution.")
-        self._log_debug(f"Module loaded. Functions: {list(self.functions.keys())}. Globals: {list(self.globals.keys())}")
+        self._link_calls()
+        if self.jit is not None:
+            self.jit.reset()
+        self._log_debug(f"Module loaded. Functions: {list(self.functions.keys())}. Globals: {self.global_names}")
+
+    def _link_code(self, func_def, origins=None):
+        """Return the executable form of an IRFunction's code.
+
+        The IR pc each linked instruction comes from is appended to origins
+        (see _source_lines).
+        """
+        code, pcs = self._drop_unbound_results(func_def, self._resolve_slots(func_def, list(func_def.code)))
+        if self.superinstructions:
+            fused = []
+            code = fuse(code, fused)
+            pcs = [ pcs[index] for index in fused ]
+        if origins is not None:
+            origins.extend(pcs)
+        return self._resolve_branch_targets(func_def.name, code)
+
+    def _drop_unbound_results(self, func_def, code):
+        """Remove the POP after each call to an import without a host function.
+
+        IRCode discards the declared result of an imported function called
+        as a statement; without an implementation the call pushes nothing,
+        so there is nothing to discard. Returns (code, IR pc of each
+        instruction).
+        """
+        kept = []
+        pcs = []
+        for pc, instr in enumerate(code):
+            if (instr[0] == 'POP' and pc and code[pc - 1][0] == 'CALL'
+                    and code[pc - 1][1] in self.unbound_imports):
+                continue
+            kept.append(instr)
+            pcs.append(pc)
+        return kept, pcs
+
+    def _source_lines(self, func_def, origins):
+        """Source line of each linked instruction, 0 where unknown."""
+        lines = [0] * len(func_def.code)
+        starts = func_def.lines + [(len(lines), 0)]
+        for (start, line), (end, _) in zip(starts, starts[1:]):
+            lines[start:end] = [line] * (end - start)
+        return [ lines[pc] for pc in origins ]
+
+    # Named variable access -> slot-addressed opcode
+    _SLOT_OPCODES = {
+        'LOCAL_GET': 'LOCAL_LOAD',
+        'LOCAL_SET': 'LOCAL_STORE',
+        'GLOBAL_GET': 'GLOBAL_LOAD',
+        'GLOBAL_SET': 'GLOBAL_STORE',
+    }
+
+    def _resolve_slots(self, func_def, code):
+        """Rewrite named variable accesses into slot-addressed opcodes."""
+        for pc, instr in enumerate(code):
+            opname = self._SLOT_OPCODES.get(instr[0])
+            if opname is None:
+                continue
+            name = instr[1]
+            if opname.startswith('LOCAL'):
+                if name not in func_def.slots:
+                    raise NameError(f"Local variable '{name}' not found in '{func_def.name}' (PC {pc}).")
+                code[pc] = (opname, func_def.slots[name])
+            else:
+                if name not in self.global_slots:
+                    raise NameError(f"Global variable '{name}' not found (PC {pc} in '{func_def.name}').")
+                code[pc] = (opname, self.global_slots[name])
+        for index, param_name in enumerate(func_def.parmnames):
+            if func_def.slots.get(param_name) != index:
+                raise RuntimeError(f"Parameter '{param_name}' of '{func_def.name}' is not in slot {index}.")
+        return code
+
+    def _resolve_branch_targets(self, func_name, code):
+        """Link structured control flow once per function.
+
+        Returns a copy of code where IF, ELSE, CBREAK, CONTINUE and ENDLOOP
+        (and their fused forms IF_*, WHILE*, BREAK) get the absolute PC of
+        the next instruction to execute when taken as their last operand.
+        """
+        linked = list(code)
+        open_ifs = []    # [IF pc, ELSE pc or None]
+        open_loops = []  # (LOOP pc, [pending CBREAK pcs])
+        for pc, instr in enumerate(code):
+            opname = instr[0]
+            if opname == 'IF' or opname.startswith('IF_'):
+                open_ifs.append([pc, None])
+            elif opname == 'ELSE':
+                if not open_ifs or open_ifs[-1][1] is not None:
+                    raise RuntimeError(f"ELSE without matching IF at PC {pc} in '{func_name}'.")
+                open_ifs[-1][1] = pc
+            elif opname == 'ENDIF':
+                if not open_ifs:
+                    raise RuntimeError(f"ENDIF without matching IF at PC {pc} in '{func_name}'.")
+                if_pc, else_pc = open_ifs.pop()
+                if else_pc is None:
+                    linked[if_pc] = code[if_pc] + (pc,)
+                else:
+                    linked[if_pc] = code[if_pc] + (else_pc + 1,)
+                    linked[else_pc] = ('ELSE', pc + 1)
+            elif opname == 'LOOP':
+                open_loops.append((pc, []))
+            elif opname in ('CBREAK', 'BREAK', 'WHILE') or opname.startswith('WHILE_'):
+                if not open_loops:
+                    raise RuntimeError(f"{opname} outside of a loop at PC {pc} in '{func_name}'.")
+                open_loops[-1][1].append(pc)
+            elif opname == 'CONTINUE':
+                if not open_loops:
+                    raise RuntimeError(f"CONTINUE without active LOOP at PC {pc} in '{func_name}'.")
+                linked[pc] = ('CONTINUE', open_loops[-1][0] + 1)
+            elif opname == 'ENDLOOP':
+                if not open_loops:
+                    raise RuntimeError(f"ENDLOOP without matching LOOP at PC {pc} in '{func_name}'.")
+                loop_pc, breaks = open_loops.pop()
+                linked[pc] = ('ENDLOOP', loop_pc + 1)
+                for break_pc in breaks:
+                    linked[break_pc] = code[break_pc] + (pc + 1,)
+        if open_ifs:
+            raise RuntimeError(f"IF at PC {open_ifs[-1][0]} in '{func_name}' did not find matching ENDIF.")
+        if open_loops:
+            raise RuntimeError(f"LOOP at PC {open_loops[-1][0]} in '{func_name}' did not find matching ENDLOOP.")
+        return linked
+
+    def _link_calls(self):
+        """Bind every CALL and TAILCALL site to its callee once all functions exist.
+
+        A call to an undefined function is a NameError here, at load time. In
+        the pre-decoded ops a call to a GoxLang function becomes
+        _call_function/_tail_call with the callee's entry in self.functions
+        (arity, slot count, code and ops), or _call_memoized when the callee
+        has a MemoCache, and a call to a host function
+        becomes _call_host, so the threaded loop neither looks names up nor
+        tests is_imported per call. The code keeps the names for the classic
+        loop, the verifier and the JIT. With CallGraph the instrumented
+        op_CALL/op_TAILCALL stay in place.
+        """
+        for func_def in self.functions.values():
+            ops = func_def['ops']
+            for pc, instr in enumerate(func_def['code']):
+                opname = instr[0]
+                if opname != 'CALL' and opname != 'TAILCALL':
+                    continue
+                callee = self.functions.get(instr[1])
+                if callee is None:
+                    raise NameError(f"Function '{instr[1]}' not defined (called from '{func_def['name']}' at PC {pc}).")
+                if self.callgraph is not None:
+                    continue
+                if opname == 'CALL' and callee['memo'] is not None:
+                    handler = self._call_memoized
+                elif not callee['is_imported']:
+                    handler = self._call_function if opname == 'CALL' else self._tail_call
+                elif opname == 'CALL' and callee['host'] is not None:
+                    handler = self._call_host
+                else:
+                    continue
+                # Further operands (RegisterMachine's base register) follow the callee.
+                ops[pc] = partial(handler, callee, *instr[2:])
+
+    def _decode(self, func_name, code):
+        """Pre-decode linked code for the threaded engine.
+
+        Every instruction becomes a bound op_* handler with its operands
+        already applied, so dispatching it is a single call.
+        """
+        ops = []
+        for pc, instr in enumerate(code):
+            method = getattr(self, f"op_{instr[0]}", None)
+            if method is None:
+                raise RuntimeError(f"Unknown instruction: {instr[0]} at PC {pc} in '{func_name}'")
+            ops.append(partial(method, *instr[1:]) if len(instr) > 1 else method)
+        return ops
 
     def _initialize_execution(self):
         if not self.functions or 'main' not in self.functions:
@@ -79,31 +364,157 @@ class StackMachine:
         self.op_CALL('main', is_initial_call=True)
         return True
 
+    def _start(self):
+        # Calls main the first time; afterwards execution resumes where it stopped.
+        # Returns whether there is anything left to run.
+        if not self.started:
+            if not self._initialize_execution():
+                return False
+            self.started = True
+            self.running = True
+        return self.running
+
     def run(self):
-        if not self._initialize_execution():
+        if not self._start():
             return
 
-        self.running = True
-        instruction_count = 0
-
         max_instructions = CONFIG.get("MaxInstructions", 10 * 10000*100)  
-
-        self._log_debug(f"--- Starting execution from '{self.current_function_name}' ---")
-
-        while self.running:
-            self._log_debug(f"TOP OF RUN LOOP: PC={self.pc}, Current Function={self.current_function_name}") 
+        try:
+            self._execute(max_instructions - self.instruction_count)
+            if self.running:
+                self._instruction_limit_reached(max_instructions)
+        finally:
+            self.output.flush()
+
+    def step(self, n=1):
+        """Run at most n instructions and return True while the program has not finished.
+
+        The pc, stacks and frames stay on the machine, so the next call resumes
+        where this one stopped and several machines can be interleaved in one
+        thread. A call to a JIT-compiled function counts as one instruction and
+        runs to completion. Output is flushed at the end of every slice; an
+        error stops the program and propagates.
+        """
+        if not self._start():
+            return False
+        try:
+            self._execute(n)
+        except BaseException:
+            self.running = False
+            raise
+        finally:
+            self.output.flush()
+        return self.running
+
+    async def run_async(self, slice_size=1000, max_instructions=None):
+        """Run the program in slices of slice_size instructions, yielding to the event loop between them.
+
+        max_instructions defaults to the MaxInstructions setting; reaching it
+        raises the same RuntimeError as run().
+        """
+        if max_instructions is None:
+            max_instructions = CONFIG.get("MaxInstructions", 10 * 10000*100)
+        while self.step(min(slice_size, max_instructions - self.instruction_count)):
+            if self.instruction_count >= max_instructions:
+                self.running = False
+                self._instruction_limit_reached(max_instructions)
+            await asyncio.sleep(0)
+
+    def _instruction_limit_reached(self, max_instructions):
+        self.running = False
+        last_pc = self.pc - 1 if self.pc > 0 else 0
+        last_instr = self.programInst[last_pc] if last_pc < len(self.programInst) else None
+        if self._execute in (self._run_classic, self._run_traced):
+            print(f"Stack: {self.stack}")
+            print(f"Locals: {self.locals if self.locals is not None else 'N/A'}")
+            print(f"Globals: {self.globals}")
+        raise RuntimeError(f"Instruction limit ({max_instructions}) reached, possible infinite loop or very long program. Last instruction: {last_instr} at PC {last_pc} in {self.current_function_name}")
+
+    # The loops below run at most budget instructions and stop early when the
+    # program halts; run() and step() decide what an exhausted budget means.
+
+    def _run_threaded(self, budget):
+        # Handlers run with self.pc already pointing at the next instruction;
+        # branches, CALL and RET simply overwrite it.
+        executed = 0
+        try:
+            for executed in range(1, budget + 1):
+                pc = self.pc
+                self.pc = pc + 1
+                self.programOps[pc]()
+                if not self.running:
+                    break
+        except IndexError:
+            if 0 <= self.pc - 1 < len(self.programOps):
+                raise
+            raise RuntimeError(f"PC ({self.pc - 1}) out of bounds. Program length: {len(self.programOps)} for function '{self.current_function_name}'. Call Stack: {self.call_stack}")
+        finally:
+            self.instruction_count += executed
+
+    def _run_profiled(self, budget):
+        # _run_threaded plus a count and a perf_counter_ns() time per (function, pc).
+        samples = self.profiler.samples
+        clock = time.perf_counter_ns
+        executed = 0
+        try:
+            for executed in range(1, budget + 1):
+                pc = self.pc
+                self.pc = pc + 1
+                key = (self.current_function_name, pc)
+                start = clock()
+                self.programOps[pc]()
+                elapsed = clock() - start
+                sample = samples.get(key)
+                if sample is None:
+                    samples[key] = [1, elapsed]
+                else:
+                    sample[0] += 1
+                    sample[1] += elapsed
+                if not self.running:
+                    break
+        except IndexError:
+            if 0 <= self.pc - 1 < len(self.programOps):
+                raise
+            raise RuntimeError(f"PC ({self.pc - 1}) out of bounds. Program length: {len(self.programOps)} for function '{self.current_function_name}'. Call Stack: {self.call_stack}")
+        finally:
+            self.instruction_count += executed
+
+    def _run_classic(self, budget):
+        self._dispatch(budget)
+
+    def _run_traced(self, budget):
+        # Debug loop: same semantics as _run_classic, logging every step.
+        if not self.instruction_count:
+            self._log_debug(f"--- Starting execution from '{self.current_function_name}' ---")
+
+        self._dispatch(budget, self._log_debug)
+
+        if not self.running:
+            self._log_debug("--- Execution halted ---")
+            if self.stack:
+                self._log_debug(f"Final stack (non-empty): {self.stack}")
+
+    def _dispatch(self, budget, log=None):
+        # Fetch/dispatch loop shared by _run_classic and _run_traced: handlers are
+        # looked up by name on every step, and log (if any) receives each trace line.
+        executed = 0
+        while self.running and executed < budget:
+            if log:
+                log(f"TOP OF RUN LOOP: PC={self.pc}, Current Function={self.current_function_name}")
             if self.pc < 0 or self.pc >= len(self.programInst):
-                if self.current_function_name == 'main' and not self.call_stack :
-                     self._log_debug(f"Execution finished: PC ({self.pc}) out of bounds for main's program instructions ({len(self.programInst)}).")
-                     self.running = False
-                     break
-                elif not self.programInst: 
-                    self._log_debug(f"Warning: Program instructions list is empty for function '{self.current_function_name}'. Attempting RET.")
+                if self.current_function_name == 'main' and not self.call_stack:
+                    if log:
+                        log(f"Execution finished: PC ({self.pc}) out of bounds for main's program instructions ({len(self.programInst)}).")
+                    self.running = False
+                    break
+                elif not self.programInst:
+                    if log:
+                        log(f"Warning: Program instructions list is empty for function '{self.current_function_name}'. Attempting RET.")
                     if not self.call_stack:
                         self.running = False
                         break
-                    self.op_RET() 
-                    continue 
+                    self.op_RET()
+                    continue
                 else:
                     raise RuntimeError(f"PC ({self.pc}) out of bounds. Program length: {len(self.programInst)} for function '{self.current_function_name}'. Call Stack: {self.call_stack}")
 
@@ -111,34 +522,20 @@ class StackMachine:
             opname = instr[0]
             args = instr[1:] if len(instr) > 1 else []
 
-            self._log_debug(f"PC: {self.pc}, Func: {self.current_function_name}, Instr: {opname} {args}, Stack: {self.stack}, Locals: {self.locals_stack[-1] if self.locals_stack else 'N/A'}")
+            if log:
+                log(f"PC: {self.pc}, Func: {self.current_function_name}, Instr: {opname} {args}, Stack: {self.stack}, Locals: {self.locals if self.locals is not None else 'N/A'}")
 
             method = getattr(self, f"op_{opname}", None)
             if method:
-                original_pc = self.pc
-                self.pc_modified_by_operation = False 
+                self.pc += 1
                 method(*args)
-                if not self.pc_modified_by_operation:
-
-                    if self.pc == original_pc:
-                        self.pc += 1
-                self._log_debug(f"END OF ITERATION: Next PC will be {self.pc}")
-
+                if log:
+                    log(f"END OF ITERATION: Next PC will be {self.pc}, Stack: {self.stack}")
             else:
                 raise RuntimeError(f"Unknown instruction: {opname}")
 
-            instruction_count += 1
-            if instruction_count >= max_instructions:
-                self.running = False 
-                print(f"Stack: {self.stack}")
-                print(f"Locals: {self.locals_stack[-1] if self.locals_stack else 'N/A'}")
-                print(f"Globals: {self.globals}")
-                raise RuntimeError(f"Instruction limit ({max_instructions}) reached, possible infinite loop or very long program. Last instruction: {opname} {args} at PC {self.pc-1 if self.pc > 0 else 0} in {self.current_function_name}")
-
-        self._log_debug("--- Execution halted ---")
-        if self.stack:
-            self._log_debug(f"Final stack (non-empty): {self.stack}")
-
+            executed += 1
+            self.instruction_count += 1
 
 
     def _pop_int(self):
@@ -154,13 +551,9 @@ class StackMachine:
         return float(value)
 
     def _pop_any(self):
-        self._log_debug(f"DEBUG POP_ANY: Stack BEFORE pop: {self.stack}, id(self.stack): {id(self.stack)}")
         if not self.stack:
-            self._log_debug("DEBUG POP_ANY: Stack is empty!")
             raise IndexError("Pop from empty stack")
-        item = self.stack.pop()
-        self._log_debug(f"DEBUG POP_ANY: Popped item: {item}, Stack AFTER pop: {self.stack}")
-        return item
+        return self.stack.pop()
 
 
     def op_CONSTI(self, value):
@@ -297,295 +690,309 @@ class StackMachine:
         self.stack.append(('I', int(value)))
 
 
-    def op_LOCAL_GET(self, name):
-        if not self.locals_stack:
-            raise RuntimeError("LOCAL_GET: No local scope available.")
-        current_locals = self.locals_stack[-1]
-        if name not in current_locals:
-            raise NameError(f"Local variable '{name}' not found in current scope.")
-        value, var_type = current_locals[name]
-        if value is None :
-            raise ValueError(f"Local variable '{name}' accessed before assignment.")
-        self.stack.append((var_type, value))
-
-    def op_LOCAL_SET(self, name):
-        if not self.locals_stack:
-            raise RuntimeError("LOCAL_SET: No local scope available.")
-        val_type, value = self._pop_any()
-        current_locals = self.locals_stack[-1]
+    def op_POP(self):
+        # Discards the result of a call used as a statement.
+        self._pop_any()
 
-        current_locals[name] = (value, val_type)
+    # --- Variables ---
+    # The linker rewrites LOCAL_GET/LOCAL_SET/GLOBAL_GET/GLOBAL_SET into these
+    # slot-addressed forms. Frames and globals are fixed-size lists that hold
+    # the stack item itself, None meaning "not assigned yet".
 
+    def op_LOCAL_LOAD(self, slot):
+        item = self.locals[slot]
+        if item is None :
+            self._unassigned_local(slot)
+        self.stack.append(item)
 
-    def op_GLOBAL_GET(self, name):
-        if name not in self.globals:
-            raise NameError(f"Global variable '{name}' not found.")
-        value, var_type = self.globals[name]
-        if value is None :
-            raise ValueError(f"Global variable '{name}' accessed before assignment.")
-        self.stack.append((var_type, value))
+    def _unassigned_local(self, slot):
+        name = self.functions[self.current_function_name]['slot_names'][slot]
+        raise ValueError(f"Local variable '{name}' accessed before assignment.")
 
-    def op_GLOBAL_SET(self, name):
-        self._log_debug(f"DEBUG GLOBAL_SET: Called for name='{name}'. Globals BEFORE: {self.globals.get(name)}")
-        val_type, value = self._pop_any()
-        self.globals[name] = (value, val_type)
+    def _unassigned_global(self, slot):
+        raise ValueError(f"Global variable '{self.global_names[slot]}' accessed before assignment.")
+
+    def op_LOCAL_STORE(self, slot):
+        self.locals[slot] = self.stack.pop()
+
+    def op_GLOBAL_LOAD(self, slot):
+        item = self.globals[slot]
+        if item is None :
+            self._unassigned_global(slot)
+        self.stack.append(item)
+
+    def op_GLOBAL_STORE(self, slot):
+        self.globals[slot] = self.stack.pop()
 
     def op_CALL(self, func_name, is_initial_call=False):
-        if func_name not in self.functions:
+        # By name: the classic and traced loops run this form; the threaded
+        # loop runs the handler _link_calls() bound to the call site.
+        func_def = self.functions.get(func_name)
+        if func_def is None:
             raise NameError(f"Function '{func_name}' not defined.")
-
-        func_def = self.functions[func_name]
         if func_def['is_imported']:
-
-            self._log_debug(f"CALL: Imported function '{func_name}' handled.")
+            # Imported functions without a host implementation do nothing.
+            if func_def['host'] is not None:
+                self._call_host(func_def)
             return
-
-        new_locals = {}
-        for local_name, local_ir_type in func_def['locals_spec'].items():
-            new_locals[local_name] = (None, local_ir_type)
-
-        for i in range(len(func_def['params']) -1, -1, -1):
-            param_name = func_def['params'][i]
-            if not self.stack:
-                raise ValueError(f"Stack underflow when passing arguments to '{func_name}'. Expected {len(func_def['params'])} args.")
-            arg_type, arg_val = self._pop_any()
-            new_locals[param_name] = (arg_val, arg_type)
-        
-        self.locals_stack.append(new_locals)
+        if func_def['memo'] is not None and not is_initial_call:
+            self._call_memoized(func_def)
+            return
+        self._call_function(func_def, is_initial_call)
+
+    def _call_memoized(self, func_def):
+        # CALL of a pure function with a MemoCache. A hit replaces the
+        # arguments with the cached result without entering the function; on
+        # a miss the function runs and its RET stores the result (JIT-compiled
+        # code has already returned it).
+        memo = func_def['memo']
+        nparams = func_def['nparams']
+        stack = self.stack
+        args = stack[-nparams:] if nparams else []
+        key = tuple(value for _, value in args) if self.TAGGED else tuple(args)
+        result = memo.lookup(key)
+        if result is not None:
+            if nparams:
+                del stack[-nparams:]
+            stack.append((func_def['return_type'], result) if self.TAGGED else result)
+            return
+        depth = len(self.call_stack)
+        self._call_function(func_def)
+        if len(self.call_stack) > depth:
+            self.call_stack[-1].memo = (memo, key)
+        else:
+            memo.store(key, stack[-1][1] if self.TAGGED else stack[-1])
+
+    def _call_function(self, func_def, is_initial_call=False):
+        # CALL of a GoxLang function whose entry in self.functions is func_def.
+        func_name = func_def['name']
+        if self.jit is not None and not is_initial_call:
+            compiled = self.jit.on_call(func_name)
+            if compiled is not None:
+                self._call_compiled(func_name, compiled, func_def['nparams'])
+                return
+
+        new_locals = [None] * func_def['nslots']
+        nparams = func_def['nparams']
+        if nparams:
+            if len(self.stack) < nparams:
+                raise ValueError(f"Stack underflow when passing arguments to '{func_name}'. Expected {nparams} args.")
+            # Parameters occupy the first slots, in declaration order.
+            new_locals[:nparams] = self.stack[-nparams:]
+            del self.stack[-nparams:]
 
         if not is_initial_call:
-
-            caller_control_flow_depth = len(self.control_flow_stack)
-            self.call_stack.append({
-                'pc_return': self.pc + 1,
-                'locals_frame_index': len(self.locals_stack) - 2, 
-                'previous_function_name': self.current_function_name,
-                'previous_programInst': self.programInst,
-                'previous_control_flow_depth': caller_control_flow_depth 
-            })
-            self._log_debug(f"CALL: Pushed {self.call_stack[-1]} to call_stack.")
-
+            free_frames = self.free_frames
+            frame = free_frames.pop() if free_frames else Frame()
+            frame.function_name = self.current_function_name
+            frame.code = self.programInst
+            frame.ops = self.programOps
+            frame.pc = self.pc
+            frame.locals = self.locals
+            frame.base = len(self.stack)
+            self.call_stack.append(frame)
+
+        self.locals = new_locals
         self.current_function_name = func_name
         self.programInst = func_def['code']
+        self.programOps = func_def['ops']
         self.pc = 0
-        self.pc_modified_by_operation = True
-        self._log_debug(f"CALL: Jumping to {func_name}. New PC=0. Locals frame created. Program instructions loaded for {func_name}.")
 
-    def op_RET(self):
-        if not self.locals_stack: 
-             if not (self.current_function_name == 'main' and not self.call_stack):
-                 raise RuntimeError("RET: Locals stack is empty, cannot restore  (or was already popped).")
-        else:
-            self.locals_stack.pop()
+    def _op_CALL_profiled(self, func_name, *operands, is_initial_call=False):
+        # operands: any further CALL operands of a subclass (RegisterMachine).
+        callgraph = self.callgraph
+        depth = len(self.call_stack)
+        callgraph.enter(func_name, time.perf_counter_ns())
+        type(self).op_CALL(self, func_name, *operands, is_initial_call=is_initial_call)
+        if not is_initial_call and len(self.call_stack) == depth:
+            # Host function, JIT-compiled code or empty import: already returned.
+            callgraph.exit(time.perf_counter_ns())
+
+    def _op_RET_profiled(self, *operands):
+        type(self).op_RET(self, *operands)
+        self.callgraph.exit(time.perf_counter_ns())
+
+    def _call_host(self, func_def):
+        # Host functions (source/hostfuncs.py) take plain values; the result is
+        # pushed only when the import declares a return type.
+        args = [ self._pop_int() if param_type == 'I' else self._pop_float() for param_type in reversed(func_def['param_types']) ]
+        args.reverse()
+        result = func_def['host'](*args)
+        if func_def['return_type_gox'] is not None:
+            self._push_typed(func_def['return_type'], 0 if result is None else result)
+
+    def _push_typed(self, value_type, value):
+        self.stack.append((value_type, int(value) if value_type == 'I' else float(value)))
+
+    def _call_compiled(self, func_name, compiled, nparams):
+        # Compiled functions take and return stack items and run to completion.
+        stack = self.stack
+        first_arg = len(stack) - nparams
+        if first_arg < 0:
+            raise ValueError(f"Stack underflow when passing arguments to '{func_name}'. Expected {nparams} args.")
+        args = stack[first_arg:]
+        del stack[first_arg:]
+        stack.append(compiled(*args))
 
+    def op_RET(self):
         if not self.call_stack:
-            self._log_debug(f"RET: No call stack frame. Assuming return from '{self.current_function_name_or_none()}' or initial context. Halting.")
+            self.locals = None
             self.running = False
             self.pc = -1 
-            self.pc_modified_by_operation = True
-            self.control_flow_stack.clear() # Clear any loop contexts from main
-            self._log_debug(f"RET: Cleared control_flow_stack as returning from last function. Stack: {self.control_flow_stack}")
             return
 
+        frame = self.call_stack.pop()
+        self.pc = frame.pc
+        self.current_function_name = frame.function_name
+        self.programInst = frame.code
+        self.programOps = frame.ops
+        self.locals = frame.locals
+        if frame.memo is not None:
+            memo, key = frame.memo
+            frame.memo = None
+            memo.store(key, self.stack[-1][1] if self.TAGGED else self.stack[-1])
+        # The pooled frame must not keep the caller's locals alive.
+        frame.locals = None
+        self.free_frames.append(frame)
 
-        return_frame = self.call_stack.pop()
-        self.pc = return_frame['pc_return']
-        self.current_function_name = return_frame['previous_function_name']
-        self.programInst = return_frame['previous_programInst']
-        self.pc_modified_by_operation = True 
-
-        if 'previous_control_flow_depth' in return_frame:
-            target_depth = return_frame['previous_control_flow_depth']
-            if len(self.control_flow_stack) > target_depth:
-                self._log_debug(f"RET: Truncating control_flow_stack from {len(self.control_flow_stack)} (top: {self.control_flow_stack[-1] if self.control_flow_stack else 'N/A'}) to depth {target_depth}.")
-                self.control_flow_stack = self.control_flow_stack[:target_depth]
-            # else:
-                # self._log_debug(f"RET: control_flow_stack depth ({len(self.control_flow_stack)}) already at or below target caller depth ({target_depth}). No change needed.")
-        else:
-
-            self._log_debug(f"RET: Warning - 'previous_control_flow_depth' not in return_frame. control_flow_stack not explicitly truncated by this mechanism for function {self.current_function_name}.")
-
-        self._log_debug(f"RET: Returning to {self.current_function_name} at PC {self.pc}. Locals restored. Call stack size: {len(self.call_stack)}. Control_flow_stack: {self.control_flow_stack}")
-        # ... (rest of your RET logic, e.g., for halting if main was empty) ...
         if not self.programInst and self.current_function_name == 'main': # Edge case: main was empty
             self.running = False
             self.pc = -1
 
 
+    def op_TAILCALL(self, func_name):
+        """return f(...) in tail position: f replaces the current frame.
+
+        The arguments become f's locals and execution continues at f's first
+        instruction without pushing onto call_stack, so f's RET goes straight
+        back to our caller and accumulator-style recursion runs in constant
+        space. Host functions and JIT-compiled callees run to completion
+        instead, as a CALL followed by RET. Returns True when the frame was
+        reused (see _op_TAILCALL_profiled).
+        """
+        func_def = self.functions.get(func_name)
+        if func_def is None:
+            raise NameError(f"Function '{func_name}' not defined.")
+        if func_def['is_imported']:
+            self.op_CALL(func_name)
+            self.op_RET()
+            return False
+        return self._tail_call(func_def)
+
+    def _tail_call(self, func_def):
+        # TAILCALL of a GoxLang function whose entry in self.functions is func_def.
+        func_name = func_def['name']
+        if self.jit is not None and self.jit.on_call(func_name) is not None:
+            self.op_CALL(func_name)
+            self.op_RET()
+            return False
+
+        new_locals = [None] * func_def['nslots']
+        nparams = func_def['nparams']
+        if nparams:
+            if len(self.stack) < nparams:
+                raise ValueError(f"Stack underflow when passing arguments to '{func_name}'. Expected {nparams} args.")
+            new_locals[:nparams] = self.stack[-nparams:]
+            del self.stack[-nparams:]
+        self.locals = new_locals
+
+        self.current_function_name = func_name
+        self.programInst = func_def['code']
+        self.programOps = func_def['ops']
+        self.pc = 0
+        return True
+
+    def _op_TAILCALL_profiled(self, func_name, *operands):
+        # The caller's frame ends and the callee's begins in its place.
+        if type(self).op_TAILCALL(self, func_name, *operands):
+            now = time.perf_counter_ns()
+            self.callgraph.exit(now)
+            self.callgraph.enter(func_name, now)
+
     def current_function_name_or_none(self):
         return self.current_function_name if self.current_function_name else "global/unknown context"
 
 
     # --- Control de flujo estructurado ---
-    # These require careful management of PC.
-    # The IR generator should produce labels or relative jumps.
-    # For this stack machine, we'll assume jump targets are absolute PCs
-    # or that IF/LOOP etc. implicitly manage blocks.
-    # A common way is IF jumps to ELSE or ENDIF if false.
-    # LOOP marks start, CBREAK jumps to ENDLOOP, ENDLOOP jumps to LOOP.
-
-    # For structured IF/ELSE/ENDIF, LOOP/CBREAK/ENDLOOP, the IR usually includes
-    # jump targets (labels that are resolved to PC values).
-    # If the IR has ('IF_FALSE_JUMP', label_else), ('JUMP', label_endif)
-    # For simplicity here, let's assume a block-based approach where the
-    # StackMachine finds matching ENDIF/ENDLOOP. This is harder to do efficiently
-    # without pre-calculating jump targets.
-
-    # A simpler model for IF: if condition is false, skip to matching ELSE or ENDIF.
-    # For now, IF will pop condition. If false, it will scan forward for ELSE or ENDIF.
-    # This is inefficient but demonstrates the logic. A real compiler would use labels/addresses.
-
-    # In class StackMachine:
-    def op_IF(self):
+    # The IR emits IF/ELSE/ENDIF and LOOP/CBREAK/CONTINUE/ENDLOOP without jump
+    # targets. _resolve_branch_targets() links them once in load_module(), so
+    # every branch receives the absolute PC it jumps to as its operand and
+    # nothing scans for the matching ENDIF/ENDLOOP at run time.
+
+    def op_IF(self, target):
         condition_type, condition_value = self._pop_any()
         if condition_type != 'I':
-            raise TypeError("IF condition must be an integer (boolean).") #
-        
-        if condition_value == 0: # Condition is False
-            nesting_level = 1
-            scan_pc = self.pc + 1 # Start scanning instructions after the current IF
-            
-            while scan_pc < len(self.programInst):
-                instr_name = self.programInst[scan_pc][0]
-                if instr_name == 'IF':
-                    nesting_level += 1
-                elif instr_name == 'ENDIF':
-                    nesting_level -= 1
-                    if nesting_level == 0: 
-                        # Found the ENDIF for this IF, and no ELSE was found for this IF block.
-                        # This means it was an IF without an ELSE.
-                        self.pc = scan_pc # Jump to the ENDIF instruction.
-                        self.pc_modified_by_operation = True
-                        return
-                elif instr_name == 'ELSE' and nesting_level == 1:
-                    # Found the ELSE that matches the current IF.
-                    # Jump to the instruction *after* this ELSE instruction.
-                    self.pc = scan_pc + 1 
-                    self.pc_modified_by_operation = True
-                    return
-                scan_pc += 1
-            # If the loop finishes, a matching ENDIF (or ELSE if expected) was not found.
-            raise RuntimeError(f"IF(false) at PC {self.pc-1} did not find matching ELSE or ENDIF.")
-        else: # Condition is True
-            # Do nothing; self.pc_modified_by_operation remains False.
-            # The main run() loop will increment self.pc to execute the next instruction (the true-block).
-            # The ELSE instruction (if present) later on will handle skipping the else-block.
-            pass
-
-    def op_ELSE(self):
-        # This instruction implies the 'IF' block was executed.
-        # We need to skip to the matching ENDIF.
-        nesting_level = 1
-        target_pc = self.pc + 1
-        while target_pc < len(self.programInst):
-            instr_name = self.programInst[target_pc][0]
-            if instr_name == 'IF': # Should not happen if IFs are properly nested with ELSE
-                nesting_level +=1
-            elif instr_name == 'ENDIF':
-                nesting_level -= 1
-                if nesting_level == 0:
-                    self.pc = target_pc # Will be incremented by main loop, so ENDIF is executed next
-                    self.pc_modified_by_operation = True
-                    return
-            target_pc += 1
-        raise RuntimeError("ELSE without matching ENDIF.")
+            raise TypeError("IF condition must be an integer (boolean).")
+        if condition_value == 0: # Condition is False: jump past the matching ELSE (or to ENDIF)
+            self.pc = target
+
+    def op_ELSE(self, target):
+        # The IF block was executed; skip the else-block.
+        self.pc = target
 
     def op_ENDIF(self):
         # ENDIF is a marker, no specific action other than being a jump target.
-        # PC will be incremented by the main loop.
         pass
 
     def op_LOOP(self):
-        # Mark the start of the loop for ENDLOOP and CONTINUE.
-        # We push the current PC (address of LOOP instruction) onto a control flow stack.
-        self._log_debug(f"LOOP instruction at PC={self.pc}. Pushing {{'type': 'LOOP_START', 'pc': {self.pc}}} to control_flow_stack.")
-        self.control_flow_stack.append({'type': 'LOOP_START', 'pc': self.pc})
-        # PC will be incremented by the main loop to enter the loop body.
+        # LOOP is a marker; ENDLOOP and CONTINUE already know where it is.
+        pass
 
-    def op_CBREAK(self): # Conditional Break
+    def op_CBREAK(self, target): # Conditional Break
         condition_type, condition_value = self._pop_any()
         if condition_type != 'I':
             raise TypeError("CBREAK condition must be an integer (boolean).")
-
-        if condition_value != 0: # True, so break
-            # Find matching ENDLOOP
-            scan_pc = self.pc + 1 # Start scanning from instruction after CBREAK
-            temp_nesting = 0
-            found_endloop = False
-            
-            while scan_pc < len(self.programInst):
-                instr_name = self.programInst[scan_pc][0]
-                if instr_name == 'LOOP':
-                    temp_nesting += 1
-                elif instr_name == 'ENDLOOP':
-                    if temp_nesting == 0: # This ENDLOOP matches our current CBREAK's loop level
-                        # Set PC to instruction AFTER this ENDLOOP
-                        self.pc = scan_pc + 1 
-                        self.pc_modified_by_operation = True
-                        found_endloop = True
-                        break
-                    else: # This ENDLOOP belongs to an inner, nested loop
-                        temp_nesting -= 1
-                scan_pc += 1
-            
-            if not found_endloop:
-                raise RuntimeError("CBREAK without matching ENDLOOP or loop structure error.")
-
-            # Clean up the control_flow_stack for the loop being exited.
-            # CBREAK exits the innermost loop it's part of, so its LOOP_START marker should be at the top.
-            if self.control_flow_stack and self.control_flow_stack[-1]['type'] == 'LOOP_START':
-                self.control_flow_stack.pop() # Pop the LOOP_START of the broken loop
-            else:
-                # This signifies a problem, as CBREAK should be within a loop
-                # context that has placed its marker on the control_flow_stack.
-                self._log_debug("Critical Warning: CBREAK executed but control_flow_stack was empty or its top was not a LOOP_START marker. This could indicate a prior issue.")
-            
-            return # PC is set to after ENDLOOP, control_flow_stack adjusted. Main run loop will continue from new PC.
-        
-        # If condition_value is 0 (false), do nothing. 
-        # PC will be incremented by the main run loop to the next instruction.
-
-
-    def op_CONTINUE(self):
-        # Jump to the beginning of the current (innermost) loop.
-        # The beginning is the instruction *after* the LOOP instruction.
-        if not self.control_flow_stack:
-            raise RuntimeError("CONTINUE without active LOOP.")
-
-        loop_start_info = None
-        for i in range(len(self.control_flow_stack) - 1, -1, -1):
-            if self.control_flow_stack[i]['type'] == 'LOOP_START':
-                loop_start_info = self.control_flow_stack[i]
-                break
-        
-        if not loop_start_info:
-            raise RuntimeError("CONTINUE found no LOOP_START on control_flow_stack.")
-
-        self.pc = loop_start_info['pc'] # PC of the LOOP instruction. Main loop will increment it.
-                                        # So effectively jumps to instruction *after* LOOP.
-                                        # No, it should jump TO the LOOP instruction itself, which then proceeds.
-                                        # The run loop increments PC *after* instruction execution.
-                                        # So, setting PC to loop_start_info['pc'] means LOOP will be re-executed.
-                                        # This might be okay if LOOP itself doesn't have side effects other than marking.
-                                        # Or, it should be loop_start_info['pc'] and LOOP does nothing on re-entry if already marked.
-                                        # Let's set it to loop_start_info['pc'] - 1 so after increment it's the LOOP instr.
-                                        # No, set to loop_start_info['pc'] directly. The LOOP instruction should be idempotent or simply a marker.
-
-        self.pc = loop_start_info['pc'] # The run() loop will execute this LOOP instruction next, then increment PC.
-        self.pc_modified_by_operation = True
-    def op_ENDLOOP(self):
-        # Jump back to the corresponding LOOP instruction.
-        if not self.control_flow_stack or self.control_flow_stack[-1]['type'] != 'LOOP_START':
-            raise RuntimeError("ENDLOOP without matching LOOP or malformed control_flow_stack.")
-        
-        loop_start_info = self.control_flow_stack.pop() # Remove this loop's mark
-        self._log_debug(f"ENDLOOP at PC={self.pc}. Popped loop_start_info: {loop_start_info}. Jumping to PC={loop_start_info['pc']}.")
-        self.pc = loop_start_info['pc'] # Jump to the LOOP instruction itself.
-                                        # The run loop will execute LOOP, then increment PC to enter body.
-        self.pc_modified_by_operation = True
+        if condition_value != 0: # True, so jump past the matching ENDLOOP
+            self.pc = target
+
+    def op_CONTINUE(self, target):
+        # Jump to the first instruction of the innermost loop.
+        self.pc = target
+        if self.jit is not None:
+            self.jit.on_back_edge(self.current_function_name)
+
+    def op_ENDLOOP(self, target):
+        # Jump back to the first instruction of the loop.
+        self.pc = target
+        if self.jit is not None:
+            self.jit.on_back_edge(self.current_function_name)
+
+    # --- Superinstrucciones ---
+    # Produced by source/peephole.py when superinstructions are enabled. The
+    # IF_<cmp>, WHILE_<cmp> and LOCAL_<op>_K families are generated below the
+    # class from the tables in that module.
+
+    def op_LOCAL_INCI(self, slot, step):
+        item = self.locals[slot]
+        if item is None:
+            self._unassigned_local(slot)
+        if item[0] != 'I':
+            raise TypeError(f"Expected integer ('I') in local slot {slot}, got {item[0]}")
+        self.locals[slot] = ('I', item[1] + step)
+
+    def op_GLOBAL_INCI(self, slot, step):
+        item = self.globals[slot]
+        if item is None:
+            self._unassigned_global(slot)
+        if item[0] != 'I':
+            raise TypeError(f"Expected integer ('I') in global '{self.global_names[slot]}', got {item[0]}")
+        self.globals[slot] = ('I', item[1] + step)
+
+    def op_NEGI(self):
+        self.stack.append(('I', -self._pop_int()))
+
+    def op_NEGF(self):
+        self.stack.append(('F', -self._pop_float()))
+
+    def op_BREAK(self, target):
+        self.pc = target
+
+    def op_WHILE(self, target):
+        # Fused "CONSTI 1; <cond>; SUBI; CBREAK": leave the loop unless cond is 1.
+        if self._pop_int() != 1:
+            self.pc = target
 
     # --- Expansión de memoria ---
-    # In class StackMachine:
     def op_GROW(self):
         num_bytes_type, num_bytes = self._pop_any()
         if num_bytes_type != 'I':
@@ -593,18 +1000,14 @@ class StackMachine:
         if num_bytes < 0:
             raise ValueError("Cannot grow memory by a negative amount.")
 
-        base_address_of_new_block = len(self.memory) # This is current_size before growth
-        
         try:
-            self.memory.extend(bytearray(num_bytes))
+            base_address_of_new_block = self.heap.allocate(num_bytes)
         except MemoryError: # It's good practice to catch potential MemoryError during extend
-            current_total_size = len(self.memory) # Get current size before erroring
+            current_total_size = self.memory.size # Get current size before erroring
             raise MemoryError(f"Failed to grow memory by {num_bytes} bytes. Current total size: {current_total_size}")
         
         # Push ONLY the base address of the newly allocated block
         self.stack.append(('I', base_address_of_new_block)) 
-        
-        self._log_debug(f"Memory grown by {num_bytes} bytes. Base of new block: {base_address_of_new_block}, New total size: {len(self.memory)}. Pushed base address of new block.")
 
 
     # --- Entrada/salida ---
@@ -612,13 +1015,13 @@ class StackMachine:
         val_type, value = self._pop_any()
         if val_type != 'I':
             raise TypeError(f"PRINTI requires an integer, got {val_type}")
-        print(f"[bold dark_green][OUTPUT][/bold dark_green] {int(value)}")
+        self.output.write(int(value))
 
     def op_PRINTF(self):
         val_type, value = self._pop_any()
         if val_type != 'F':
             raise TypeError(f"PRINTF requires a float, got {val_type}")
-        print(f"[bold dark_green][OUTPUT][/bold dark_green] {float(value)}")
+        self.output.write(float(value))
 
     def op_PRINTB(self): # Prints byte as integer value, or as char? "PRINTB ; Imprimir el elemento superior de la pila" (value presented as integer)
         val_type, value = self._pop_any()
@@ -626,7 +1029,7 @@ class StackMachine:
             raise TypeError(f"PRINTB requires an integer (representing a byte), got {val_type}")
         # Assuming it prints the integer value of the byte.
         # If it should print as a character: print(chr(int(value)))
-        print(f"[bold dark_green][OUTPUT][/bold dark_green] {int(value)}")
+        self.output.write(int(value))
 
     # --- Acceso a memoria ---
     # PEEKI, POKEI, PEEKF, POKEF, PEEKB, POKEB 
@@ -634,78 +1037,92 @@ class StackMachine:
     def op_PEEKI(self): # Address is on stack
         """Read 4-byte integer from memory at address (little-endian)"""
         address = self._pop_int()
-        if address < 0 or address + self.INT_SIZE > len(self.memory):
-            raise IndexError(f"PEEKI: Memory access out of bounds. Address: {address}, Memory size: {len(self.memory)}")
+        if address < 0 or address + self.INT_SIZE > self.memory.size:
+            raise IndexError(f"PEEKI: Memory access out of bounds. Address: {address}, Memory size: {self.memory.size}")
         
-        # Read 4 bytes in little-endian order
-        bytes_data = self.memory[address:address + self.INT_SIZE]
-        value = int.from_bytes(bytes_data, byteorder='little', signed=True)
-        self.stack.append(('I', value))
-        self._log_debug(f"PEEKI: Read integer {value} from address {address}")
+        self.stack.append(('I', self.memory.read_int(address)))
 
     def op_POKEI(self): # Value, then Address on stack
         """Write 4-byte integer to memory at address (little-endian)"""
         value = self._pop_int()  # El valor está en el tope de la pila
         address = self._pop_int()  # La dirección está debajo del valor
         
-        if address < 0 or address + self.INT_SIZE > len(self.memory):
-            raise IndexError(f"POKEI: Memory access out of bounds. Address: {address}, Memory size: {len(self.memory)}")
+        if address < 0 or address + self.INT_SIZE > self.memory.size:
+            raise IndexError(f"POKEI: Memory access out of bounds. Address: {address}, Memory size: {self.memory.size}")
         
-        # Write 4 bytes in little-endian order
-        bytes_data = value.to_bytes(self.INT_SIZE, byteorder='little', signed=True)
-        self.memory[address:address + self.INT_SIZE] = bytes_data
-        self._log_debug(f"POKEI: Wrote integer {value} to address {address}")
+        self.memory.write_int(address, value)
 
 
     def op_PEEKF(self): # Address is on stack
         """Read 4-byte float from memory at address (little-endian)"""
-        import struct
         address = self._pop_int()
         
-        if address < 0 or address + self.FLOAT_SIZE > len(self.memory):
-            raise IndexError(f"PEEKF: Memory access out of bounds. Address: {address}, Memory size: {len(self.memory)}")
+        if address < 0 or address + self.FLOAT_SIZE > self.memory.size:
+            raise IndexError(f"PEEKF: Memory access out of bounds. Address: {address}, Memory size: {self.memory.size}")
         
-        # Read 4 bytes and convert to float using IEEE 754 format
-        bytes_data = self.memory[address:address + self.FLOAT_SIZE]
-        value = struct.unpack('<f', bytes_data)[0]  # '<f' = little-endian float
-        self.stack.append(('F', value))
-        self._log_debug(f"PEEKF: Read float {value} from address {address}")
+        self.stack.append(('F', self.memory.read_float(address)))
 
     def op_POKEF(self): # Value, then Address on stack
         """Write 4-byte float to memory at address (little-endian)"""
-        import struct
         value = self._pop_float()  # El valor está en el tope de la pila
         address = self._pop_int()  # La dirección está debajo del valor
         
-        if address < 0 or address + self.FLOAT_SIZE > len(self.memory):
-            raise IndexError(f"POKEF: Memory access out of bounds. Address: {address}, Memory size: {len(self.memory)}")
+        if address < 0 or address + self.FLOAT_SIZE > self.memory.size:
+            raise IndexError(f"POKEF: Memory access out of bounds. Address: {address}, Memory size: {self.memory.size}")
         
-        # Convert float to 4 bytes using IEEE 754 format
-        bytes_data = struct.pack('<f', value)  # '<f' = little-endian float
-        self.memory[address:address + self.FLOAT_SIZE] = bytes_data
-        self._log_debug(f"POKEF: Wrote float {value} to address {address}")
+        self.memory.write_float(address, value)
 
     def op_PEEKB(self): # Address is on stack
         """Read 1 byte from memory at address"""
         address = self._pop_int()
         
-        if address < 0 or address >= len(self.memory):
-            raise IndexError(f"PEEKB: Memory access out of bounds. Address: {address}, Memory size: {len(self.memory)}")
+        if address < 0 or address >= self.memory.size:
+            raise IndexError(f"PEEKB: Memory access out of bounds. Address: {address}, Memory size: {self.memory.size}")
         
         value = self.memory[address]
         self.stack.append(('I', value))  # Bytes are represented as integers
-        self._log_debug(f"PEEKB: Read byte {value} from address {address}")
 
     def op_POKEB(self): # Value, then Address on stack
         """Write 1 byte to memory at address"""
         value = self._pop_int()  # El valor está en el tope de la pila
         address = self._pop_int()  # La dirección está debajo del valor
         
-        if address < 0 or address >= len(self.memory):
-            raise IndexError(f"POKEB: Memory access out of bounds. Address: {address}, Memory size: {len(self.memory)}")
+        if address < 0 or address >= self.memory.size:
+            raise IndexError(f"POKEB: Memory access out of bounds. Address: {address}, Memory size: {self.memory.size}")
         
         if value < 0 or value > 255:
             raise ValueError(f"POKEB: Byte value must be 0-255, got {value}")
         
         self.memory[address] = value
-        self._log_debug(f"POKEB: Wrote byte {value} to address {address}")
\ No newline at end of file
+
+
+# --- Superinstrucciones generadas ---
+
+def _compare_jump(cmp, pop):
+    # IF_<cmp> and WHILE_<cmp>: jump to target unless "a <cmp> b" holds.
+    def handler(self, target):
+        b = pop(self)
+        if not cmp(pop(self), b):
+            self.pc = target
+    return handler
+
+def _local_const_op(fn, produces_flag):
+    # LOCAL_<op>_K: push "local <op> k" without the LOCAL_LOAD/CONSTI pushes.
+    def handler(self, slot, k):
+        item = self.locals[slot]
+        if item is None:
+            self._unassigned_local(slot)
+        if item[0] != 'I':
+            raise TypeError(f"Expected integer ('I') in local slot {slot}, got {item[0]}")
+        result = fn(item[1], k)
+        self.stack.append(('I', (1 if result else 0) if produces_flag else result))
+    return handler
+
+for _name, _cmp in COMPARISONS.items():
+    _handler = _compare_jump(_cmp, StackMachine._pop_int if _name.endswith('I') else StackMachine._pop_float)
+    setattr(StackMachine, f'op_IF_{_name}', _handler)
+    setattr(StackMachine, f'op_WHILE_{_name}', _handler)
+for _name, _fn in CONST_ARITHMETIC.items():
+    setattr(StackMachine, f'op_LOCAL_{_name}_K', _local_const_op(_fn, False))
+for _name, _fn in CONST_COMPARISONS.items():
+    setattr(StackMachine, f'op_LOCAL_{_name}_K', _local_const_op(_fn, True))
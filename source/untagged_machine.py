@@ -0,0 +1,272 @@
+from source.stack_machine import StackMachine
+from source.peephole import COMPARISONS, CONST_ARITHMETIC, CONST_COMPARISONS
+from source.irverify import verify_function
+
+class UntaggedStackMachine(StackMachine):
+    """StackMachine that keeps raw Python ints and floats on the stack.
+
+    The tagged machine pushes a ('I', value) / ('F', value) tuple for every
+    value and checks the tag on every pop. Here the types are verified once
+    per function in load_module() (see source/irverify.py), so the handlers
+    below push and pop plain values. Locals and globals store whatever is on
+    the stack, so the inherited LOCAL_*/GLOBAL_*/CALL/RET/TAILCALL handlers work
+    as is.
+    """
+
+    TAGGED = False
+
+    def load_module(self, ir_module):
+        super().load_module(ir_module)
+        for func in self.functions.values():
+            if not func['is_imported']:
+                verify_function(func, self.functions, self.global_types)
+
+    def _link_code(self, func_def, origins=None):
+        code = super()._link_code(func_def, origins)
+        # Normalize literals once instead of converting them on every push.
+        for pc, instr in enumerate(code):
+            if instr[0] == 'CONSTI':
+                code[pc] = ('CONSTI', int(instr[1]))
+            elif instr[0] == 'CONSTF':
+                code[pc] = ('CONSTF', float(instr[1]))
+        return code
+
+    def _pop_int(self):
+        return self.stack.pop()
+
+    _pop_float = _pop_int
+
+    def _push_typed(self, value_type, value):
+        self.stack.append(int(value) if value_type == 'I' else float(value))
+
+    def _pop_any(self):
+        if not self.stack:
+            raise IndexError("Pop from empty stack")
+        return self.stack.pop()
+
+    def op_POP(self):
+        self.stack.pop()
+
+    # --- Aritmética y comparaciones ---
+    # Binary operators replace the second operand in place instead of
+    # popping both and pushing the result.
+
+    def op_CONSTI(self, value):
+        self.stack.append(value)
+
+    op_CONSTF = op_CONSTI
+
+    def op_ADDI(self):
+        stack = self.stack
+        b = stack.pop()
+        stack[-1] += b
+
+    op_ADDF = op_ADDI
+
+    def op_SUBI(self):
+        stack = self.stack
+        b = stack.pop()
+        stack[-1] -= b
+
+    op_SUBF = op_SUBI
+
+    def op_MULI(self):
+        stack = self.stack
+        b = stack.pop()
+        stack[-1] *= b
+
+    op_MULF = op_MULI
+
+    def op_DIVI(self):
+        stack = self.stack
+        b = stack.pop()
+        if b == 0:
+            raise ZeroDivisionError("Integer division by zero")
+        stack[-1] //= b
+
+    def op_DIVF(self):
+        stack = self.stack
+        b = stack.pop()
+        if b == 0.0:
+            raise ZeroDivisionError("Floating point division by zero")
+        stack[-1] /= b
+
+    def op_ANDI(self):
+        stack = self.stack
+        b = stack.pop()
+        stack[-1] &= b
+
+    def op_ORI(self):
+        stack = self.stack
+        b = stack.pop()
+        stack[-1] |= b
+
+    def op_LTI(self):
+        stack = self.stack
+        b = stack.pop()
+        stack[-1] = 1 if stack[-1] < b else 0
+
+    def op_LEI(self):
+        stack = self.stack
+        b = stack.pop()
+        stack[-1] = 1 if stack[-1] <= b else 0
+
+    def op_GTI(self):
+        stack = self.stack
+        b = stack.pop()
+        stack[-1] = 1 if stack[-1] > b else 0
+
+    def op_GEI(self):
+        stack = self.stack
+        b = stack.pop()
+        stack[-1] = 1 if stack[-1] >= b else 0
+
+    def op_EQI(self):
+        stack = self.stack
+        b = stack.pop()
+        stack[-1] = 1 if stack[-1] == b else 0
+
+    def op_NEI(self):
+        stack = self.stack
+        b = stack.pop()
+        stack[-1] = 1 if stack[-1] != b else 0
+
+    op_LTF = op_LTI
+    op_LEF = op_LEI
+    op_GTF = op_GTI
+    op_GEF = op_GEI
+    op_EQF = op_EQI
+    op_NEF = op_NEI
+
+    def op_ITOF(self):
+        self.stack[-1] = float(self.stack[-1])
+
+    def op_FTOI(self):
+        self.stack[-1] = int(self.stack[-1])
+
+    # --- Control de flujo estructurado ---
+
+    def op_IF(self, target):
+        if self.stack.pop() == 0:
+            self.pc = target
+
+    def op_CBREAK(self, target):
+        if self.stack.pop() != 0:
+            self.pc = target
+
+    # --- Superinstrucciones ---
+
+    def op_LOCAL_INCI(self, slot, step):
+        value = self.locals[slot]
+        if value is None:
+            self._unassigned_local(slot)
+        self.locals[slot] = value + step
+
+    def op_GLOBAL_INCI(self, slot, step):
+        value = self.globals[slot]
+        if value is None:
+            self._unassigned_global(slot)
+        self.globals[slot] = value + step
+
+    def op_NEGI(self):
+        self.stack[-1] = -self.stack[-1]
+
+    op_NEGF = op_NEGI
+
+    def op_WHILE(self, target):
+        if self.stack.pop() != 1:
+            self.pc = target
+
+    # --- Expansión de memoria ---
+
+    def op_GROW(self):
+        num_bytes = self.stack.pop()
+        if num_bytes < 0:
+            raise ValueError("Cannot grow memory by a negative amount.")
+        try:
+            base_address_of_new_block = self.heap.allocate(num_bytes)
+        except MemoryError:
+            raise MemoryError(f"Failed to grow memory by {num_bytes} bytes. Current total size: {self.memory.size}")
+        self.stack.append(base_address_of_new_block)
+
+    # --- Entrada/salida ---
+
+    def op_PRINTI(self):
+        self.output.write(self.stack.pop())
+
+    op_PRINTB = op_PRINTI
+
+    def op_PRINTF(self):
+        self.output.write(float(self.stack.pop()))
+
+    # --- Acceso a memoria ---
+
+    def op_PEEKI(self):
+        address = self.stack.pop()
+        if address < 0 or address + self.INT_SIZE > self.memory.size:
+            raise IndexError(f"PEEKI: Memory access out of bounds. Address: {address}, Memory size: {self.memory.size}")
+        self.stack.append(self.memory.read_int(address))
+
+    def op_POKEI(self):
+        value = self.stack.pop()
+        address = self.stack.pop()
+        if address < 0 or address + self.INT_SIZE > self.memory.size:
+            raise IndexError(f"POKEI: Memory access out of bounds. Address: {address}, Memory size: {self.memory.size}")
+        self.memory.write_int(address, value)
+
+    def op_PEEKF(self):
+        address = self.stack.pop()
+        if address < 0 or address + self.FLOAT_SIZE > self.memory.size:
+            raise IndexError(f"PEEKF: Memory access out of bounds. Address: {address}, Memory size: {self.memory.size}")
+        self.stack.append(self.memory.read_float(address))
+
+    def op_POKEF(self):
+        value = self.stack.pop()
+        address = self.stack.pop()
+        if address < 0 or address + self.FLOAT_SIZE > self.memory.size:
+            raise IndexError(f"POKEF: Memory access out of bounds. Address: {address}, Memory size: {self.memory.size}")
+        self.memory.write_float(address, value)
+
+    def op_PEEKB(self):
+        address = self.stack.pop()
+        if address < 0 or address >= self.memory.size:
+            raise IndexError(f"PEEKB: Memory access out of bounds. Address: {address}, Memory size: {self.memory.size}")
+        self.stack.append(self.memory[address])
+
+    def op_POKEB(self):
+        value = self.stack.pop()
+        address = self.stack.pop()
+        if address < 0 or address >= self.memory.size:
+            raise IndexError(f"POKEB: Memory access out of bounds. Address: {address}, Memory size: {self.memory.size}")
+        if value < 0 or value > 255:
+            raise ValueError(f"POKEB: Byte value must be 0-255, got {value}")
+        self.memory[address] = value
+
+
+# --- Superinstrucciones generadas ---
+
+def _compare_jump(cmp):
+    def handler(self, target):
+        stack = self.stack
+        b = stack.pop()
+        if not cmp(stack.pop(), b):
+            self.pc = target
+    return handler
+
+def _local_const_op(fn, produces_flag):
+    def handler(self, slot, k):
+        value = self.locals[slot]
+        if value is None:
+            self._unassigned_local(slot)
+        result = fn(value, k)
+        self.stack.append((1 if result else 0) if produces_flag else result)
+    return handler
+
+for _name, _cmp in COMPARISONS.items():
+    _handler = _compare_jump(_cmp)
+    setattr(UntaggedStackMachine, f'op_IF_{_name}', _handler)
+    setattr(UntaggedStackMachine, f'op_WHILE_{_name}', _handler)
+for _name, _fn in CONST_ARITHMETIC.items():
+    setattr(UntaggedStackMachine, f'op_LOCAL_{_name}_K', _local_const_op(_fn, False))
+for _name, _fn in CONST_COMPARISONS.items():
+    setattr(UntaggedStackMachine, f'op_LOCAL_{_name}_K', _local_const_op(_fn, True))